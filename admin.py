@@ -3,17 +3,26 @@ from __future__ import annotations
 from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from passlib.context import CryptContext
 
 import db
-from auth import require_admin
+import db_async
+import passwords
+from auth import (
+    hash_password,
+    invalidate_user_tokens,
+    login_throttle_stats,
+    read_json,
+    require_admin,
+    reset_login_throttle,
+    revocation_stats,
+    revoke_user_tokens,
+    token_cache_stats,
+)
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def _hash(pw: str) -> str:
-    return pwd_context.hash(pw)
+_PASSWORD_COL: Dict[str, str] = {}
 
 
 def _get_password_col() -> str:
@@ -21,15 +30,21 @@ def _get_password_col() -> str:
     Support both schemas:
       - users.password_hash
       - users.password
-    Auto-detect at runtime.
+    Detected once per database file and cached.
     """
+    cached = _PASSWORD_COL.get(db.DB_PATH)
+    if cached:
+        return cached
     with db._conn() as con:
         cols = [r[1] for r in con.execute("PRAGMA table_info(users)").fetchall()]
     if "password_hash" in cols:
-        return "password_hash"
-    if "password" in cols:
-        return "password"
-    raise RuntimeError("Could not find password column (password_hash or password) in users table")
+        col = "password_hash"
+    elif "password" in cols:
+        col = "password"
+    else:
+        raise RuntimeError("Could not find password column (password_hash or password) in users table")
+    _PASSWORD_COL[db.DB_PATH] = col
+    return col
 
 
 @router.get("/admin/pending-brokers")
@@ -73,7 +88,7 @@ async def approve_broker_user(request: Request, u: Dict[str, Any] = Depends(requ
     if not username:
         raise HTTPException(status_code=400, detail="username required")
 
-    row = db.get_user(username)
+    row = await db_async.get_user(username)
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -81,13 +96,11 @@ async def approve_broker_user(request: Request, u: Dict[str, Any] = Depends(requ
     if (user.get("role") or "").lower() != "broker":
         raise HTTPException(status_code=400, detail="User is not a broker")
 
-    with db._conn() as con:
-        con.execute(
-            "UPDATE users SET broker_status='approved' WHERE username=?",
-            (username,),
-        )
+    await db_async.run(db.set_broker_status, username, "approved")
+    # Keep the sessions: clients refresh and come back with the new status.
+    await revoke_user_tokens(username, end_sessions=False)
     try:
-        db.audit(u.get("username") or "admin", "approve_broker", f"user:{username}", None)
+        await db_async.audit(u.get("username") or "admin", "approve_broker", f"user:{username}", None)
     except Exception:
         pass
 
@@ -101,7 +114,7 @@ async def reject_broker_user(request: Request, u: Dict[str, Any] = Depends(requi
     if not username:
         raise HTTPException(status_code=400, detail="username required")
 
-    row = db.get_user(username)
+    row = await db_async.get_user(username)
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -109,13 +122,10 @@ async def reject_broker_user(request: Request, u: Dict[str, Any] = Depends(requi
     if (user.get("role") or "").lower() != "broker":
         raise HTTPException(status_code=400, detail="User is not a broker")
 
-    with db._conn() as con:
-        con.execute(
-            "UPDATE users SET broker_status='rejected' WHERE username=?",
-            (username,),
-        )
+    await db_async.run(db.set_broker_status, username, "rejected")
+    await revoke_user_tokens(username, end_sessions=False)
     try:
-        db.audit(u.get("username") or "admin", "reject_broker", f"user:{username}", None)
+        await db_async.audit(u.get("username") or "admin", "reject_broker", f"user:{username}", None)
     except Exception:
         pass
 
@@ -138,22 +148,151 @@ async def reset_user_password(request: Request, u: Dict[str, Any] = Depends(requ
     if len(new_password) < 8:
         raise HTTPException(status_code=400, detail="new_password must be at least 8 characters")
 
-    row = db.get_user(username)
+    row = await db_async.get_user(username)
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
 
-    password_col = _get_password_col()
-    pw_hash = _hash(new_password)
+    password_col = await db_async.run(_get_password_col)
+    pw_hash = await hash_password(new_password)
 
-    with db._conn() as con:
-        con.execute(
-            f"UPDATE users SET {password_col}=? WHERE username=?",
-            (pw_hash, username),
-        )
+    await db_async.run(db.set_password_hash, username, pw_hash, column=password_col)
+    await revoke_user_tokens(username)
 
     try:
-        db.audit(u.get("username") or "admin", "admin_reset_password", f"user:{username}", None)
+        await db_async.audit(u.get("username") or "admin", "admin_reset_password", f"user:{username}", None)
     except Exception:
         pass
 
     return {"ok": True, "username": username, "password_reset": True}
+
+
+@router.post("/admin/unlock-user")
+async def unlock_user(request: Request, u: Dict[str, Any] = Depends(require_admin)):
+    """Clear users.account_locked (set by LOGIN_LOCK_AFTER_STRIKES or by hand)."""
+    body = await read_json(request)
+    username = (body.get("username") or "").strip()
+    if not username:
+        raise HTTPException(status_code=400, detail="username required")
+    if not await db_async.get_user(username):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    await db_async.run(db.set_account_locked, username, False)
+    reset_login_throttle(username)
+    try:
+        await db_async.audit(u.get("username") or "admin", "unlock_user", f"user:{username}", None)
+    except Exception:
+        pass
+    return {"ok": True, "username": username, "account_locked": False}
+
+
+@router.get("/admin/audit")
+def audit_history(
+    actor: Optional[str] = None,
+    action: Optional[str] = None,
+    target: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    broker_mc: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    u: Dict[str, Any] = Depends(require_admin),
+):
+    """
+    Audit rows newest first, live table plus monthly archives.
+    Filters: actor, action, target (e.g. load:123, user:alice), since/until
+    (ISO timestamp or prefix, until exclusive). broker_mc reads that
+    brokerage's shard when DB_SHARD_BY_MC is on. Page with next_cursor.
+    """
+    try:
+        path = db.shard_path(broker_mc) if (broker_mc and db.DB_SHARD_BY_MC) else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid broker_mc")
+    try:
+        items, next_cursor = db.query_audit(
+            actor=actor,
+            action=action,
+            target=target,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit,
+            path=path,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"ok": True, "count": len(items), "items": items, "next_cursor": next_cursor}
+
+
+@router.post("/admin/audit/rollover")
+def audit_rollover(u: Dict[str, Any] = Depends(require_admin)):
+    """Archive audit months past AUDIT_HOT_MONTHS and prune past AUDIT_RETENTION_MONTHS, now."""
+    return {"ok": True, "results": db.rollover_audit_all()}
+
+
+@router.get("/admin/backup")
+def backup_status(u: Dict[str, Any] = Depends(require_admin)):
+    """Backup settings, the last result per database file and the snapshots on disk."""
+    return {"ok": True, **db.backup_stats()}
+
+
+@router.post("/admin/backup")
+def backup_now(u: Dict[str, Any] = Depends(require_admin)):
+    """Take an online snapshot now (global file plus shards); 409 if one is already running."""
+    try:
+        results = db.backup_all()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        db.audit(u.get("username") or "admin", "backup", "db", db.json_dumps_safe([r["file"] for r in results]))
+    except Exception:
+        pass
+    return {"ok": True, "results": results}
+
+
+@router.post("/admin/loads/archive")
+def archive_paid_loads(u: Dict[str, Any] = Depends(require_admin)):
+    """Move loads paid more than LOAD_ARCHIVE_DAYS ago out of the hot table now (global file plus shards)."""
+    return {"ok": True, "results": db.archive_paid_loads_all()}
+
+
+@router.get("/admin/db-stats")
+def db_stats(top: int = 20, u: Dict[str, Any] = Depends(require_admin)):
+    """
+    Top-N SQL fingerprints by total and by p99 time, the slow-query log (with
+    EXPLAIN plans) and pool/writer/audit/roster counters. Per-statement numbers
+    need DB_INSTRUMENT=1.
+    """
+    return {
+        "ok": True,
+        **db.query_stats(top=max(1, min(int(top), 200))),
+        "pool": db.pool_stats(),
+        "writer": db.writer_stats(),
+        "audit": db.audit_stats(),
+        "roster": db.roster_stats(),
+    }
+
+
+@router.post("/admin/db-stats/reset")
+def db_stats_reset(u: Dict[str, Any] = Depends(require_admin)):
+    db.reset_query_stats()
+    return {"ok": True}
+
+
+@router.get("/admin/auth-stats")
+def auth_stats(u: Dict[str, Any] = Depends(require_admin)):
+    """Verified-token cache, bcrypt pool and login throttle counters (this worker only)."""
+    return {
+        "ok": True,
+        "token_cache": token_cache_stats(),
+        "bcrypt": passwords.stats(),
+        "login_throttle": login_throttle_stats(),
+        "revocations": revocation_stats(),
+    }
+
+
+@router.post("/admin/auth-stats/invalidate")
+async def auth_invalidate(request: Request, u: Dict[str, Any] = Depends(require_admin)):
+    """Drop cached token claims for {"username": ...}, or for everyone with an empty body."""
+    body = await read_json(request)
+    username = (body.get("username") or "").strip() or None
+    return {"ok": True, "invalidated": invalidate_user_tokens(username)}
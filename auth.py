@@ -1,37 +1,59 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import secrets
 import smtplib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from email.message import EmailMessage
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 from fastapi import APIRouter, HTTPException, Depends, Header, Request, Query
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from jose import jwt
 
 import db
+import db_async
+import passwords
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 JWT_SECRET = (os.environ.get("SECRET_KEY") or "dev-secret").strip()
 JWT_ALGO = "HS256"
 
-ACCESS_EXP_HOURS = 24
+# Access tokens are short-lived; clients renew them with the login's refresh
+# token (POST /refresh), which re-reads role and broker_status each time.
+ACCESS_EXP_MINUTES = max(1, db._env_int("ACCESS_EXP_MINUTES", 15))
+REFRESH_EXP_DAYS = max(1, db._env_int("REFRESH_EXP_DAYS", 30))
+# How often each worker pulls new rows from token_revocations.
+REVOCATION_SYNC_SECONDS = max(1, db._env_int("REVOCATION_SYNC_SECONDS", 5))
 RESET_EXP_MIN = 30
 
 
 # -------------------
 # Password hashing
 # -------------------
-def _hash(pw: str) -> str:
-    return pwd_context.hash(pw)
+# bcrypt runs on the passwords.py process pool. Endpoints use the async
+# forms so a login burst waits there instead of holding AnyIO threads.
+def _busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Too many password checks in progress; retry shortly", headers={"Retry-After": "1"})
 
 
-def _verify(pw: str, hashed: str) -> bool:
-    return pwd_context.verify(pw, hashed)
+async def hash_password(pw: str) -> str:
+    try:
+        return await passwords.hash_async(pw)
+    except passwords.PasswordBusy:
+        raise _busy()
+
+
+async def verify_password(pw: str, hashed: str) -> bool:
+    try:
+        return await passwords.verify_async(pw, hashed)
+    except passwords.PasswordBusy:
+        raise _busy()
 
 
 # -------------------
@@ -74,17 +96,29 @@ def _send_email(to_email: str, subject: str, body: str) -> None:
 # -------------------
 # Tokens
 # -------------------
-def _access_token(username: str, role: str, broker_status: str, broker_mc: Optional[str]) -> str:
+def _access_token(
+    username: str, role: str, broker_status: str, broker_mc: Optional[str], sid: Optional[str] = None
+) -> str:
+    now = time.time()
     payload = {
         "username": username,
         "role": role,
         "broker_status": broker_status,
         "broker_mc": broker_mc,
-        "exp": datetime.utcnow() + timedelta(hours=ACCESS_EXP_HOURS),
+        # Fractional iat (RFC 7519 allows it): revocation compares in ms, so a
+        # token minted right after a role change isn't refused with the old ones.
+        "iat": round(now, 3),
+        "exp": int(now) + ACCESS_EXP_MINUTES * 60,
     }
+    if sid:
+        payload["sid"] = sid
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
 
 
+def _refresh_hash(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
 def _reset_token(username: str) -> str:
     payload = {
         "username": username,
@@ -104,14 +138,201 @@ def _decode_reset(token: str) -> str:
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
 
 
+# -------------------
+# Verified-claims cache
+# -------------------
+# The UIs resend the same bearer token on every call, and jwt.decode (HMAC
+# check plus claim parsing) is most of what the auth dependency costs. Claims
+# that verified once are kept, keyed by a digest of the token, until the
+# token's own exp. Per process: each worker warms its own copy.
+TOKEN_CACHE_SIZE = max(0, db._env_int("TOKEN_CACHE_SIZE", 4096))  # 0 disables
+
+
+class TokenCache:
+    """Bounded LRU of verified access-token claims: digest -> (claims, exp)."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidated = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if not self.max_size:
+            return None
+        key = self._key(token)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            claims, exp = hit
+            if time.time() >= exp:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        exp = claims.get("exp")
+        if not self.max_size or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, float(exp))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username: Optional[str] = None) -> int:
+        """Drop every cached token of `username` (all tokens when None); returns how many."""
+        with self._lock:
+            if username is None:
+                keys = list(self._entries)
+            else:
+                keys = [k for k, (claims, _) in self._entries.items() if claims.get("username") == username]
+            for k in keys:
+                del self._entries[k]
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "invalidated": self.invalidated,
+            }
+
+
+_TOKEN_CACHE = TokenCache(TOKEN_CACHE_SIZE)
+
+
+def invalidate_user_tokens(username: Optional[str] = None) -> int:
+    """
+    Forget cached claims for a user whose role, status or password changed, so
+    the next request re-verifies. This does not revoke the token itself.
+    """
+    return _TOKEN_CACHE.invalidate((username or "").strip() if username is not None else None)
+
+
+def token_cache_stats() -> Dict[str, Any]:
+    return _TOKEN_CACHE.stats()
+
+
+# -------------------
+# Revocation
+# -------------------
+# session id -> not_before (epoch ms): that session's access tokens issued
+# (iat) before it are refused. A dict probe per request, no SQLite: each worker replays
+# db.token_revocations by seq every REVOCATION_SYNC_SECONDS, and its own
+# revocations apply at once. An entry can go once every token it refuses has
+# expired anyway, so the map holds at most ACCESS_EXP_MINUTES of revocations.
+class RevocationSet:
+    def __init__(self) -> None:
+        self._not_before: Dict[str, int] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.synced_at = 0.0
+        self.refused = 0
+
+    def add(self, sid: str, not_before: int) -> None:
+        with self._lock:
+            if not_before > self._not_before.get(sid, 0):
+                self._not_before[sid] = not_before
+
+    def refuses(self, claims: Dict[str, Any]) -> bool:
+        sid = claims.get("sid")
+        if sid is None:
+            return False
+        not_before = self._not_before.get(sid)
+        if not_before is None or float(claims.get("iat") or 0) * 1000 >= not_before:
+            return False
+        self.refused += 1
+        return True
+
+    def sync(self) -> int:
+        horizon = int((time.time() - ACCESS_EXP_MINUTES * 60) * 1000)
+        rows = db.token_revocations_since(self._seq, horizon)
+        for seq, sid, not_before in rows:
+            self.add(sid, not_before)
+            self._seq = max(self._seq, seq)
+        with self._lock:
+            for sid in [k for k, v in self._not_before.items() if v < horizon]:
+                del self._not_before[sid]
+            self.synced_at = time.time()
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._not_before),
+                "seq": self._seq,
+                "refused": self.refused,
+                "synced_ago_s": round(time.time() - self.synced_at, 1) if self.synced_at else None,
+            }
+
+
+_REVOCATIONS = RevocationSet()
+
+
+def start_revocation_sync() -> None:
+    """Background replay of token_revocations, plus daily pruning of dead sessions."""
+    db.start_periodic("token_revocations", _REVOCATIONS.sync, REVOCATION_SYNC_SECONDS / 3600.0)
+    db.start_periodic("session_prune", db.prune_sessions, 24.0)
+
+
+async def revoke_user_tokens(
+    username: Optional[str] = None, session_id: Optional[str] = None, end_sessions: bool = True
+) -> int:
+    """
+    Refuse the live access tokens of a user (or one session) from now on.
+    end_sessions=False keeps the sessions, so clients just refresh and pick up
+    the user's new role/broker_status; True logs them out.
+    """
+    logged = await db_async.run(db.revoke_sessions, username, session_id, end_sessions)
+    for sid, not_before in logged:
+        _REVOCATIONS.add(sid, not_before)
+    if username:
+        invalidate_user_tokens(username)
+    return len(logged)
+
+
+def revocation_stats() -> Dict[str, Any]:
+    return _REVOCATIONS.stats()
+
+
 def _decode_access_token(token: str) -> Dict[str, Any]:
-    try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-        if "username" not in data or "role" not in data:
-            raise ValueError("missing claims")
-        return data
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    data = _TOKEN_CACHE.get(token)
+    if data is None:
+        try:
+            data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+            if "username" not in data or "role" not in data:
+                raise ValueError("missing claims")
+        except Exception:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        _TOKEN_CACHE.put(token, data)
+    if _REVOCATIONS.refuses(data):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return dict(data)
 
 
 def _extract_bearer(authorization: Optional[str]) -> str:
@@ -186,6 +407,15 @@ def require_dispatcher_linked(user: Dict[str, Any] = Depends(require_dispatcher)
     return user
 
 
+async def bind_tenant(user: Dict[str, Any] = Depends(get_current_user)) -> None:
+    """
+    Router dependency: route tenant-scoped db helpers (loads, negotiations,
+    audit) to the caller's brokerage shard when DB_SHARD_BY_MC is on.
+    Async on purpose, so the binding lands in the request's own context.
+    """
+    db.set_tenant(user.get("broker_mc"))
+
+
 def require_broker_approved(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
     user = _role_check(user, "broker")
     if (user.get("broker_status") or "none").lower() != "approved":
@@ -193,6 +423,148 @@ def require_broker_approved(user: Dict[str, Any] = Depends(get_current_user)) ->
     return user
 
 
+# -------------------
+# Login throttling
+# -------------------
+# Failed logins are counted per username and per client IP in a sliding
+# window (the two-bucket approximation: current window plus the previous one,
+# weighted by how much of it still overlaps). Once a key reaches its limit it
+# is blocked for LOGIN_BACKOFF_BASE_SECONDS, doubling with each further strike
+# up to LOGIN_BACKOFF_MAX_SECONDS, and /login answers 429 before any bcrypt
+# work. O(1) per check; at most LOGIN_THROTTLE_MAX_KEYS keys are kept (least
+# recently used dropped first), so a flood of random usernames can't grow it.
+# Per process, like the token cache.
+LOGIN_WINDOW_SECONDS = max(1, db._env_int("LOGIN_WINDOW_SECONDS", 300))
+LOGIN_MAX_FAILURES_USER = max(1, db._env_int("LOGIN_MAX_FAILURES_USER", 5))
+LOGIN_MAX_FAILURES_IP = max(1, db._env_int("LOGIN_MAX_FAILURES_IP", 30))
+LOGIN_BACKOFF_BASE_SECONDS = max(1, db._env_int("LOGIN_BACKOFF_BASE_SECONDS", 30))
+LOGIN_BACKOFF_MAX_SECONDS = max(1, db._env_int("LOGIN_BACKOFF_MAX_SECONDS", 900))
+# Strikes on one username before users.account_locked is set (0 = never).
+LOGIN_LOCK_AFTER_STRIKES = max(0, db._env_int("LOGIN_LOCK_AFTER_STRIKES", 0))
+LOGIN_THROTTLE_MAX_KEYS = max(1, db._env_int("LOGIN_THROTTLE_MAX_KEYS", 100_000))
+# X-Forwarded-For is client-controlled except for the hops our own proxies
+# append. Off by default (the peer address is used); with TRUST_FORWARDED_FOR=1
+# the client is the TRUSTED_PROXY_HOPS-th entry from the right (1 = one proxy
+# in front, as on Render).
+TRUST_FORWARDED_FOR = (os.environ.get("TRUST_FORWARDED_FOR") or "0").strip() == "1"
+TRUSTED_PROXY_HOPS = max(1, db._env_int("TRUSTED_PROXY_HOPS", 1))
+
+
+class _Window:
+    __slots__ = ("window", "curr", "prev", "blocked_until", "strikes")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.curr = 0
+        self.prev = 0
+        self.blocked_until = 0.0
+        self.strikes = 0
+
+
+class LoginThrottle:
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[str, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.failures = 0
+        self.blocks = 0
+        self.evictions = 0
+
+    def _entry(self, key: str, now: float, create: bool) -> Optional[_Window]:
+        w = int(now // LOGIN_WINDOW_SECONDS)
+        e = self._keys.get(key)
+        if e is None:
+            if not create:
+                return None
+            e = self._keys[key] = _Window(w)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._keys.move_to_end(key)
+        if e.window != w:
+            e.prev = e.curr if e.window == w - 1 else 0
+            e.curr = 0
+            e.window = w
+        if e.strikes and now > e.blocked_until + LOGIN_BACKOFF_MAX_SECONDS:
+            e.strikes = 0  # quiet for a while: start the backoff over
+        return e
+
+    def retry_after(self, keys: Tuple[Tuple[str, int], ...], now: Optional[float] = None) -> int:
+        """Seconds until these keys may try again; 0 if not blocked."""
+        now = time.time() if now is None else now
+        with self._lock:
+            wait = 0.0
+            for key, _limit in keys:
+                e = self._entry(key, now, create=False)
+                if e is not None and e.blocked_until > now:
+                    wait = max(wait, e.blocked_until - now)
+            if wait:
+                self.rejected += 1
+            return int(wait) + 1 if wait else 0
+
+    def failure(self, keys: Tuple[Tuple[str, int], ...], now: Optional[float] = None) -> int:
+        """Count a failed attempt; returns the first key's strike count."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.failures += 1
+            strikes = []
+            for key, limit in keys:
+                e = self._entry(key, now, create=True)
+                e.curr += 1
+                frac = 1.0 - (now % LOGIN_WINDOW_SECONDS) / LOGIN_WINDOW_SECONDS
+                if e.curr + e.prev * frac >= limit:
+                    e.strikes += 1
+                    backoff = min(LOGIN_BACKOFF_BASE_SECONDS * 2 ** (e.strikes - 1), LOGIN_BACKOFF_MAX_SECONDS)
+                    e.blocked_until = now + backoff
+                    e.curr = e.prev = 0
+                    self.blocks += 1
+                strikes.append(e.strikes)
+            return strikes[0] if strikes else 0
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "keys": len(self._keys),
+                "max_keys": self.max_keys,
+                "blocked_now": sum(1 for e in self._keys.values() if e.blocked_until > now),
+                "failures": self.failures,
+                "blocks": self.blocks,
+                "rejected": self.rejected,
+                "evictions": self.evictions,
+            }
+
+
+_LOGIN_THROTTLE = LoginThrottle(LOGIN_THROTTLE_MAX_KEYS)
+
+
+def _client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        hops = [h.strip() for h in (request.headers.get("x-forwarded-for") or "").split(",")]
+        if len(hops) >= TRUSTED_PROXY_HOPS and hops[-TRUSTED_PROXY_HOPS]:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else ""
+
+
+def _throttle_keys(username: str, ip: str) -> Tuple[Tuple[str, int], ...]:
+    return ((f"user:{username.lower()}", LOGIN_MAX_FAILURES_USER), (f"ip:{ip}", LOGIN_MAX_FAILURES_IP))
+
+
+def reset_login_throttle(username: str) -> None:
+    """Forget a username's failures and backoff (this worker only)."""
+    _LOGIN_THROTTLE.reset(_throttle_keys(username, "")[0][0])
+
+
+def login_throttle_stats() -> Dict[str, Any]:
+    return {**_LOGIN_THROTTLE.stats(), "lock_after_strikes": LOGIN_LOCK_AFTER_STRIKES}
+
+
 # -------------------
 # Models
 # -------------------
@@ -210,6 +582,10 @@ class LoginReq(BaseModel):
     password: str
 
 
+class RefreshReq(BaseModel):
+    refresh_token: str
+
+
 class ForgotReq(BaseModel):
     username: str
 
@@ -278,22 +654,20 @@ async def me_change_password(body: ChangePasswordReq, u: Dict[str, Any] = Depend
     if len(body.new_password or "") < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
-    row = db.get_user(u["username"])
+    row = await db_async.get_user(u["username"])
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
 
     user_row = dict(row)
-    if not _verify(body.current_password, user_row.get("password_hash") or ""):
+    if not await verify_password(body.current_password, user_row.get("password_hash") or ""):
         raise HTTPException(status_code=401, detail="Current password is wrong")
 
+    pw_hash = await hash_password(body.new_password)
     try:
-        with db._conn() as con:
-            con.execute(
-                "UPDATE users SET password_hash=? WHERE username=?",
-                (_hash(body.new_password), u["username"]),
-            )
+        await db_async.run(db.set_password_hash, u["username"], pw_hash)
+        await revoke_user_tokens(u["username"])
         try:
-            db.audit(u["username"], "change_password", f"user:{u['username']}", None)
+            await db_async.audit(u["username"], "change_password", f"user:{u['username']}", None)
         except Exception:
             pass
         return {"ok": True}
@@ -302,7 +676,7 @@ async def me_change_password(body: ChangePasswordReq, u: Dict[str, Any] = Depend
 
 
 @router.post("/_admin/bootstrap-admin", include_in_schema=False)
-def bootstrap_admin(body: BootstrapAdminReq, admin_key: Optional[str] = Query(default=None)):
+async def bootstrap_admin(body: BootstrapAdminReq, admin_key: Optional[str] = Query(default=None)):
     """
     Emergency admin recovery for Render.
 
@@ -319,30 +693,29 @@ def bootstrap_admin(body: BootstrapAdminReq, admin_key: Optional[str] = Query(de
     if len(body.new_password or "") < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
-    row = db.get_user(username)
+    row = await db_async.get_user(username)
+    pw_hash = await hash_password(body.new_password)
     try:
         if not row:
-            db.create_user(
+            await db_async.run(
+                db.create_user,
                 username=username,
-                password_hash=_hash(body.new_password),
+                password_hash=pw_hash,
                 role="admin",
                 broker_mc=None,
                 broker_status="none",
             )
             try:
-                db.audit(username, "bootstrap_admin_create", f"user:{username}", "admin")
+                await db_async.audit(username, "bootstrap_admin_create", f"user:{username}", "admin")
             except Exception:
                 pass
             return {"ok": True, "action": "created", "username": username}
 
         # Exists -> force role admin and reset password
-        with db._conn() as con:
-            con.execute(
-                "UPDATE users SET password_hash=?, role='admin', broker_status='none', broker_mc=NULL WHERE username=?",
-                (_hash(body.new_password), username),
-            )
+        await db_async.run(db.force_admin, username, pw_hash)
+        await revoke_user_tokens(username)
         try:
-            db.audit(username, "bootstrap_admin_reset", f"user:{username}", "admin")
+            await db_async.audit(username, "bootstrap_admin_reset", f"user:{username}", "admin")
         except Exception:
             pass
         return {"ok": True, "action": "reset", "username": username}
@@ -351,7 +724,7 @@ def bootstrap_admin(body: BootstrapAdminReq, admin_key: Optional[str] = Query(de
 
 
 @router.post("/register")
-def register(body: RegisterReq):
+async def register(body: RegisterReq):
     username = (body.username or "").strip()
     role = (body.role or "").strip().lower()
 
@@ -366,7 +739,7 @@ def register(body: RegisterReq):
     if role == "admin":
         raise HTTPException(status_code=403, detail="Admin registration disabled")
 
-    existing = db.get_user(username)
+    existing = await db_async.get_user(username)
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
 
@@ -383,25 +756,27 @@ def register(body: RegisterReq):
 
         broker_status = "pending"
 
+    pw_hash = await hash_password(body.password)
     try:
-        db.create_user(
+        await db_async.run(
+            db.create_user,
             username=username,
-            password_hash=_hash(body.password),
+            password_hash=pw_hash,
             role=role,
             broker_mc=broker_mc,
             broker_status=broker_status,
         )
         if body.email:
-            db.set_email(username, str(body.email).strip().lower())
+            await db_async.run(db.set_email, username, str(body.email).strip().lower())
 
         if role == "broker" and broker_mc:
             try:
-                db.create_broker_request(username, broker_mc)
+                await db_async.run(db.create_broker_request, username, broker_mc)
             except Exception:
                 pass
 
         try:
-            db.audit(username, "register", f"user:{username}", role)
+            await db_async.audit(username, "register", f"user:{username}", role)
         except Exception:
             pass
 
@@ -413,14 +788,22 @@ def register(body: RegisterReq):
 
 
 @router.post("/login")
-def login(body: LoginReq):
+async def login(body: LoginReq, request: Request):
     username = (body.username or "").strip()
     pw = body.password or ""
     if not username or not pw:
         raise HTTPException(status_code=400, detail="Username + password required")
 
-    row = db.get_user(username)
+    keys = _throttle_keys(username, _client_ip(request))
+    wait = _LOGIN_THROTTLE.retry_after(keys)
+    if wait:
+        raise HTTPException(
+            status_code=429, detail="Too many failed logins; try again later", headers={"Retry-After": str(wait)}
+        )
+
+    row = await db_async.get_user(username)
     if not row:
+        _LOGIN_THROTTLE.failure(keys)
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     u = dict(row)
@@ -428,30 +811,90 @@ def login(body: LoginReq):
     if int(u.get("account_locked") or 0) == 1:
         raise HTTPException(status_code=403, detail="Account locked")
 
-    if not _verify(pw, u.get("password_hash") or ""):
+    if not await verify_password(pw, u.get("password_hash") or ""):
+        strikes = _LOGIN_THROTTLE.failure(keys)
+        if LOGIN_LOCK_AFTER_STRIKES and strikes >= LOGIN_LOCK_AFTER_STRIKES:
+            await db_async.run(db.set_account_locked, u.get("username") or username, True)
+            await revoke_user_tokens(u.get("username") or username)
+            try:
+                await db_async.audit("system", "account_locked", f"user:{username}", f"strikes={strikes}")
+            except Exception:
+                pass
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    token = _access_token(
-        u.get("username") or username,
-        u.get("role") or "",
-        u.get("broker_status") or "none",
-        u.get("broker_mc"),
+    reset_login_throttle(username)
+
+    secret = secrets.token_urlsafe(32)
+    sid = await db_async.run(
+        db.create_session, u.get("username") or username, _refresh_hash(secret), REFRESH_EXP_DAYS * 86400
     )
 
     try:
-        db.audit(username, "login", f"user:{username}", None)
+        await db_async.audit(username, "login", f"user:{username}", None)
     except Exception:
         pass
 
+    return _token_response(u, sid, secret)
+
+
+def _token_response(u: Dict[str, Any], sid: str, secret: str) -> Dict[str, Any]:
+    token = _access_token(
+        u.get("username") or "",
+        u.get("role") or "",
+        u.get("broker_status") or "none",
+        u.get("broker_mc"),
+        sid=sid,
+    )
     return {
         "ok": True,
         "token": token,
+        "refresh_token": f"{sid}.{secret}",
+        "expires_in": ACCESS_EXP_MINUTES * 60,
         "role": u.get("role"),
         "broker_status": u.get("broker_status"),
         "broker_mc": u.get("broker_mc"),
     }
 
 
+@router.post("/refresh")
+async def refresh(body: RefreshReq):
+    """
+    Trade a refresh token for a new access token (current role and
+    broker_status) and a new refresh token; the old one stops working.
+    """
+    sid, _, secret = (body.refresh_token or "").strip().partition(".")
+    if not sid or not secret:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+    new_secret = secrets.token_urlsafe(32)
+    status, username, not_before = await db_async.run(
+        db.rotate_session, sid, _refresh_hash(secret), _refresh_hash(new_secret)
+    )
+    if status == "reused":
+        # rotate_session already revoked the session; apply it here without waiting for the sync.
+        _REVOCATIONS.add(sid, not_before)
+        try:
+            await db_async.audit("system", "refresh_token_reused", f"session:{sid}", None)
+        except Exception:
+            pass
+    if status != "ok":
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+    row = await db_async.get_user(username)
+    u = dict(row) if row else None
+    if not u or int(u.get("account_locked") or 0) == 1:
+        await revoke_user_tokens(session_id=sid)
+        raise HTTPException(status_code=403 if u else 401, detail="Account locked" if u else "User not found")
+    return _token_response(u, sid, new_secret)
+
+
+@router.post("/logout")
+async def logout(u: Dict[str, Any] = Depends(get_current_user)):
+    """End the caller's session: its refresh token and access tokens stop working."""
+    ended = await revoke_user_tokens(session_id=u["sid"]) if u.get("sid") else 0
+    return {"ok": True, "ended": ended}
+
+
 @router.post("/forgot-password")
 def forgot_password(body: ForgotReq):
     username = (body.username or "").strip()
@@ -489,20 +932,18 @@ def password_reset_request(body: ForgotReq):
 
 
 @router.post("/reset-password")
-def reset_password(body: ResetReq):
+async def reset_password(body: ResetReq):
     username = _decode_reset(body.token)
 
     if len(body.new_password or "") < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
+    pw_hash = await hash_password(body.new_password)
     try:
-        with db._conn() as con:
-            con.execute(
-                "UPDATE users SET password_hash=? WHERE username=?",
-                (_hash(body.new_password), username),
-            )
+        await db_async.run(db.set_password_hash, username, pw_hash)
+        await revoke_user_tokens(username)
         try:
-            db.audit(username, "password_reset", f"user:{username}", None)
+            await db_async.audit(username, "password_reset", f"user:{username}", None)
         except Exception:
             pass
         return {"ok": True}
@@ -511,5 +952,5 @@ def reset_password(body: ResetReq):
 
 
 @router.post("/password-reset/confirm")
-def password_reset_confirm(body: ResetReq):
-    return reset_password(body)
+async def password_reset_confirm(body: ResetReq):
+    return await reset_password(body)
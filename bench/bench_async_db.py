@@ -0,0 +1,113 @@
+"""
+Do concurrent requests still make progress while one async route waits on the
+SQLite write lock?
+
+Usage:
+    python bench/bench_async_db.py [--hold 1.0] [--readers 6]
+
+A separate connection holds the write lock for --hold seconds. Meanwhile one
+async write (/driver/loads/{id}/status) queues behind it and --readers async
+reads (/broker/loads/{id}/negotiate input validation, which only reads) are
+fired at the same moment. "inline" runs db calls on the event loop the way the
+routes used to; "executor" is db_async. Needs httpx.
+
+Keep --readers below DB_POOL_SIZE: inline mode has no way to wait for a pooled
+connection without blocking the loop, so more readers than connections stalls
+it for DB_POOL_TIMEOUT (which is part of what db_async fixes).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+import db_async  # noqa: E402
+
+
+async def _inline_run(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def _hold_write_lock(path: str, seconds: float, started: threading.Event) -> None:
+    con = sqlite3.connect(path, timeout=30)
+    con.execute("BEGIN IMMEDIATE")
+    started.set()
+    time.sleep(seconds)
+    con.rollback()
+    con.close()
+
+
+async def _scenario(client, hold: float, readers: int, lid: int, hb: dict, hr: dict) -> tuple[float, list[float]]:
+    started = threading.Event()
+    t = threading.Thread(target=_hold_write_lock, args=(db.DB_PATH, hold, started))
+    t.start()
+    started.wait()
+
+    async def timed(coro):
+        t0 = time.perf_counter()
+        await coro
+        return (time.perf_counter() - t0) * 1000.0
+
+    write = asyncio.create_task(
+        timed(client.post(f"/driver/loads/{lid}/status", json={"status": "loaded"}, headers=hr))
+    )
+    await asyncio.sleep(0.01)  # let the write reach the lock first
+    reads = [
+        asyncio.create_task(timed(client.post(f"/broker/loads/{lid}/negotiate", json={}, headers=hb)))
+        for _ in range(readers)
+    ]
+    read_ms = await asyncio.gather(*reads)
+    write_ms = await write
+    t.join()
+    return write_ms, sorted(read_ms)
+
+
+async def amain(hold: float, readers: int) -> None:
+    import httpx
+
+    import auth
+    import main as app_main
+
+    db.create_user("bench_broker", "x", "broker", broker_mc="MC1", broker_status="approved")
+    db.create_user("bench_driver", "x", "driver", broker_mc="MC1")
+    lid = db.create_load("MC1", "Dallas TX 75001", "New York NY 10001", "bench_broker", visibility="published")
+    db.transition_load("assign_driver", lid, "bench_broker", mc="MC1", driver="bench_driver")
+    hb = {"Authorization": "Bearer " + auth._access_token("bench_broker", "broker", "approved", "MC1")}
+    hr = {"Authorization": "Bearer " + auth._access_token("bench_driver", "driver", "none", "MC1")}
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"write lock held for {hold:.2f}s, {readers} concurrent reads")
+        print(f"{'mode':<10}{'write ms':>10}{'read p50 ms':>13}{'read max ms':>13}")
+        real_run = db_async.run
+        for mode in ("inline", "executor"):
+            db_async.run = _inline_run if mode == "inline" else real_run
+            write_ms, read_ms = await _scenario(client, hold, readers, lid, hb, hr)
+            print(f"{mode:<10}{write_ms:>10.1f}{read_ms[len(read_ms) // 2]:>13.1f}{read_ms[-1]:>13.1f}")
+        db_async.run = real_run
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hold", type=float, default=1.0)
+    ap.add_argument("--readers", type=int, default=6)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.migrate()
+        asyncio.run(amain(args.hold, args.readers))
+        db.shutdown_audit()
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
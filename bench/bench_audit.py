@@ -0,0 +1,67 @@
+"""
+Caller-side latency of db.audit() with inline inserts vs the group-commit writer.
+
+Usage:
+    python bench/bench_audit.py [--n 5000] [--threads 8]
+
+Each thread calls db.audit() in a loop; we report p50/p99 of the call itself
+(what a request pays) and overall rows/s including the final drain.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def _run(n: int, threads: int) -> tuple[list[float], float]:
+    def work(k: int) -> float:
+        t0 = time.perf_counter()
+        db.audit(f"user{k % 50}", "driver_status", f"load:{k}", "at_pickup")
+        return (time.perf_counter() - t0) * 1e6
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        lat = list(ex.map(work, range(n)))
+    db.flush_audit(30.0)
+    return lat, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5000)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.migrate()
+        print(f"{'mode':<8}{'p50 us':>10}{'p99 us':>10}{'max us':>12}{'rows/s':>10}")
+        for mode, enabled in (("inline", False), ("queued", True)):
+            db.AUDIT_ASYNC = enabled
+            lat, secs = _run(args.n, args.threads)
+            print(
+                f"{mode:<8}{statistics.median(lat):>10.1f}{_pct(lat, 0.99):>10.1f}"
+                f"{max(lat):>12.1f}{args.n / secs:>10.0f}"
+            )
+        print("writer:", db.audit_stats())
+        db.shutdown_audit()
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Online backup under write load: db.backup_database() vs a plain stepped backup.
+
+Usage:
+    python bench/bench_backup.py [--loads 50000] [--writers 4] [--pages 256]
+
+Both copy BACKUP_PAGES_PER_STEP pages per step while --writers threads keep
+updating loads. "plain" calls Connection.backup() with no read transaction,
+so every commit from a writer restarts the copy from page 1 (watch steps);
+"db" pins a WAL snapshot for the whole copy. The writer columns show what
+the application saw meanwhile.
+
+Sample run (Linux VM, 39 MB database, 4 writers, 256 pages/step, 30s cap):
+
+    mode      steps  seconds  writes  w max ms
+    plain     21268      inf   32232      55.4
+    db           38     0.12     282      34.9
+
+"inf" means the plain backup was still restarting when the cap hit.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _seed(n: int) -> None:
+    row = {c: None for c in db.BULK_LOAD_COLUMNS}
+    rows = [dict(row, pickup_address=f"{i} Main St 75001 " + "x" * 200, delivery_address="1 Broad St") for i in range(n)]
+    for k in range(0, n, 5000):
+        db.bulk_upsert_loads("MC1", rows[k:k + 5000], "b1")
+
+
+def _plain_backup(pages: int, timeout: float) -> dict:
+    src = db._open_connection(db.DB_PATH, readonly=True)
+    dst = sqlite3.connect(os.path.join(os.path.dirname(db.DB_PATH), "plain.db"))
+    steps = 0
+    t0 = time.perf_counter()
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal steps
+        steps += 1
+        if time.perf_counter() - t0 > timeout:
+            raise TimeoutError
+
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+        seconds = time.perf_counter() - t0
+    except TimeoutError:
+        seconds = float("inf")
+    finally:
+        src.close()
+        dst.close()
+    return {"steps": steps, "seconds": seconds}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--loads", type=int, default=50000)
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--pages", type=int, default=256)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    args = ap.parse_args()
+
+    db.AUDIT_ASYNC = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.BACKUP_DIR = os.path.join(tmp, "backups")
+        db.migrate()
+        _seed(args.loads)
+        print(f"database {os.path.getsize(db.DB_PATH) / 1e6:.1f} MB")
+
+        stop = threading.Event()
+        lat: list[float] = []
+
+        def writer(k: int) -> None:
+            i = 0
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                db.update_load_fields(1 + (i * args.writers + k) % 1000, "b1", {"notes": f"w{i}"})
+                lat.append((time.perf_counter() - t0) * 1e3)
+                i += 1
+                time.sleep(0.002)
+
+        threads = [threading.Thread(target=writer, args=(k,)) for k in range(args.writers)]
+        for t in threads:
+            t.start()
+        print(f"{'mode':<7}{'steps':>8}{'seconds':>9}{'writes':>8}{'w max ms':>10}")
+        for mode in ("plain", "db"):
+            lat.clear()
+            if mode == "plain":
+                r = _plain_backup(args.pages, args.timeout)
+            else:
+                r = db.backup_database(pages=args.pages)
+            print(f"{mode:<7}{r['steps']:>8}{r['seconds']:>9.2f}{len(lat):>8}{max(lat, default=0):>10.1f}")
+        stop.set()
+        for t in threads:
+            t.join()
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Load-board read latency during a login storm: bcrypt on AnyIO threads vs the
+passwords.py process pool.
+
+Usage:
+    python bench/bench_bcrypt.py [--logins 60] [--reads 100] [--workers 2]
+
+Fires --logins concurrent POST /login calls and, meanwhile, --reads
+GET /broker/loads calls 20ms apart, all in-process through httpx's ASGI
+transport. "threads" reproduces the old inline bcrypt by running each hash on
+AnyIO's thread pool (what a sync endpoint did); "pool" is the current path.
+
+Sample run (1-vCPU Linux VM, 60 logins, 2 workers):
+
+    mode      login s   read p50 ms   read p99 ms
+    threads      22.0          54.4       14229.2
+    pool         21.6          12.0          57.5
+
+A single core is the worst case for the pool, since workers and the app
+share it. More cores shorten the storm itself.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import anyio.to_thread  # noqa: E402
+import httpx  # noqa: E402
+
+import auth  # noqa: E402
+import db  # noqa: E402
+import passwords  # noqa: E402
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+async def _threads_verify(pw: str, hashed: str) -> bool:
+    return await anyio.to_thread.run_sync(passwords.pwd_context.verify, pw, hashed)
+
+
+async def _storm(app, logins: int, reads: int) -> tuple[float, list[float]]:
+    hb = {"Authorization": "Bearer " + auth._access_token("b1", "broker", "approved", "MC1")}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(i: int) -> None:
+            r = await client.post("/login", json={"username": f"d{i}", "password": "password123"})
+            assert r.status_code == 200, r.text
+
+        async def read() -> float:
+            t0 = time.perf_counter()
+            r = await client.get("/broker/loads?limit=50", headers=hb)
+            assert r.status_code == 200, r.text
+            return (time.perf_counter() - t0) * 1e3
+
+        t0 = time.perf_counter()
+        storm = [asyncio.create_task(login(i)) for i in range(logins)]
+        lat = []
+        for _ in range(reads):
+            lat.append(await read())
+            await asyncio.sleep(0.02)
+        await asyncio.gather(*storm)
+        return time.perf_counter() - t0, lat
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--logins", type=int, default=60)
+    ap.add_argument("--reads", type=int, default=100)
+    ap.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args()
+
+    db.AUDIT_ASYNC = False
+    passwords.BCRYPT_WORKERS = args.workers
+    passwords.BCRYPT_MAX_PENDING = max(passwords.BCRYPT_MAX_PENDING, args.logins)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.migrate()
+        hashed = passwords.pwd_context.hash("password123")
+        for i in range(args.logins):
+            db.create_user(f"d{i}", hashed, "driver")
+        for i in range(200):
+            db.create_load("MC1", f"{i} Main St 75001", f"{i} Broad St 10001", "b1")
+
+        import main as app_main
+
+        passwords.start()
+        print(f"{'mode':<8}{'login s':>9}{'read p50 ms':>14}{'read p99 ms':>14}")
+        for mode in ("threads", "pool"):
+            verify = passwords.verify_async
+            if mode == "threads":
+                passwords.verify_async = _threads_verify
+            try:
+                secs, lat = asyncio.run(_storm(app_main.app, args.logins, args.reads))
+            finally:
+                passwords.verify_async = verify
+            print(f"{mode:<8}{secs:>9.1f}{statistics.median(lat):>14.1f}{_pct(lat, 0.99):>14.1f}")
+        print("pool:", passwords.stats())
+        passwords.shutdown()
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
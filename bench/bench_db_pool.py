@@ -0,0 +1,74 @@
+"""
+Throughput of db.get_user / db.get_load with and without the connection pool.
+
+Usage:
+    python bench/bench_db_pool.py [--n 2000] [--threads 1,4,8]
+
+"Unpooled" is DB_POOL_SIZE=0: a fresh sqlite3.connect plus PRAGMAs for every
+call. (Before migrations moved to startup, each call also re-ran the schema
+setup, so the original per-call cost was higher still.) Runs against a
+throwaway database in a temp directory.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _seed(n_users: int = 200, n_loads: int = 2000) -> None:
+    for i in range(n_users):
+        db.create_user(f"user{i}", "x", "driver", broker_mc="MC1")
+    for i in range(n_loads):
+        db.upsert_load({"id": str(i + 1), "broker_mc": "MC1", "shipper_name": f"shipper {i}"})
+
+
+def _run(n: int, threads: int) -> float:
+    def work(k: int) -> None:
+        db.get_user(f"user{k % 200}")
+        db.get_load(str(k % 2000 + 1))
+
+    t0 = time.perf_counter()
+    if threads <= 1:
+        for k in range(n):
+            work(k)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            list(ex.map(work, range(n)))
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=2000, help="get_user+get_load pairs per run")
+    ap.add_argument("--threads", default="1,4,8")
+    args = ap.parse_args()
+    thread_counts = [int(x) for x in args.threads.split(",") if x.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        _seed()
+
+        print(f"{'mode':<10}{'threads':>8}{'ops/s':>12}{'us/op':>10}")
+        for mode, size in (("unpooled", 0), ("pooled", max(db.DB_POOL_SIZE, 1))):
+            db.close_pool()
+            db.DB_POOL_SIZE = size
+            for threads in thread_counts:
+                _run(min(200, args.n), threads)  # warm-up
+                secs = _run(args.n, threads)
+                ops = 2 * args.n
+                print(f"{mode:<10}{threads:>8}{ops / secs:>12.0f}{secs / ops * 1e6:>10.1f}")
+        print("pool:", db.pool_stats())
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
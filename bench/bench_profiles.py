@@ -0,0 +1,89 @@
+"""
+Throughput and latency of each DB_PROFILE on the loads/audit workload.
+
+Usage:
+    python bench/bench_profiles.py [--n 3000] [--threads 8] [--dir /tmp]
+
+Each task is one "request": create or update a load plus an inline audit row
+(the audit writer is disabled so every task pays its own commit), with a read
+of a broker page mixed in. Run it on the disk you deploy to: --dir defaults to
+the system temp dir, which is where Render keeps the database.
+
+Sample run (Linux VM, tmp dir, 8 threads, n=3000):
+
+    profile      ops/s   p50 ms   p99 ms
+    durable       1922     0.43    82.90
+    balanced      3729     0.14    36.56
+    fast          4440     0.11    23.34
+
+Numbers move a lot with the disk; rerun before changing the default.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def _run(n: int, threads: int) -> tuple[list[float], float]:
+    ids = [db.create_load("MC1", f"{i} Main St 75001", f"{i} Broad St 10001", "b1") for i in range(50)]
+    rnd = random.Random(11)
+    plan = [rnd.random() for _ in range(n)]
+
+    def work(k: int) -> float:
+        t0 = time.perf_counter()
+        r = plan[k]
+        if r < 0.3:
+            lid = db.create_load("MC1", f"{k} Elm St 75001", f"{k} Oak St 10001", "b1")
+            db.audit("b1", "create_load", f"load:{lid}", None)
+        elif r < 0.8:
+            lid = ids[k % len(ids)]
+            db.update_load_fields(lid, "b1", {"notes": f"n{k}"})
+            db.audit("b1", "update_load", f"load:{lid}", None)
+        else:
+            db.list_loads_by_broker_page("MC1", limit=50)
+        return (time.perf_counter() - t0) * 1e3
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        lat = list(ex.map(work, range(n)))
+    return lat, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=3000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--dir", default=None, help="directory for the bench database")
+    args = ap.parse_args()
+
+    db.AUDIT_ASYNC = False
+    print(f"{'profile':<10}{'ops/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for profile in db.DB_PROFILES:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            db.DB_PATH = os.path.join(tmp, "bench.db")
+            db.DB_PROFILE = profile
+            db.migrate()
+            lat, secs = _run(args.n, args.threads)
+            print(f"{profile:<10}{args.n / secs:>9.0f}{statistics.median(lat):>9.2f}{_pct(lat, 0.99):>9.2f}")
+            db.shutdown_writer()
+            db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Write throughput across brokerages with one shared file vs DB_SHARD_BY_MC.
+
+Usage:
+    python bench/bench_shards.py [--tenants 8] [--n 4000] [--threads 16] [--hold 1.0]
+
+Two measurements per mode:
+
+  mixed   each task binds a tenant and does a load update plus an inline
+          audit row in one unit of work, i.e. what a transition request costs.
+  blocked one tenant holds its write lock for --hold seconds (a big import);
+          we time writes from the other tenants meanwhile. With one file they
+          wait out the whole hold; with shards they don't notice it.
+
+The mixed numbers are about even on a fast disk (the GIL, not the write lock,
+is the bottleneck there); the blocked column is the point of sharding.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def _run(tenants: list[str], n: int, threads: int) -> tuple[list[float], float]:
+    ids = {}
+    for mc in tenants:
+        with db.tenant(mc):
+            ids[mc] = [db.create_load(mc, f"{i} Main St 75001", f"{i} Broad St 10001", "b1") for i in range(20)]
+
+    def work(k: int) -> float:
+        mc = tenants[k % len(tenants)]
+        lid = ids[mc][k % 20]
+        t0 = time.perf_counter()
+        with db.tenant(mc), db.unit_of_work():
+            db.update_load_fields(lid, "b1", {"notes": f"n{k}"})
+            db.audit("b1", "update_load", f"load:{lid}", None)
+        return (time.perf_counter() - t0) * 1e3
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        lat = list(ex.map(work, range(n)))
+    return lat, time.perf_counter() - t0
+
+
+def _blocked(tenants: list[str], hold: float) -> float:
+    """Max latency of other tenants' writes while tenants[0] holds its write lock."""
+    locked = threading.Event()
+
+    def holder() -> None:
+        with db.tenant(tenants[0]), db.unit_of_work():
+            db.update_load_fields(1, "b1", {"notes": "bulk"})
+            locked.set()
+            time.sleep(hold)
+
+    t = threading.Thread(target=holder)
+    t.start()
+    locked.wait()
+    worst = 0.0
+    for mc in tenants[1:]:
+        t0 = time.perf_counter()
+        with db.tenant(mc):
+            db.update_load_fields(1, "b1", {"notes": "other"})
+        worst = max(worst, (time.perf_counter() - t0) * 1e3)
+    t.join()
+    return worst
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tenants", type=int, default=8)
+    ap.add_argument("--n", type=int, default=4000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--hold", type=float, default=1.0)
+    args = ap.parse_args()
+
+    db.AUDIT_ASYNC = False
+    tenants = [f"MC{i:03d}" for i in range(args.tenants)]
+    print(f"{'mode':<8}{'ops/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'blocked max ms':>16}")
+    for mode, sharded in (("single", False), ("sharded", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db.DB_PATH = os.path.join(tmp, "bench.db")
+            db.DB_SHARD_BY_MC = sharded
+            db.migrate()
+            lat, secs = _run(tenants, args.n, args.threads)
+            worst = _blocked(tenants, args.hold)
+            print(
+                f"{mode:<8}{args.n / secs:>9.0f}{statistics.median(lat):>9.2f}"
+                f"{_pct(lat, 0.99):>9.2f}{worst:>16.1f}"
+            )
+            db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
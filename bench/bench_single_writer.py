@@ -0,0 +1,96 @@
+"""
+Mixed read/write throughput: pooled read-write connections vs DB_SINGLE_WRITER.
+
+Usage:
+    python bench/bench_single_writer.py [--n 4000] [--threads 16] [--write-ratio 0.3]
+
+Each task either updates a load (update_load_fields) or reads one (get_load).
+In "pool" mode every thread writes through its own connection and contends on
+SQLite's write lock; in "single" mode writes queue on the writer thread, which
+group-commits them while readers keep using the pool.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else 0.0
+
+
+def _seed(loads: int) -> list[int]:
+    return [
+        db.create_load("MC1", f"{i} Main St 75001", f"{i} Broad St 10001", "b1", visibility="published")
+        for i in range(loads)
+    ]
+
+
+def _run(ids: list[int], n: int, threads: int, write_ratio: float) -> tuple[list[float], list[float], int, float]:
+    rnd = random.Random(7)
+    plan = [(rnd.random() < write_ratio, rnd.choice(ids)) for _ in range(n)]
+    errors = 0
+
+    def work(item: tuple[bool, int]) -> tuple[bool, float]:
+        nonlocal errors
+        is_write, lid = item
+        t0 = time.perf_counter()
+        try:
+            if is_write:
+                db.update_load_fields(lid, "b1", {"notes": f"n{time.perf_counter_ns()}"})
+            else:
+                db.get_load(lid)
+        except Exception:
+            errors += 1
+        return is_write, (time.perf_counter() - t0) * 1e3
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        out = list(ex.map(work, plan))
+    secs = time.perf_counter() - t0
+    writes = [ms for w, ms in out if w]
+    reads = [ms for w, ms in out if not w]
+    return writes, reads, errors, secs
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=4000)
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--write-ratio", type=float, default=0.3)
+    args = ap.parse_args()
+
+    db.AUDIT_ASYNC = False
+    print(f"{'mode':<8}{'ops/s':>9}{'w p50 ms':>10}{'w p99 ms':>10}{'r p50 ms':>10}{'r p99 ms':>10}{'errors':>8}")
+    for mode, single in (("pool", False), ("single", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db.DB_PATH = os.path.join(tmp, "bench.db")
+            db.DB_SINGLE_WRITER = single
+            db.migrate()
+            ids = _seed(200)
+            writes, reads, errors, secs = _run(ids, args.n, args.threads, args.write_ratio)
+            print(
+                f"{mode:<8}{args.n / secs:>9.0f}"
+                f"{statistics.median(writes):>10.2f}{_pct(writes, 0.99):>10.2f}"
+                f"{statistics.median(reads):>10.2f}{_pct(reads, 0.99):>10.2f}{errors:>8}"
+            )
+            if single:
+                print("writer:", db.writer_stats())
+            db.shutdown_writer()
+            db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
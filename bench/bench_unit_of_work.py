@@ -0,0 +1,75 @@
+"""
+Commits (WAL fsyncs) and pool checkouts per request, with and without the
+request-scoped unit of work (db.request_unit_of_work).
+
+Usage:
+    python bench/bench_unit_of_work.py [--n 200]
+
+Drives the real routers through FastAPI's TestClient (needs httpx) against a
+throwaway database: create -> publish -> assign-driver -> driver status.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def _counters() -> tuple[int, int]:
+    s = db.pool_stats()
+    return s["commits"], s.get("checkouts", 0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200, help="load lifecycles per mode")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.migrate()
+
+        from fastapi.testclient import TestClient
+
+        import auth
+        import main as app_main
+
+        db.create_user("bench_broker", "x", "broker", broker_mc="MC1", broker_status="approved")
+        db.create_user("bench_disp", "x", "dispatcher", broker_mc="MC1")
+        db.create_user("bench_driver", "x", "driver", broker_mc="MC1")
+        hb = {"Authorization": "Bearer " + auth._access_token("bench_broker", "broker", "approved", "MC1")}
+        hd = {"Authorization": "Bearer " + auth._access_token("bench_disp", "dispatcher", "none", "MC1")}
+        hr = {"Authorization": "Bearer " + auth._access_token("bench_driver", "driver", "none", "MC1")}
+
+        print(f"{'mode':<14}{'requests':>10}{'commits/req':>13}{'checkouts/req':>15}{'ms/req':>9}")
+        with TestClient(app_main.app) as client:
+            for mode, enabled in (("per-helper", False), ("per-request", True)):
+                db.REQUEST_UNIT_OF_WORK = enabled
+                c0, k0 = _counters()
+                t0 = time.perf_counter()
+                reqs = 0
+                for _ in range(args.n):
+                    lid = client.post(
+                        "/broker/loads/create",
+                        json={"pickup_address": "Dallas TX 75001", "delivery_address": "New York NY 10001"},
+                        headers=hb,
+                    ).json()["load_id"]
+                    client.post(f"/broker/loads/{lid}/publish", headers=hb)
+                    client.post(f"/dispatcher/loads/{lid}/assign-driver", json={"driver_username": "bench_driver"}, headers=hd)
+                    client.post(f"/driver/loads/{lid}/status", json={"status": "at_pickup"}, headers=hr)
+                    reqs += 4
+                secs = time.perf_counter() - t0
+                c1, k1 = _counters()
+                print(f"{mode:<14}{reqs:>10}{(c1 - c0) / reqs:>13.2f}{(k1 - k0) / reqs:>15.2f}{secs / reqs * 1000:>9.2f}")
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
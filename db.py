@@ -1,11 +1,24 @@
 from __future__ import annotations
 
+import atexit
+import base64
+import importlib
+import json
 import os
+import queue
+import re
+import secrets
 import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
 from contextlib import contextmanager
-from datetime import datetime, timezone
+from concurrent.futures import Future
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 # ---------------------------
 # Environment helpers
@@ -40,13 +53,387 @@ def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 # ---------------------------
-# SQLite connection
+# SQLite connection pool
 # ---------------------------
 
-@contextmanager
-def _conn():
-    _ensure_parent_dir(DB_PATH)
-    con = sqlite3.connect(DB_PATH, timeout=30)
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(get_env(key, str(default)).strip() or default)
+    except Exception:
+        return default
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(get_env(key, str(default)).strip() or default)
+    except Exception:
+        return default
+
+# DB_POOL_SIZE=0 disables pooling (one fresh connection per call, the old behaviour).
+DB_POOL_SIZE = max(0, _env_int("DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = max(0.0, _env_float("DB_POOL_TIMEOUT", 10.0))
+DB_BUSY_TIMEOUT = max(0.0, _env_float("DB_BUSY_TIMEOUT", 30.0))
+
+class PoolTimeout(RuntimeError):
+    pass
+
+# DB_SINGLE_WRITER=1: all writes go through one writer thread that owns the only
+# read-write connection; pooled connections become query_only readers.
+DB_SINGLE_WRITER = get_env("DB_SINGLE_WRITER", "0").strip() == "1"
+DB_WRITE_QUEUE_MAX = max(1, _env_int("DB_WRITE_QUEUE_MAX", 10000))
+DB_WRITE_BATCH = max(1, _env_int("DB_WRITE_BATCH", 200))
+
+# ---------------------------
+# Performance profiles
+# ---------------------------
+#
+# Per-connection PRAGMAs, picked with DB_PROFILE and applied once when a
+# connection is opened (so once per pooled connection, not per request).
+# bench/bench_profiles.py measures each one on the loads/audit workload.
+#
+#   durable   synchronous=FULL: every commit is fsynced; survives power loss.
+#   balanced  synchronous=NORMAL: WAL is fsynced at checkpoints only. A crash
+#             can lose the last few commits but never corrupts the file.
+#             Default; the Render disk in /tmp is ephemeral anyway.
+#   fast      synchronous=OFF plus larger caches and checkpoints. An OS crash
+#             can corrupt the database; only for scratch/bulk-load databases.
+#
+# cache_size is negative KiB (SQLite convention); mmap_size is bytes.
+
+DB_PROFILES: Dict[str, Dict[str, Any]] = {
+    "durable": {
+        "synchronous": "FULL",
+        "cache_size": -8000,
+        "temp_store": "DEFAULT",
+        "mmap_size": 0,
+        "wal_autocheckpoint": 1000,
+    },
+    "balanced": {
+        "synchronous": "NORMAL",
+        "cache_size": -32000,
+        "temp_store": "MEMORY",
+        "mmap_size": 128 * 1024 * 1024,
+        "wal_autocheckpoint": 1000,
+    },
+    "fast": {
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+        "mmap_size": 256 * 1024 * 1024,
+        "wal_autocheckpoint": 4000,
+    },
+}
+
+DB_PROFILE = get_env("DB_PROFILE", "balanced").strip().lower()
+if DB_PROFILE not in DB_PROFILES:
+    print(f"[db] unknown DB_PROFILE={DB_PROFILE!r}; using 'balanced'")
+    DB_PROFILE = "balanced"
+
+def _apply_profile(con: sqlite3.Connection, profile: str) -> None:
+    for pragma, value in DB_PROFILES[profile].items():
+        con.execute(f"PRAGMA {pragma}={value};")
+
+def profile_status(path: Optional[str] = None) -> Dict[str, Any]:
+    """Configured profile and the values SQLite actually reports for it."""
+    con = _open_connection(path or DB_PATH)
+    try:
+        effective = {p: con.execute(f"PRAGMA {p};").fetchone()[0] for p in DB_PROFILES[DB_PROFILE]}
+        effective["journal_mode"] = con.execute("PRAGMA journal_mode;").fetchone()[0]
+    finally:
+        con.close()
+    return {"profile": DB_PROFILE, "configured": dict(DB_PROFILES[DB_PROFILE]), "effective": effective}
+
+# ---------------------------
+# Query instrumentation
+# ---------------------------
+#
+# DB_INSTRUMENT=1 opens every connection (pool, single writer, audit writer,
+# maintenance jobs) as an InstrumentedConnection. Each statement is recorded
+# under its fingerprint (literals and IN-lists folded) with its duration
+# (execute plus fetches), rows returned and busy time, into per-fingerprint
+# histograms read by query_stats() / GET /admin/db-stats.
+#
+# Busy time is time spent waiting for the write lock. An instrumented
+# connection opens the implicit transaction of a write itself with BEGIN
+# IMMEDIATE and times it, so the lock wait is measured on its own instead
+# of being folded into the statement; explicit BEGIN IMMEDIATEs (single
+# writer, migrations) count as busy time too. WAL readers never wait.
+#
+# Statements slower than DB_SLOW_MS go to the slow-query log (the last
+# DB_SLOW_LOG_MAX in memory, plus JSON lines appended to DB_SLOW_LOG if set)
+# together with their EXPLAIN QUERY PLAN.
+
+DB_INSTRUMENT = get_env("DB_INSTRUMENT", "0").strip() == "1"
+DB_SLOW_MS = max(0.0, _env_float("DB_SLOW_MS", 100.0))
+DB_SLOW_LOG = get_env("DB_SLOW_LOG", "").strip()
+DB_SLOW_LOG_MAX = max(1, _env_int("DB_SLOW_LOG_MAX", 200))
+
+# Histogram bucket upper bounds in ms; percentiles report the bucket bound.
+_LATENCY_BUCKETS_MS = (
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0, 5000.0, 10000.0,
+    float("inf"),
+)
+
+_FP_STRING = re.compile(r"'(?:[^']|'')*'")
+_FP_NUMBER = re.compile(r"(?<![\w?.])-?\d+(?:\.\d+)?")
+_FP_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_FP_SPACE = re.compile(r"\s+")
+_FP_CACHE: Dict[str, str] = {}
+
+def sql_fingerprint(sql: str) -> str:
+    fp = _FP_CACHE.get(sql)
+    if fp is None:
+        fp = _FP_STRING.sub("?", sql)
+        fp = _FP_NUMBER.sub("?", fp)
+        fp = _FP_IN_LIST.sub("IN (...)", fp)
+        fp = _FP_SPACE.sub(" ", fp).strip().rstrip(";")
+        if len(_FP_CACHE) < 4096:
+            _FP_CACHE[sql] = fp
+    return fp
+
+def _is_write_sql(sql: str) -> bool:
+    head = sql.lstrip()[:7].upper()
+    return head.startswith(("INSERT", "UPDATE", "DELETE", "REPLACE"))
+
+class QueryStats:
+    """Per-fingerprint latency histograms plus the slow-query log."""
+
+    def __init__(self, slow_max: int = DB_SLOW_LOG_MAX):
+        self._lock = threading.Lock()
+        self._by_fp: Dict[str, Dict[str, Any]] = {}
+        self._slow: "deque[Dict[str, Any]]" = deque(maxlen=slow_max)
+        self._explain_cons: Dict[str, sqlite3.Connection] = {}
+
+    def record(self, sql: str, ms: float, rows: int, busy_ms: float, path: Optional[str], params: Any) -> None:
+        fp = sql_fingerprint(sql)
+        bucket = 0
+        while ms > _LATENCY_BUCKETS_MS[bucket]:
+            bucket += 1
+        with self._lock:
+            e = self._by_fp.get(fp)
+            if e is None:
+                e = self._by_fp[fp] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "busy_ms": 0.0,
+                    "buckets": [0] * len(_LATENCY_BUCKETS_MS),
+                }
+            e["count"] += 1
+            e["total_ms"] += ms
+            e["rows"] += rows
+            e["busy_ms"] += busy_ms
+            e["buckets"][bucket] += 1
+            if ms > e["max_ms"]:
+                e["max_ms"] = ms
+        if DB_SLOW_MS and ms >= DB_SLOW_MS:
+            self._log_slow(sql, fp, ms, rows, busy_ms, path, params)
+
+    def _explain(self, path: Optional[str], sql: str, params: Any) -> List[str]:
+        if not path or sql.lstrip()[:5].upper() in ("BEGIN", "COMMI", "ROLLB", "SAVEP", "RELEA", "PRAGM", "ATTAC", "DETAC"):
+            return []
+        # A private plain connection per file: compiling the plan never touches the caller's transaction.
+        with self._lock:
+            con = self._explain_cons.get(path)
+            if con is None:
+                con = self._explain_cons[path] = sqlite3.connect(path, check_same_thread=False)
+            try:
+                try:
+                    return [str(r[3]) for r in con.execute("EXPLAIN QUERY PLAN " + sql, params or ())]
+                except sqlite3.ProgrammingError as e:
+                    # executemany keeps no parameters; the plan doesn't depend on the values.
+                    m = re.search(r"uses (\d+)", str(e))
+                    if params is not None or not m:
+                        raise
+                    return [str(r[3]) for r in con.execute("EXPLAIN QUERY PLAN " + sql, (None,) * int(m.group(1)))]
+            except Exception as e:
+                return [f"(no plan: {e})"]
+
+    def _log_slow(self, sql: str, fp: str, ms: float, rows: int, busy_ms: float, path: Optional[str], params: Any) -> None:
+        entry = {
+            "at": now_iso(),
+            "ms": round(ms, 3),
+            "busy_ms": round(busy_ms, 3),
+            "rows": rows,
+            "fingerprint": fp,
+            "db_path": path,
+            "plan": self._explain(path, sql, params),
+        }
+        with self._lock:
+            self._slow.append(entry)
+        if DB_SLOW_LOG:
+            try:
+                with open(DB_SLOW_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                print(f"[db] slow-query log write failed: {e!r}")
+
+    @staticmethod
+    def _percentile(buckets: List[int], count: int, p: float) -> float:
+        need = count * p
+        seen = 0
+        for bound, n in zip(_LATENCY_BUCKETS_MS, buckets):
+            seen += n
+            if seen >= need:
+                return bound
+        return _LATENCY_BUCKETS_MS[-1]
+
+    def top(self, n: int = 20, by: str = "total_ms") -> List[Dict[str, Any]]:
+        with self._lock:
+            items = [(fp, dict(e, buckets=list(e["buckets"]))) for fp, e in self._by_fp.items()]
+        out = []
+        for fp, e in items:
+            p99 = self._percentile(e["buckets"], e["count"], 0.99)
+            out.append(
+                {
+                    "fingerprint": fp,
+                    "count": e["count"],
+                    "total_ms": round(e["total_ms"], 3),
+                    "avg_ms": round(e["total_ms"] / e["count"], 3),
+                    "p50_ms": self._percentile(e["buckets"], e["count"], 0.50),
+                    "p99_ms": p99 if p99 != float("inf") else round(e["max_ms"], 3),
+                    "max_ms": round(e["max_ms"], 3),
+                    "rows": e["rows"],
+                    "busy_ms": round(e["busy_ms"], 3),
+                }
+            )
+        out.sort(key=lambda r: (r[by], r["total_ms"]), reverse=True)
+        return out[: max(1, n)]
+
+    def slow(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._slow)[::-1]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_fp.clear()
+            self._slow.clear()
+
+_QUERY_STATS = QueryStats()
+
+class _InstrumentedCursor(sqlite3.Cursor):
+    """Times execute() plus every fetch of one statement; records it when the statement is done."""
+
+    _sql: Optional[str] = None
+
+    def _start(self, sql: str, params: Any) -> float:
+        self._finish()
+        busy = 0.0
+        con = self.connection
+        if con.isolation_level is not None and not con.in_transaction and _is_write_sql(sql):
+            # Take the write lock now (what the implicit BEGIN would defer) and time the wait.
+            t0 = time.perf_counter()
+            sqlite3.Cursor.execute(self, "BEGIN IMMEDIATE")
+            busy = (time.perf_counter() - t0) * 1000.0
+        elif sql.lstrip()[:15].upper().startswith("BEGIN IMMEDIATE"):
+            busy = -1.0  # the whole statement is lock wait
+        self._sql, self._params, self._ms, self._rows, self._busy = sql, params, 0.0, 0, busy
+        return time.perf_counter()
+
+    def _finish(self) -> None:
+        sql = self._sql
+        if sql is None:
+            return
+        self._sql = None
+        busy = self._ms if self._busy < 0 else self._busy
+        _QUERY_STATS.record(sql, self._ms + max(0.0, self._busy), self._rows, busy, getattr(self.connection, "path", None), self._params)
+
+    def execute(self, sql: str, parameters: Any = (), /):  # type: ignore[override]
+        t0 = self._start(sql, parameters)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._ms += (time.perf_counter() - t0) * 1000.0
+            if self.description is None:
+                self._finish()
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /):  # type: ignore[override]
+        t0 = self._start(sql, None)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._ms += (time.perf_counter() - t0) * 1000.0
+            self._finish()
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        row = super().fetchone()
+        self._ms += (time.perf_counter() - t0) * 1000.0
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        t0 = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._ms += (time.perf_counter() - t0) * 1000.0
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        rows = super().fetchall()
+        self._ms += (time.perf_counter() - t0) * 1000.0
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._ms += (time.perf_counter() - t0) * 1000.0
+            self._finish()
+            raise
+        self._ms += (time.perf_counter() - t0) * 1000.0
+        self._rows += 1
+        return row
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+    def __del__(self) -> None:
+        # Cursors from con.execute(...).fetchone() are dropped unexhausted.
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+class InstrumentedConnection(sqlite3.Connection):
+    path: Optional[str] = None
+
+    def cursor(self, factory: Any = _InstrumentedCursor):  # type: ignore[override]
+        return super().cursor(factory)
+
+    # The C shortcuts don't go through cursor(); route them through it.
+    def execute(self, sql: str, parameters: Any = (), /):  # type: ignore[override]
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /):  # type: ignore[override]
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def query_stats(top: int = 20) -> Dict[str, Any]:
+    return {
+        "instrumented": DB_INSTRUMENT,
+        "slow_ms": DB_SLOW_MS,
+        "top_by_total": _QUERY_STATS.top(top, "total_ms"),
+        "top_by_p99": _QUERY_STATS.top(top, "p99_ms"),
+        "slow": _QUERY_STATS.slow(),
+    }
+
+def reset_query_stats() -> None:
+    _QUERY_STATS.reset()
+
+def _open_connection(path: str, readonly: bool = False) -> sqlite3.Connection:
+    _ensure_parent_dir(path)
+    # Pooled connections move between threadpool workers, so same-thread checks are off;
+    # the pool guarantees a connection is only ever checked out by one caller at a time.
+    factory = InstrumentedConnection if DB_INSTRUMENT else sqlite3.Connection
+    con = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT, check_same_thread=False, factory=factory)
+    if DB_INSTRUMENT:
+        con.path = path  # type: ignore[attr-defined]
     con.row_factory = sqlite3.Row
     try:
         con.execute("PRAGMA journal_mode=WAL;")
@@ -54,12 +441,520 @@ def _conn():
         # WAL may fail in some environments; ignore.
         pass
     con.execute("PRAGMA foreign_keys=ON;")
+    _apply_profile(con, DB_PROFILE)
+    if readonly:
+        con.execute("PRAGMA query_only=ON;")
+    return con
+
+class ConnectionPool:
+    """
+    Bounded pool of configured SQLite connections.
+
+    Connections are opened lazily up to `size`; callers beyond that wait up to
+    `timeout` seconds for one to be returned. Wait times are tracked so pool
+    pressure shows up in pool_stats() instead of as mystery latency.
+    """
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_total_ms": 0.0,
+            "wait_max_ms": 0.0,
+            "discarded": 0,
+        }
+
+    def _try_reserve(self) -> bool:
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return True
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("connection pool is closed")
+        try:
+            con = self._idle.get_nowait()
+            waited = 0.0
+        except queue.Empty:
+            if self._try_reserve():
+                try:
+                    con = _open_connection(self.path, readonly=self.readonly)
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+                waited = 0.0
+            else:
+                t0 = time.perf_counter()
+                try:
+                    con = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"no SQLite connection free after {self.timeout:.1f}s (pool size {self.size})")
+                waited = (time.perf_counter() - t0) * 1000.0
+                with self._lock:
+                    self._stats["waits"] += 1
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_total_ms"] += waited
+            if waited > self._stats["wait_max_ms"]:
+                self._stats["wait_max_ms"] = waited
+        return con
+
+    def release(self, con: sqlite3.Connection, broken: bool = False) -> None:
+        if broken or self._closed:
+            try:
+                con.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._opened -= 1
+                if broken:
+                    self._stats["discarded"] += 1
+            return
+        self._idle.put(con)
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                con.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["size"] = self.size
+            out["timeout_s"] = self.timeout
+            out["open"] = self._opened
+        out["idle"] = self._idle.qsize()
+        out["in_use"] = max(0, out["open"] - out["idle"])
+        out["wait_avg_ms"] = round(out["wait_total_ms"] / out["waits"], 3) if out["waits"] else 0.0
+        out["wait_total_ms"] = round(out["wait_total_ms"], 3)
+        out["wait_max_ms"] = round(out["wait_max_ms"], 3)
+        return out
+
+# ---------------------------
+# Tenant shards
+# ---------------------------
+#
+# DB_SHARD_BY_MC=1 keeps users (and anything not tied to a brokerage) in the
+# global DB_PATH file, and moves loads, negotiations and audit rows into one
+# SQLite file per broker_mc under DB_SHARD_DIR. Brokerages then no longer
+# queue behind each other's write lock, and each file's indexes stay small.
+#
+# Tenant-scoped helpers pick the shard from an explicit broker_mc argument or
+# from the current tenant (set_tenant()/tenant(), bound per request by the
+# routers). With no tenant they fall back to the global file. Load ids are
+# allocated per shard, so a load id is only meaningful together with its mc.
+
+DB_SHARD_BY_MC = get_env("DB_SHARD_BY_MC", "0").strip() == "1"
+DB_SHARD_DIR = get_env("DB_SHARD_DIR", "").strip()
+
+_TENANT: ContextVar[Optional[str]] = ContextVar("db_tenant", default=None)
+
+def _shard_dir() -> Path:
+    if DB_SHARD_DIR:
+        return Path(DB_SHARD_DIR)
+    p = Path(DB_PATH)
+    return p.parent / f"{p.stem}_shards"
+
+# (DB_PATH, DB_SHARD_DIR, broker_mc) -> shard file; this sits on every tenant-scoped call.
+_SHARD_PATHS: Dict[Tuple[str, str, str], str] = {}
+
+def shard_path(broker_mc: str) -> str:
+    key = (DB_PATH, DB_SHARD_DIR, broker_mc)
+    path = _SHARD_PATHS.get(key)
+    if path is None:
+        mc = "".join(ch for ch in (broker_mc or "").strip().upper() if ch.isalnum() or ch in "-_")
+        if not mc:
+            raise ValueError(f"invalid broker_mc for shard: {broker_mc!r}")
+        path = _SHARD_PATHS[key] = str(_shard_dir() / f"mc_{mc}.db")
+    return path
+
+def set_tenant(broker_mc: Optional[str]) -> None:
+    """Bind the current context (request task, script) to a brokerage's shard."""
+    _TENANT.set((broker_mc or "").strip() or None)
+
+@contextmanager
+def tenant(broker_mc: Optional[str]):
+    token = _TENANT.set((broker_mc or "").strip() or None)
     try:
-        _init_db(con)
-        yield con
+        yield
+    finally:
+        _TENANT.reset(token)
+
+def _tenant_path(broker_mc: Optional[str] = None) -> str:
+    if not DB_SHARD_BY_MC:
+        return DB_PATH
+    mc = (broker_mc if broker_mc is not None else _TENANT.get()) or ""
+    return shard_path(mc) if mc.strip() else DB_PATH
+
+class ShardRegistry:
+    """
+    Connection pools keyed by database file: the global DB plus one per shard.
+    Pools are created on first use; each shard is migrated before its first
+    connection is handed out.
+    """
+
+    def __init__(self) -> None:
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def pool(self, path: str) -> ConnectionPool:
+        pool = self._pools.get(path)
+        if pool is not None:
+            return pool
+        with self._lock:
+            pool = self._pools.get(path)
+            if pool is None:
+                pool = ConnectionPool(path, DB_POOL_SIZE, DB_POOL_TIMEOUT, readonly=DB_SINGLE_WRITER)
+                self._pools[path] = pool
+            return pool
+
+    def paths(self) -> List[str]:
+        with self._lock:
+            return list(self._pools)
+
+    def close(self) -> None:
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {path: pool.stats() for path, pool in pools.items()}
+
+_REGISTRY = ShardRegistry()
+
+def _pool(path: Optional[str] = None) -> ConnectionPool:
+    return _REGISTRY.pool(path or DB_PATH)
+
+def close_pool() -> None:
+    _REGISTRY.close()
+
+_TX_STATS = {"commits": 0}
+
+def _commit(con: sqlite3.Connection) -> None:
+    # Only count commits that actually end a write transaction (each one is a WAL fsync).
+    if con.in_transaction:
         con.commit()
+        _TX_STATS["commits"] += 1
+
+def pool_stats() -> Dict[str, Any]:
+    if DB_POOL_SIZE <= 0:
+        return {"size": 0, "pooled": False, "commits": _TX_STATS["commits"]}
+    out: Dict[str, Any] = {"pooled": True, "commits": _TX_STATS["commits"], **_pool().stats()}
+    if DB_SHARD_BY_MC:
+        out["shards"] = {p: s for p, s in _REGISTRY.stats().items() if p != DB_PATH}
+    return out
+
+class _UnitOfWork:
+    """Connections of one unit of work, opened lazily per database file."""
+
+    __slots__ = ("cons",)
+
+    def __init__(self) -> None:
+        self.cons: Dict[str, sqlite3.Connection] = {}
+
+# Active unit of work (see unit_of_work()), if any.
+_UOW: ContextVar[Optional[_UnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+def _checkout(path: Optional[str] = None) -> sqlite3.Connection:
+    target = path or DB_PATH
+    if target not in _SCHEMA_READY:
+        migrate(target)
+    if DB_POOL_SIZE <= 0:
+        return _open_connection(target, readonly=DB_SINGLE_WRITER)
+    return _pool(target).acquire()
+
+def _checkin(con: sqlite3.Connection, ok: bool, path: Optional[str] = None) -> None:
+    """Commit (ok) or roll back, then hand the connection back. Commit errors propagate."""
+    broken = False
+    try:
+        if ok:
+            _commit(con)
+        else:
+            con.rollback()
+    except Exception:
+        broken = True
+        try:
+            con.rollback()
+        except Exception:
+            pass
+        if ok:
+            raise
     finally:
-        con.close()
+        if DB_POOL_SIZE <= 0:
+            con.close()
+        else:
+            _pool(path).release(con, broken=broken)
+
+@contextmanager
+def _conn(path: Optional[str] = None):
+    target = path or DB_PATH
+    uow = _UOW.get()
+    if uow is not None:
+        # Inside a unit of work: reuse its connection for this file; it commits once at the end.
+        con = uow.cons.get(target)
+        if con is None:
+            con = uow.cons[target] = _checkout(target)
+        yield con
+        return
+
+    con = _checkout(target)
+    ok = False
+    try:
+        yield con
+        ok = True
+    finally:
+        _checkin(con, ok, target)
+
+# ---------------------------
+# Unit of work
+# ---------------------------
+
+# DB_REQUEST_TX=0 turns the per-request transaction off (each helper commits on its own).
+REQUEST_UNIT_OF_WORK = get_env("DB_REQUEST_TX", "1").strip() != "0"
+
+def _begin_unit_of_work() -> Optional[_UnitOfWork]:
+    """Start a unit of work unless one is active or single-writer mode is on; None if not started."""
+    if DB_SINGLE_WRITER or _UOW.get() is not None:
+        # Single-writer mode has no request transaction: reads use the reader
+        # pool and each write is its own job on the writer thread.
+        return None
+    uow = _UnitOfWork()
+    _UOW.set(uow)
+    return uow
+
+def _end_unit_of_work(uow: _UnitOfWork, ok: bool) -> None:
+    """
+    Commit (ok) or roll back every connection the unit of work opened. With
+    shards a request can touch two files; they commit one after the other, and
+    if one commit fails the rest are rolled back, but a file that already
+    committed stays committed (SQLite has no cross-file atomic commit in WAL).
+    """
+    _UOW.set(None)
+    error: Optional[BaseException] = None
+    for path, con in uow.cons.items():
+        try:
+            _checkin(con, ok and error is None, path)
+        except Exception as e:
+            error = error or e
+    uow.cons.clear()
+    if error is not None:
+        raise error
+
+@contextmanager
+def unit_of_work():
+    """
+    Run every db helper called inside the block on one connection per database
+    file and commit once at the end (rollback on any exception). Nested blocks
+    join the outer one. The per-request FastAPI dependency lives in
+    db_async.request_unit_of_work.
+    """
+    uow = _begin_unit_of_work()
+    if uow is None:
+        yield _UOW.get()
+        return
+    ok = False
+    try:
+        yield uow
+        ok = True
+    finally:
+        _end_unit_of_work(uow, ok)
+
+# ---------------------------
+# Single writer
+# ---------------------------
+
+T = TypeVar("T")
+
+_WRITE_STOP = object()
+
+class SingleWriter:
+    """
+    Dedicated thread owning the only read-write connection (DB_SINGLE_WRITER=1).
+
+    Jobs are callables fn(con) submitted from any thread; each returns a
+    concurrent.futures.Future. The thread drains up to `batch` queued jobs,
+    runs each inside its own SAVEPOINT (a failing job rolls back alone) and
+    commits the whole batch once, so concurrent writers share one fsync and
+    never see SQLITE_BUSY from each other.
+    """
+
+    def __init__(self, path: str, batch: int = DB_WRITE_BATCH, queue_max: int = DB_WRITE_QUEUE_MAX):
+        self.path = path
+        self.batch = int(batch)
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=int(queue_max))
+        self._lock = threading.Lock()
+        self._stats = {"jobs": 0, "failed_jobs": 0, "batches": 0, "commit_total_ms": 0.0, "commit_max_ms": 0.0}
+        self._con = _open_connection(path)
+        # Transactions are managed explicitly below.
+        self._con.isolation_level = None
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        fut: Future = Future()
+        self._q.put((fn, fut), timeout=DB_BUSY_TIMEOUT)
+        return fut
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread.is_alive():
+            self._q.put(_WRITE_STOP)
+            self._thread.join(timeout)
+
+    def _run_batch(self, jobs: List[Tuple[Callable[[sqlite3.Connection], Any], Future]]) -> None:
+        con = self._con
+        results: List[Tuple[Future, bool, Any]] = []
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            for fn, fut in jobs:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                con.execute("SAVEPOINT job")
+                try:
+                    value = fn(con)
+                    con.execute("RELEASE job")
+                    results.append((fut, True, value))
+                except BaseException as e:
+                    con.execute("ROLLBACK TO job")
+                    con.execute("RELEASE job")
+                    results.append((fut, False, e))
+            t0 = time.perf_counter()
+            con.execute("COMMIT")
+            ms = (time.perf_counter() - t0) * 1000.0
+        except BaseException as e:
+            try:
+                con.execute("ROLLBACK")
+            except Exception:
+                pass
+            for fn, fut in jobs:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["jobs"] += len(results)
+            self._stats["failed_jobs"] += sum(1 for _, ok, _ in results if not ok)
+            self._stats["commit_total_ms"] += ms
+            if ms > self._stats["commit_max_ms"]:
+                self._stats["commit_max_ms"] = ms
+        _TX_STATS["commits"] += 1
+        # Resolve only after COMMIT, so a caller that reads next sees its own write.
+        for fut, ok, value in results:
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            if item is _WRITE_STOP:
+                break
+            jobs = [item]
+            stopping = False
+            while len(jobs) < self.batch:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _WRITE_STOP:
+                    stopping = True
+                    break
+                jobs.append(nxt)
+            self._run_batch(jobs)
+            if stopping:
+                break
+        self._con.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["queue_depth"] = self._q.qsize()
+        out["jobs_per_batch"] = round(out["jobs"] / out["batches"], 2) if out["batches"] else 0.0
+        out["commit_total_ms"] = round(out["commit_total_ms"], 3)
+        out["commit_max_ms"] = round(out["commit_max_ms"], 3)
+        return out
+
+_WRITERS: Dict[str, SingleWriter] = {}
+_WRITER_LOCK = threading.Lock()
+
+def _writer(path: Optional[str] = None) -> SingleWriter:
+    target = path or DB_PATH
+    w = _WRITERS.get(target)
+    if w is not None:
+        return w
+    with _WRITER_LOCK:
+        w = _WRITERS.get(target)
+        if w is None:
+            if target not in _SCHEMA_READY:
+                migrate(target)
+            w = _WRITERS[target] = SingleWriter(target)
+        return w
+
+def submit_write(fn: Callable[[sqlite3.Connection], T], path: Optional[str] = None) -> Future:
+    """Queue fn(con) on the single writer for `path`; the Future resolves after COMMIT."""
+    return _writer(path).submit(fn)
+
+def _write(fn: Callable[[sqlite3.Connection], T], path: Optional[str] = None) -> T:
+    """
+    Run a write. With DB_SINGLE_WRITER it becomes a job on the file's writer
+    thread; otherwise it runs on the caller's connection (joining any unit of work).
+    """
+    if DB_SINGLE_WRITER:
+        return submit_write(fn, path).result()
+    with _conn(path) as con:
+        return fn(con)
+
+def _exec_write(sql: str, params: Iterable[Any] = (), path: Optional[str] = None) -> None:
+    params = tuple(params)
+    _write(lambda con: con.execute(sql, params), path)
+
+def shutdown_writer(timeout: float = 5.0) -> None:
+    with _WRITER_LOCK:
+        writers = list(_WRITERS.values())
+        _WRITERS.clear()
+    for w in writers:
+        w.stop(timeout)
+
+def writer_stats() -> Dict[str, Any]:
+    if not DB_SINGLE_WRITER:
+        return {"single_writer": False}
+    with _WRITER_LOCK:
+        writers = dict(_WRITERS)
+    main = writers.pop(DB_PATH, None)
+    out: Dict[str, Any] = {"single_writer": True, "running": main is not None, **(main.stats() if main is not None else {})}
+    if writers:
+        out["shards"] = {p: w.stats() for p, w in writers.items()}
+    return out
+
+# ---------------------------
+# Schema
+# ---------------------------
 
 def _table_exists(con: sqlite3.Connection, name: str) -> bool:
     row = con.execute(
@@ -76,7 +971,7 @@ def _add_col_if_missing(con: sqlite3.Connection, table: str, col: str, col_type:
     if not _col_exists(con, table, col):
         con.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type} DEFAULT {default_sql}")
 
-def _init_db(con: sqlite3.Connection) -> None:
+def _m001_baseline(con: sqlite3.Connection) -> None:
     # USERS
     con.execute(
         """
@@ -166,6 +1061,373 @@ def _init_db(con: sqlite3.Connection) -> None:
         """
     )
 
+def _m002_load_workflow_columns(con: sqlite3.Connection) -> None:
+    # Columns the load board / driver / billing routes read and write.
+    for col, col_type, default_sql in [
+        ("driver_username", "TEXT", "NULL"),
+        ("created_by", "TEXT", "NULL"),
+        ("pickup_address", "TEXT", "NULL"),
+        ("pickup_appt", "TEXT", "NULL"),
+        ("delivery_address", "TEXT", "NULL"),
+        ("delivery_appt", "TEXT", "NULL"),
+        ("driver_pay", "REAL", "0"),
+        ("fuel_surcharge", "REAL", "0"),
+        ("ratecon_terms", "TEXT", "NULL"),
+        ("reviewed_by", "TEXT", "NULL"),
+        ("pulled_reason", "TEXT", "NULL"),
+        ("delivered_at", "TEXT", "NULL"),
+        ("invoiced_at", "TEXT", "NULL"),
+        ("invoice_number", "TEXT", "NULL"),
+        ("paid_at", "TEXT", "NULL"),
+    ]:
+        _add_col_if_missing(con, "loads", col, col_type, default_sql)
+
+def _m003_users_broker_link(con: sqlite3.Connection) -> None:
+    # Dispatcher -> broker link used by /admin/link-dispatcher (was added lazily per request).
+    _add_col_if_missing(con, "users", "broker_username", "TEXT", "NULL")
+
+def _m004_load_board_indexes(con: sqlite3.Connection) -> None:
+    # Board queries filter on broker_mc (+ visibility / dispatcher) and sort newest first;
+    # these let SQLite walk the index in order instead of scanning + sorting.
+    con.execute("CREATE INDEX IF NOT EXISTS idx_loads_broker_created ON loads (broker_mc, created_at)")
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_loads_broker_vis_created ON loads (broker_mc, visibility, created_at)"
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_loads_broker_disp_vis_created "
+        "ON loads (broker_mc, dispatcher_username, visibility, created_at)"
+    )
+
+def _m005_keyset_indexes(con: sqlite3.Connection) -> None:
+    # Paginated boards order by (created_at, id); carry id in the index so the
+    # tie-breaker doesn't force a sort. Supersedes two of the 004 indexes.
+    con.execute("DROP INDEX IF EXISTS idx_loads_broker_created")
+    con.execute("DROP INDEX IF EXISTS idx_loads_broker_disp_vis_created")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_loads_broker_created_id ON loads (broker_mc, created_at, id)")
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_loads_broker_disp_vis_created_id "
+        "ON loads (broker_mc, dispatcher_username, visibility, created_at, id)"
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_loads_driver_created_id ON loads (driver_username, created_at, id)")
+
+def _m006_load_external_ref(con: sqlite3.Connection) -> None:
+    # Bulk imports key on the broker's own load reference (from their old TMS),
+    # so re-sending a file updates instead of duplicating. New column, so no
+    # existing rows can collide with the unique index.
+    _add_col_if_missing(con, "loads", "external_ref", "TEXT", "NULL")
+    con.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_loads_broker_external_ref "
+        "ON loads (broker_mc, external_ref) WHERE external_ref IS NOT NULL"
+    )
+
+# Text the board search box matches against. Dispatcher/driver names are in
+# here because the old client-side filter matched them too.
+LOAD_FTS_COLUMNS = (
+    "shipper_name",
+    "customer_ref",
+    "pickup_address",
+    "delivery_address",
+    "notes",
+    "ratecon_terms",
+    "dispatcher_username",
+    "driver_username",
+)
+
+def _m007_loads_fts(con: sqlite3.Connection) -> None:
+    # External-content FTS5 index keyed on loads.rowid: the text lives once, in
+    # loads, and triggers keep the index in step with every insert/update/delete
+    # (including bulk upserts). loads has no INTEGER PRIMARY KEY, so a VACUUM
+    # can renumber rowids; run "INSERT INTO loads_fts(loads_fts) VALUES('rebuild')"
+    # after one.
+    cols = ", ".join(LOAD_FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in LOAD_FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in LOAD_FTS_COLUMNS)
+    con.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS loads_fts USING fts5(
+            {cols},
+            content='loads', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """
+    )
+    con.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS loads_fts_ai AFTER INSERT ON loads BEGIN
+            INSERT INTO loads_fts (rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+        """
+    )
+    con.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS loads_fts_ad AFTER DELETE ON loads BEGIN
+            INSERT INTO loads_fts (loads_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+        END
+        """
+    )
+    con.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS loads_fts_au AFTER UPDATE OF {cols} ON loads BEGIN
+            INSERT INTO loads_fts (loads_fts, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+            INSERT INTO loads_fts (rowid, {cols}) VALUES (new.rowid, {new_cols});
+        END
+        """
+    )
+    con.execute("INSERT INTO loads_fts (loads_fts) VALUES ('rebuild')")
+
+def _audit_indexes(con: sqlite3.Connection) -> None:
+    # History lookups filter on target (a load, a user) or actor and read newest
+    # first. id is the rowid, so every index already ends in it and
+    # (created_at, id) keyset pages come straight off the index without a sort.
+    con.execute("CREATE INDEX IF NOT EXISTS idx_audit_target_created ON audit_log (target, created_at)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_audit_actor_created ON audit_log (actor, created_at)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_log (created_at)")
+
+def _m008_audit_indexes(con: sqlite3.Connection) -> None:
+    _audit_indexes(con)
+
+def _m009_loads_archive(con: sqlite3.Connection) -> None:
+    # Cold tier for paid loads (archive_paid_loads()). Same columns as loads
+    # (in LOAD_COLUMNS order) plus archived_at; rows keep their loads rowid so
+    # ids are never reused. A later migration that adds a loads column must
+    # ALTER it onto loads_archive too.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS loads_archive (
+            id TEXT PRIMARY KEY,
+            broker_mc TEXT,
+            dispatcher_username TEXT,
+            visibility TEXT,
+            status TEXT,
+            shipper_name TEXT,
+            customer_ref TEXT,
+            origin_city TEXT,
+            origin_state TEXT,
+            origin_zip TEXT,
+            dest_city TEXT,
+            dest_state TEXT,
+            dest_zip TEXT,
+            pickup_date TEXT,
+            delivery_date TEXT,
+            equipment TEXT,
+            weight_lbs INTEGER,
+            miles INTEGER,
+            rate_total REAL,
+            rate_per_mile REAL,
+            notes TEXT,
+            driver_username TEXT,
+            created_by TEXT,
+            pickup_address TEXT,
+            pickup_appt TEXT,
+            delivery_address TEXT,
+            delivery_appt TEXT,
+            driver_pay REAL,
+            fuel_surcharge REAL,
+            ratecon_terms TEXT,
+            reviewed_by TEXT,
+            pulled_reason TEXT,
+            delivered_at TEXT,
+            invoiced_at TEXT,
+            invoice_number TEXT,
+            paid_at TEXT,
+            external_ref TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            archived_at TEXT
+        )
+        """
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_loads_archive_broker_created_id ON loads_archive (broker_mc, created_at, id)"
+    )
+    con.execute(
+        "CREATE INDEX IF NOT EXISTS idx_loads_archive_broker_external_ref "
+        "ON loads_archive (broker_mc, external_ref) WHERE external_ref IS NOT NULL"
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_loads_paid_at ON loads (paid_at) WHERE paid_at IS NOT NULL")
+
+def _m010_load_negotiations(con: sqlite3.Connection) -> None:
+    # Rate quotes from /broker/loads/{id}/negotiate. The quote body is one
+    # zlib-compressed JSON payload (see create_load_negotiation()); the values
+    # lists filter and sort on are plain columns, one (load_id, col) index per
+    # sort so the list never needs a temp B-tree. id is the rowid, so
+    # (load_id) alone already serves newest-first.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS load_negotiations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            load_id INTEGER NOT NULL,
+            broker_username TEXT,
+            applied INTEGER NOT NULL DEFAULT 0,
+            override_reason TEXT,
+            customer_rate_total REAL,
+            driver_cpm REAL,
+            broker_margin REAL,
+            fuel_period TEXT,
+            payload BLOB NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    for name, cols in (
+        ("load", "load_id"),
+        ("load_rate", "load_id, customer_rate_total"),
+        ("load_driver_cpm", "load_id, driver_cpm"),
+        ("load_margin", "load_id, broker_margin"),
+        ("load_fuel_period", "load_id, fuel_period"),
+    ):
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_negotiations_{name} ON load_negotiations ({cols})")
+
+def _m011_sessions(con: sqlite3.Connection) -> None:
+    # Refresh-token sessions and the revocation log that auth.py replays into
+    # its in-memory set (see revoke_sessions()). Global file, like users.
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            refresh_hash TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            refreshed_at TEXT,
+            expires_at TEXT NOT NULL,
+            revoked_at TEXT
+        )
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions (username)")
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_revocations (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            not_before INTEGER NOT NULL  -- unix epoch, milliseconds
+        )
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_token_revocations_not_before ON token_revocations (not_before)")
+
+def _m012_roster_version(con: sqlite3.Connection) -> None:
+    # Bumped by trigger on any change to who belongs to which brokerage, so
+    # every worker's RosterIndex can tell when to rebuild (see sync_roster()).
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS roster_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """
+    )
+    con.execute("INSERT OR IGNORE INTO roster_version (id, version) VALUES (1, 0)")
+    bump = "UPDATE roster_version SET version = version + 1 WHERE id = 1;"
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS trg_users_roster_ins AFTER INSERT ON users BEGIN {bump} END")
+    con.execute(f"CREATE TRIGGER IF NOT EXISTS trg_users_roster_del AFTER DELETE ON users BEGIN {bump} END")
+    con.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_roster_upd AFTER UPDATE OF role, broker_mc ON users
+        WHEN OLD.role IS NOT NEW.role OR OLD.broker_mc IS NOT NEW.broker_mc
+        BEGIN {bump} END
+        """
+    )
+
+# ---------------------------
+# Schema migrations
+# ---------------------------
+
+# Ordered, append-only. Never edit a released step; add a new one.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "baseline", _m001_baseline),
+    (2, "load_workflow_columns", _m002_load_workflow_columns),
+    (3, "users_broker_link", _m003_users_broker_link),
+    (4, "load_board_indexes", _m004_load_board_indexes),
+    (5, "keyset_indexes", _m005_keyset_indexes),
+    (6, "load_external_ref", _m006_load_external_ref),
+    (7, "loads_fts", _m007_loads_fts),
+    (8, "audit_indexes", _m008_audit_indexes),
+    (9, "loads_archive", _m009_loads_archive),
+    (10, "load_negotiations", _m010_load_negotiations),
+    (11, "sessions", _m011_sessions),
+    (12, "roster_version", _m012_roster_version),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_SCHEMA_READY: set = set()
+_MIGRATE_LOCK = threading.Lock()
+
+def _current_version(con: sqlite3.Connection) -> int:
+    if not _table_exists(con, "schema_version"):
+        return 0
+    row = con.execute("SELECT MAX(version) AS v FROM schema_version").fetchone()
+    return int(row["v"] or 0)
+
+def migrate(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Bring the database at `path` (default DB_PATH) up to SCHEMA_VERSION.
+
+    Each step runs in its own transaction together with its schema_version row,
+    so a failed step leaves the database at the previous version.
+    """
+    target = path or DB_PATH
+    with _MIGRATE_LOCK:
+        con = _open_connection(target)
+        try:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TEXT NOT NULL
+                )
+                """
+            )
+            con.commit()
+            before = _current_version(con)
+            applied: List[str] = []
+            for version, name, step in MIGRATIONS:
+                if version <= before:
+                    continue
+                try:
+                    con.execute("BEGIN IMMEDIATE")
+                    # Another process may have applied it while we waited for the lock.
+                    if _current_version(con) >= version:
+                        con.rollback()
+                        continue
+                    step(con)
+                    con.execute(
+                        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                        (version, name, now_iso()),
+                    )
+                    con.commit()
+                except Exception:
+                    con.rollback()
+                    raise
+                applied.append(f"{version:03d}_{name}")
+            after = _current_version(con)
+        finally:
+            con.close()
+        _SCHEMA_READY.add(target)
+    return {"db_path": target, "from_version": before, "to_version": after, "applied": applied}
+
+def describe_tables(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """Table name -> column names, for the admin db-info page."""
+    with _conn(path) as con:
+        names = [r["name"] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+        return {n: [c["name"] for c in con.execute(f"PRAGMA table_info({n})")] for n in names}
+
+def schema_status(path: Optional[str] = None) -> Dict[str, Any]:
+    target = path or DB_PATH
+    con = _open_connection(target)
+    try:
+        current = _current_version(con)
+    finally:
+        con.close()
+    return {
+        "db_path": target,
+        "current_version": current,
+        "latest_version": SCHEMA_VERSION,
+        "pending": [f"{v:03d}_{n}" for v, n, _ in MIGRATIONS if v > current],
+    }
+
 # ---------------------------
 # User functions
 # ---------------------------
@@ -187,30 +1449,58 @@ def create_user(
     u = (username or "").strip()
     if not u:
         raise ValueError("username required")
-    with _conn() as con:
-        con.execute(
-            """
-            INSERT INTO users (username, password_hash, role, broker_mc, broker_status, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (u, password_hash, role, broker_mc, broker_status or "none", now_iso()),
-        )
-
+    _exec_write(
+        """
+        INSERT INTO users (username, password_hash, role, broker_mc, broker_status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (u, password_hash, role, broker_mc, broker_status or "none", now_iso()),
+    )
+    invalidate_roster()
+
 def set_email(username: str, email: str) -> None:
-    with _conn() as con:
-        con.execute("UPDATE users SET email=? WHERE username=?", ((email or "").strip().lower(), username))
+    _exec_write("UPDATE users SET email=? WHERE username=?", ((email or "").strip().lower(), username))
 
 def set_user_role(username: str, role: str) -> None:
-    with _conn() as con:
-        con.execute("UPDATE users SET role=? WHERE username=?", ((role or "").strip().lower(), username))
+    _exec_write("UPDATE users SET role=? WHERE username=?", ((role or "").strip().lower(), username))
+    invalidate_roster()
 
 def set_broker_status(username: str, status: str) -> None:
-    with _conn() as con:
-        con.execute("UPDATE users SET broker_status=? WHERE username=?", ((status or "").strip().lower(), username))
+    _exec_write("UPDATE users SET broker_status=? WHERE username=?", ((status or "").strip().lower(), username))
+
+def set_account_locked(username: str, locked: bool) -> None:
+    _exec_write("UPDATE users SET account_locked=? WHERE username=?", (1 if locked else 0, (username or "").strip()))
 
 def set_broker_mc(username: str, broker_mc: str) -> None:
+    _exec_write("UPDATE users SET broker_mc=? WHERE username=?", ((broker_mc or "").strip(), username))
+    invalidate_roster()
+
+def link_dispatcher(dispatcher_username: str, broker_username: str):
+    """Point a dispatcher's users.broker_username (migration 3) at a broker. Returns the updated row."""
+    d = (dispatcher_username or "").strip()
+    _exec_write(
+        "UPDATE users SET broker_username=? WHERE username=? AND role='dispatcher'",
+        ((broker_username or "").strip(), d),
+    )
     with _conn() as con:
-        con.execute("UPDATE users SET broker_mc=? WHERE username=?", ((broker_mc or "").strip(), username))
+        return con.execute(
+            "SELECT username, role, broker_username FROM users WHERE username=? AND role='dispatcher'", (d,)
+        ).fetchone()
+
+_PASSWORD_COLUMNS = ("password_hash", "password")
+
+def set_password_hash(username: str, password_hash: str, column: str = "password_hash") -> None:
+    if column not in _PASSWORD_COLUMNS:
+        raise ValueError(f"unsupported password column: {column}")
+    _exec_write(f"UPDATE users SET {column}=? WHERE username=?", (password_hash, username))
+
+def force_admin(username: str, password_hash: str) -> None:
+    # Emergency recovery: make an existing user a plain admin with a new password.
+    _exec_write(
+        "UPDATE users SET password_hash=?, role='admin', broker_status='none', broker_mc=NULL WHERE username=?",
+        (password_hash, username),
+    )
+    invalidate_roster()
 
 def create_broker_request(username: str, mc_number: str) -> None:
     u = (username or "").strip()
@@ -218,15 +1508,14 @@ def create_broker_request(username: str, mc_number: str) -> None:
     if not u or not mc:
         return
     ts = now_iso()
-    with _conn() as con:
-        # Keep only the most recent pending/record, but don't overthink it.
-        con.execute(
-            """
-            INSERT INTO broker_requests (username, mc_number, status, created_at, updated_at)
-            VALUES (?, ?, 'pending', ?, ?)
-            """,
-            (u, mc, ts, ts),
-        )
+    # Keep only the most recent pending/record, but don't overthink it.
+    _exec_write(
+        """
+        INSERT INTO broker_requests (username, mc_number, status, created_at, updated_at)
+        VALUES (?, ?, 'pending', ?, ?)
+        """,
+        (u, mc, ts, ts),
+    )
 
 def list_pending_brokers(limit: int = 200):
     with _conn() as con:
@@ -241,31 +1530,742 @@ def list_pending_brokers(limit: int = 200):
             (int(max(1, min(limit, 2000))),),
         ).fetchall()
 
-def list_users_by_role_and_broker_mc(role: str, broker_mc: str, limit: int = 500):
-    r = (role or "").strip().lower()
-    mc = (broker_mc or "").strip()
+# ---------------------------
+# Broker roster
+# ---------------------------
+#
+# broker_mc -> drivers/dispatchers, kept in memory so the "is this driver or
+# dispatcher linked to the caller's brokerage" checks in loads.py are dict
+# lookups. User writes in this process rebuild it at once; the users triggers
+# bump roster_version, which every worker polls (sync_roster) so writes made
+# elsewhere land within ROSTER_SYNC_SECONDS.
+
+ROSTER_SYNC_SECONDS = _env_float("ROSTER_SYNC_SECONDS", 5.0)
+ROSTER_ROLES = ("driver", "dispatcher")
+
+class RosterIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._members: Dict[str, Tuple[str, str]] = {}
+        self._by_mc: Dict[str, Dict[str, List[str]]] = {}
+        self._version: Optional[int] = None
+        self._path: Optional[str] = None
+        self._epoch = 0
+        self.builds = 0
+        self.built_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._version = None
+
+    def build(self) -> None:
+        with self._lock:
+            epoch = self._epoch
+        path = DB_PATH
+        with _conn(path) as con:
+            # Version first: a write landing in between only costs one extra rebuild.
+            version = int(con.execute("SELECT version FROM roster_version WHERE id = 1").fetchone()["version"])
+            # Roles are matched case-insensitively and stored lower-case, as
+            # the users queries always have (older rows may say "Driver").
+            rows = con.execute(
+                "SELECT username, lower(trim(role)) AS role, broker_mc FROM users "
+                "WHERE lower(trim(role)) IN (?, ?)",
+                ROSTER_ROLES,
+            ).fetchall()
+        members: Dict[str, Tuple[str, str]] = {}
+        by_mc: Dict[str, Dict[str, List[str]]] = {}
+        for r in rows:
+            mc = r["broker_mc"] or ""
+            members[r["username"]] = (r["role"], mc)
+            if mc:
+                by_mc.setdefault(mc, {role: [] for role in ROSTER_ROLES})[r["role"]].append(r["username"])
+        for roles in by_mc.values():
+            for names in roles.values():
+                names.sort()
+        with self._lock:
+            self._members, self._by_mc, self._path = members, by_mc, path
+            # An invalidate() during the read means it may have missed that write.
+            self._version = version if epoch == self._epoch else None
+            self.builds += 1
+            self.built_at = time.time()
+
+    def _ready(self) -> "RosterIndex":
+        if self._version is None or self._path != DB_PATH:
+            self.build()
+        return self
+
+    def sync(self) -> bool:
+        """Rebuild if roster_version moved (another worker changed users). True if rebuilt."""
+        with _conn() as con:
+            version = int(con.execute("SELECT version FROM roster_version WHERE id = 1").fetchone()["version"])
+        if version == self._version and self._path == DB_PATH:
+            return False
+        self.build()
+        return True
+
+    def member(self, username: str) -> Optional[Tuple[str, str]]:
+        return self._ready()._members.get((username or "").strip())
+
+    def usernames(self, broker_mc: str, role: str) -> List[str]:
+        roles = self._ready()._by_mc.get((broker_mc or "").strip())
+        return list(roles.get(role, ())) if roles else []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self._version,
+                "brokers": len(self._by_mc),
+                "members": len(self._members),
+                "builds": self.builds,
+                "built_ago_s": round(time.time() - self.built_at, 1) if self.built_at else None,
+            }
+
+_ROSTER = RosterIndex()
+
+def roster_member(username: str) -> Optional[Tuple[str, str]]:
+    """(role, broker_mc) of a driver or dispatcher, None for anyone else."""
+    return _ROSTER.member(username)
+
+def roster_usernames(broker_mc: str, role: str) -> List[str]:
+    """Sorted usernames with `role` linked to broker_mc."""
+    return _ROSTER.usernames(broker_mc, role)
+
+def invalidate_roster() -> None:
+    _ROSTER.invalidate()
+    try:
+        _ROSTER.build()
+    except Exception:
+        pass  # rebuilt on the next lookup
+
+def sync_roster() -> bool:
+    return _ROSTER.sync()
+
+def roster_stats() -> Dict[str, Any]:
+    return _ROSTER.stats()
+
+def start_roster_sync() -> None:
+    """Build the roster now and poll roster_version every ROSTER_SYNC_SECONDS."""
+    start_periodic("roster-sync", sync_roster, ROSTER_SYNC_SECONDS / 3600.0)
+
+# ---------------------------
+# Sessions (refresh tokens)
+# ---------------------------
+#
+# A session is one login. The client holds "<id>.<secret>"; only a SHA-256 of
+# the secret is stored, and every refresh swaps in a new secret. Presenting a
+# stale secret means the token was copied, so the whole session is revoked.
+#
+# token_revocations is an append-only log of (session_id, not_before): access
+# tokens of that session issued before not_before (epoch ms) are refused. auth.py polls
+# it by seq into an in-memory map, so request-time checks never touch SQLite.
+
+def create_session(username: str, refresh_hash: str, ttl_seconds: int) -> str:
+    sid = secrets.token_urlsafe(16)
+    ts = datetime.now(timezone.utc)
+    _exec_write(
+        "INSERT INTO sessions (id, username, refresh_hash, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+        (sid, (username or "").strip(), refresh_hash, ts.isoformat(), (ts + timedelta(seconds=ttl_seconds)).isoformat()),
+    )
+    return sid
+
+def _epoch_ms() -> int:
+    return int(time.time() * 1000)
+
+def _log_revocations(con: sqlite3.Connection, sids: List[str], not_before: int) -> None:
+    con.executemany(
+        "INSERT INTO token_revocations (session_id, not_before) VALUES (?, ?)", [(sid, not_before) for sid in sids]
+    )
+
+def rotate_session(
+    session_id: str, refresh_hash: str, new_hash: str
+) -> Tuple[str, Optional[str], Optional[int]]:
+    """
+    Swap a session's refresh secret. Returns ("ok", username, None) or
+    (reason, None, None) with reason one of missing / revoked / expired; on
+    "reused" the session is revoked and the third item is the not_before
+    (epoch ms) logged to token_revocations.
+    """
+    def _tx(con: sqlite3.Connection) -> Tuple[str, Optional[str], Optional[int]]:
+        row = con.execute(
+            "SELECT username, refresh_hash, expires_at, revoked_at FROM sessions WHERE id=?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return "missing", None, None
+        if row["revoked_at"]:
+            return "revoked", None, None
+        now = now_iso()
+        if row["expires_at"] <= now:
+            return "expired", None, None
+        if not secrets.compare_digest(row["refresh_hash"], refresh_hash):
+            not_before = _epoch_ms()
+            con.execute("UPDATE sessions SET revoked_at=? WHERE id=?", (now, session_id))
+            _log_revocations(con, [session_id], not_before)
+            return "reused", None, not_before
+        con.execute("UPDATE sessions SET refresh_hash=?, refreshed_at=? WHERE id=?", (new_hash, now, session_id))
+        return "ok", row["username"], None
+
+    return _write(_tx)
+
+def revoke_sessions(
+    username: Optional[str] = None, session_id: Optional[str] = None, end_session: bool = True
+) -> List[Tuple[str, int]]:
+    """
+    Refuse the current access tokens of a user's live sessions (or of one
+    session). end_session=True also kills the refresh token, i.e. logs out;
+    end_session=False only forces a refresh, which re-reads role and
+    broker_status. Returns the (session_id, not_before) pairs logged.
+    """
+    def _tx(con: sqlite3.Connection) -> List[Tuple[str, int]]:
+        now = now_iso()
+        if session_id:
+            rows = con.execute(
+                "SELECT id FROM sessions WHERE id=? AND revoked_at IS NULL AND expires_at > ?", (session_id, now)
+            ).fetchall()
+        else:
+            rows = con.execute(
+                "SELECT id FROM sessions WHERE username=? AND revoked_at IS NULL AND expires_at > ?",
+                ((username or "").strip(), now),
+            ).fetchall()
+        sids = [r["id"] for r in rows]
+        if not sids:
+            return []
+        not_before = _epoch_ms()
+        if end_session:
+            con.executemany("UPDATE sessions SET revoked_at=? WHERE id=?", [(now, sid) for sid in sids])
+        _log_revocations(con, sids, not_before)
+        return [(sid, not_before) for sid in sids]
+
+    return _write(_tx)
+
+SQL_TOKEN_REVOCATIONS_SINCE = (
+    "SELECT seq, session_id, not_before FROM token_revocations WHERE seq > ? AND not_before >= ? ORDER BY seq"
+)
+
+def token_revocations_since(seq: int, min_not_before: int = 0) -> List[Tuple[int, str, int]]:
     with _conn() as con:
-        return con.execute(
-            """
-            SELECT username, role, broker_mc, broker_status, created_at
-            FROM users
-            WHERE lower(role)=? AND broker_mc=?
-            ORDER BY created_at DESC
-            LIMIT ?
-            """,
-            (r, mc, int(max(1, min(limit, 2000)))),
-        ).fetchall()
+        rows = con.execute(SQL_TOKEN_REVOCATIONS_SINCE, (int(seq), int(min_not_before))).fetchall()
+    return [(r["seq"], r["session_id"], r["not_before"]) for r in rows]
+
+def prune_sessions(keep_days: int = 7, revocation_seconds: int = 86400) -> Dict[str, int]:
+    """Drop sessions dead for keep_days and revocations no access token can still predate."""
+    def _tx(con: sqlite3.Connection) -> Dict[str, int]:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).isoformat()
+        s = con.execute(
+            "DELETE FROM sessions WHERE expires_at < ? OR revoked_at < ?", (cutoff, cutoff)
+        ).rowcount
+        r = con.execute(
+            "DELETE FROM token_revocations WHERE not_before < ?", (_epoch_ms() - revocation_seconds * 1000,)
+        ).rowcount
+        return {"sessions": s, "revocations": r}
+
+    return _write(_tx)
 
 # ---------------------------
 # Audit
 # ---------------------------
 
+_AUDIT_INSERT = "INSERT INTO audit_log (actor, action, target, meta, created_at) VALUES (?, ?, ?, ?, ?)"
+
+# AUDIT_ASYNC=0 writes audit rows inline (inside the caller's transaction) like before.
+AUDIT_ASYNC = get_env("AUDIT_ASYNC", "1").strip() != "0"
+AUDIT_FLUSH_MS = max(1.0, _env_float("AUDIT_FLUSH_MS", 50.0))
+AUDIT_BATCH_SIZE = max(1, _env_int("AUDIT_BATCH_SIZE", 500))
+AUDIT_QUEUE_MAX = max(1, _env_int("AUDIT_QUEUE_MAX", 20000))
+# How long audit() may block on a full queue before writing the row itself.
+AUDIT_ENQUEUE_TIMEOUT = max(0.0, _env_float("AUDIT_ENQUEUE_TIMEOUT", 0.5))
+
+_AUDIT_STOP = object()
+
+class AuditWriter:
+    """
+    Group-commit writer for audit_log.
+
+    audit() drops rows on a bounded queue; one background thread drains it and
+    inserts up to `batch_size` rows per transaction with executemany, at most
+    `flush_ms` after the first row of a batch arrived. When the queue is full
+    the caller waits briefly, then falls back to a synchronous insert, so rows
+    are never silently dropped.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_ms: float = AUDIT_FLUSH_MS,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        queue_max: int = AUDIT_QUEUE_MAX,
+    ):
+        self.path = path
+        self.flush_s = float(flush_ms) / 1000.0
+        self.batch_size = int(batch_size)
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=int(queue_max))
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "sync_fallbacks": 0,
+            "errors": 0,
+            "flush_last_ms": 0.0,
+            "flush_max_ms": 0.0,
+            "flush_total_ms": 0.0,
+        }
+        # One connection per database file (the global DB, plus shards with DB_SHARD_BY_MC).
+        self._cons: Dict[str, sqlite3.Connection] = {}
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Tuple[Any, ...], path: Optional[str] = None) -> bool:
+        try:
+            self._q.put((path or self.path, row), timeout=AUDIT_ENQUEUE_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self._stats["sync_fallbacks"] += 1
+            return False
+        with self._lock:
+            self._stats["enqueued"] += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything enqueued so far is committed."""
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread.is_alive():
+            self._q.put(_AUDIT_STOP)
+            self._thread.join(timeout)
+
+    def _write_file(self, path: str, rows: List[Tuple[Any, ...]]) -> bool:
+        if DB_SINGLE_WRITER:
+            # The single writer owns the only read-write connection; hand it the rows.
+            try:
+                _write(lambda con: con.executemany(_AUDIT_INSERT, rows), path)
+                return True
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                print(f"[audit] dropped {len(rows)} rows after write failure: {e!r}")
+                return False
+        for attempt in (1, 2):
+            try:
+                con = self._cons.get(path)
+                if con is None:
+                    if path not in _SCHEMA_READY:
+                        migrate(path)
+                    con = self._cons[path] = _open_connection(path)
+                with con:
+                    con.executemany(_AUDIT_INSERT, rows)
+                return True
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                try:
+                    con = self._cons.pop(path, None)
+                    if con is not None:
+                        con.close()
+                except Exception:
+                    pass
+                if attempt == 2:
+                    print(f"[audit] dropped {len(rows)} rows after write failure: {e!r}")
+        return False
+
+    def _write(self, batch: List[Tuple[str, Tuple[Any, ...]]]) -> None:
+        t0 = time.perf_counter()
+        by_path: Dict[str, List[Tuple[Any, ...]]] = {}
+        for path, row in batch:
+            by_path.setdefault(path, []).append(row)
+        written = sum(len(rows) for path, rows in by_path.items() if self._write_file(path, rows))
+        if not written:
+            return
+        ms = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["batches"] += 1
+            self._stats["flush_last_ms"] = ms
+            self._stats["flush_total_ms"] += ms
+            if ms > self._stats["flush_max_ms"]:
+                self._stats["flush_max_ms"] = ms
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            batch: List[Tuple[str, Tuple[Any, ...]]] = []
+            waiters: List[threading.Event] = []
+            stopping = False
+            deadline = time.monotonic() + self.flush_s
+            while True:
+                if item is _AUDIT_STOP:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for w in waiters:
+                w.set()
+            if stopping:
+                for con in self._cons.values():
+                    con.close()
+                self._cons.clear()
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["queue_depth"] = self._q.qsize()
+        out["queue_max"] = self._q.maxsize
+        out["flush_avg_ms"] = round(out["flush_total_ms"] / out["batches"], 3) if out["batches"] else 0.0
+        for k in ("flush_last_ms", "flush_max_ms", "flush_total_ms"):
+            out[k] = round(out[k], 3)
+        return out
+
+_AUDIT_WRITER: Optional[AuditWriter] = None
+_AUDIT_LOCK = threading.Lock()
+
+def _audit_writer() -> AuditWriter:
+    global _AUDIT_WRITER
+    w = _AUDIT_WRITER
+    if w is not None and w.path == DB_PATH:
+        return w
+    with _AUDIT_LOCK:
+        if _AUDIT_WRITER is None or _AUDIT_WRITER.path != DB_PATH:
+            if _AUDIT_WRITER is not None:
+                _AUDIT_WRITER.stop()
+            if DB_PATH not in _SCHEMA_READY:
+                migrate()
+            _AUDIT_WRITER = AuditWriter(DB_PATH)
+        return _AUDIT_WRITER
+
 def audit(actor: str, action: str, target: str, meta: Optional[str]) -> None:
-    with _conn() as con:
+    # Audit rows follow the current tenant's shard (global file otherwise).
+    row = ((actor or "").strip(), (action or "").strip(), (target or "").strip(), meta, now_iso())
+    path = _tenant_path()
+    if AUDIT_ASYNC and _audit_writer().submit(row, path):
+        return
+    _exec_write(_AUDIT_INSERT, row, path)
+
+def flush_audit(timeout: float = 5.0) -> bool:
+    w = _AUDIT_WRITER
+    return w.flush(timeout) if w is not None else True
+
+def shutdown_audit(timeout: float = 5.0) -> None:
+    """Drain and stop the audit writer. Registered with atexit and the app shutdown hook."""
+    global _AUDIT_WRITER
+    with _AUDIT_LOCK:
+        if _AUDIT_WRITER is not None:
+            _AUDIT_WRITER.stop(timeout)
+        _AUDIT_WRITER = None
+
+def audit_stats() -> Dict[str, Any]:
+    w = _AUDIT_WRITER
+    base: Dict[str, Any] = {"async": AUDIT_ASYNC, "flush_ms": AUDIT_FLUSH_MS, "batch_size": AUDIT_BATCH_SIZE}
+    if w is None:
+        return {**base, "running": False}
+    return {**base, "running": True, **w.stats()}
+
+atexit.register(shutdown_writer)
+atexit.register(shutdown_audit)
+
+# ---------------------------
+# Background jobs
+# ---------------------------
+
+_JOBS: Dict[str, Tuple[threading.Thread, threading.Event]] = {}
+_JOBS_LOCK = threading.Lock()
+
+def start_periodic(name: str, fn: Callable[[], None], interval_hours: float, run_now: bool = True) -> bool:
+    """
+    Run fn every interval_hours on a daemon thread (first run immediately
+    unless run_now=False). One thread per name; returns False if disabled
+    (interval <= 0) or already running. Failures are logged, not raised.
+    """
+    if interval_hours <= 0:
+        return False
+    with _JOBS_LOCK:
+        job = _JOBS.get(name)
+        if job is not None and job[0].is_alive():
+            return False
+        stop = threading.Event()
+
+        def _run() -> None:
+            if not run_now:
+                stop.wait(interval_hours * 3600.0)
+            while not stop.is_set():
+                try:
+                    fn()
+                except Exception as e:
+                    print(f"[{name}] failed: {e!r}")
+                stop.wait(interval_hours * 3600.0)
+
+        t = threading.Thread(target=_run, name=name, daemon=True)
+        _JOBS[name] = (t, stop)
+        t.start()
+    return True
+
+def stop_periodic_jobs() -> None:
+    """Signal every start_periodic() thread to exit; a job already running finishes first."""
+    with _JOBS_LOCK:
+        for _, stop in _JOBS.values():
+            stop.set()
+        _JOBS.clear()
+
+# ---------------------------
+# Audit history and monthly rollover
+# ---------------------------
+#
+# audit_log holds the last AUDIT_HOT_MONTHS calendar months. rollover_audit()
+# moves older rows, month by month, into one archive file per month next to
+# the database (<stem>_audit/audit_YYYY-MM.db, same table and indexes), and
+# deletes archive files past AUDIT_RETENTION_MONTHS. Dropping a month is an
+# unlink instead of a multi-million-row DELETE, and the live table and its
+# indexes stay the size of a couple of months. query_audit() reads the live
+# table first and then the archive months the filters can reach.
+
+AUDIT_HOT_MONTHS = max(1, _env_int("AUDIT_HOT_MONTHS", 2))
+# 0 keeps archives forever.
+AUDIT_RETENTION_MONTHS = max(0, _env_int("AUDIT_RETENTION_MONTHS", 24))
+# Rows moved per transaction, so rollover never holds the write lock for long.
+AUDIT_ROLLOVER_BATCH = max(1, _env_int("AUDIT_ROLLOVER_BATCH", 5000))
+
+_AUDIT_COLUMNS = "id, actor, action, target, meta, created_at"
+
+def _month_key(months_back: int = 0, now: Optional[datetime] = None) -> str:
+    d = now or datetime.now(timezone.utc)
+    y, m = divmod(d.year * 12 + (d.month - 1) - months_back, 12)
+    return f"{y:04d}-{m + 1:02d}"
+
+def _next_month(month: str) -> str:
+    y, m = int(month[:4]), int(month[5:7])
+    return f"{y + m // 12:04d}-{m % 12 + 1:02d}"
+
+def audit_archive_dir(path: Optional[str] = None) -> Path:
+    p = Path(path or DB_PATH)
+    return p.parent / f"{p.stem}_audit"
+
+def _audit_archives(path: Optional[str] = None) -> List[Tuple[str, str]]:
+    """(month, file) pairs for every archive of the database at path, newest first."""
+    d = audit_archive_dir(path)
+    if not d.is_dir():
+        return []
+    out = []
+    for f in d.glob("audit_*.db"):
+        month = f.stem[len("audit_"):]
+        if len(month) == 7 and month[4] == "-" and month.replace("-", "").isdigit():
+            out.append((month, str(f)))
+    return sorted(out, reverse=True)
+
+def _open_audit_archive(file: str) -> None:
+    con = _open_connection(file)
+    try:
         con.execute(
-            "INSERT INTO audit_log (actor, action, target, meta, created_at) VALUES (?, ?, ?, ?, ?)",
-            ((actor or "").strip(), (action or "").strip(), (target or "").strip(), meta, now_iso()),
+            """
+            CREATE TABLE IF NOT EXISTS audit_log (
+                id INTEGER PRIMARY KEY,
+                actor TEXT NOT NULL,
+                action TEXT NOT NULL,
+                target TEXT NOT NULL,
+                meta TEXT,
+                created_at TEXT NOT NULL
+            )
+            """
         )
+        _audit_indexes(con)
+        con.commit()
+    finally:
+        con.close()
+
+def _audit_sql(where: List[str]) -> str:
+    return f"""
+    SELECT {_AUDIT_COLUMNS}
+    FROM audit_log
+    WHERE {" AND ".join(where) or "1"}
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+"""
+
+def query_audit(
+    actor: Optional[str] = None,
+    action: Optional[str] = None,
+    target: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    path: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of audit rows newest-first (since inclusive, until exclusive, both
+    ISO timestamps or prefixes like "2026-09"), plus the cursor for the next page.
+    Raises ValueError on a cursor we didn't issue.
+    """
+    n = clamp_page_size(limit)
+    after = decode_cursor(cursor)
+    where: List[str] = []
+    params: List[Any] = []
+    for col, val in (("actor", actor), ("action", action), ("target", target)):
+        if val:
+            where.append(f"{col}=?")
+            params.append(val.strip())
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < ?")
+        params.append(until)
+    if after:
+        if not after[1].isdigit():
+            raise ValueError("invalid cursor")
+        where.append("(created_at, id) < (?, ?)")
+        params.extend([after[0], int(after[1])])
+    sql = _audit_sql(where)
+    args = tuple(params) + (n + 1,)
+
+    target_path = path or _tenant_path()
+    with _conn(target_path) as con:
+        rows = [dict(r) for r in con.execute(sql, args).fetchall()]
+    for month, file in _audit_archives(target_path):
+        end = _next_month(month)
+        if since and end <= since:
+            break
+        if (until and month >= until) or (after and month > after[0]):
+            continue
+        # Archives are disjoint months, newest first: once a full page is newer
+        # than this month's end, no older archive can contribute.
+        if len(rows) > n and rows[n]["created_at"] >= end:
+            break
+        con = _open_connection(file, readonly=True)
+        try:
+            rows.extend(dict(r) for r in con.execute(sql, args).fetchall())
+        finally:
+            con.close()
+        rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        del rows[n + 1:]
+
+    next_cursor = None
+    if len(rows) > n:
+        rows = rows[:n]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    return rows, next_cursor
+
+def rollover_audit(
+    path: Optional[str] = None,
+    hot_months: int = AUDIT_HOT_MONTHS,
+    retention_months: int = AUDIT_RETENTION_MONTHS,
+) -> Dict[str, Any]:
+    """
+    Move audit rows older than the hot window into monthly archive files and
+    delete archives past retention. Safe to re-run: rows are copied with
+    INSERT OR IGNORE before they are deleted, so an interrupted batch is
+    finished by the next run.
+    """
+    target = path or DB_PATH
+    if target not in _SCHEMA_READY:
+        migrate(target)
+    cutoff = _month_key(max(1, hot_months) - 1)
+    moved: Dict[str, int] = {}
+    con = _open_connection(target)
+    try:
+        months = [
+            r[0]
+            for r in con.execute(
+                "SELECT DISTINCT substr(created_at, 1, 7) FROM audit_log WHERE created_at < ?", (cutoff,)
+            )
+        ]
+        for month in months:
+            if not (len(month) == 7 and month[4] == "-" and month.replace("-", "").isdigit()):
+                continue  # rows without a usable timestamp stay in the live table
+            file = str(audit_archive_dir(target) / f"audit_{month}.db")
+            _open_audit_archive(file)
+            con.execute("ATTACH DATABASE ? AS arc", (file,))
+            try:
+                count = 0
+                while True:
+                    con.execute("BEGIN IMMEDIATE")
+                    try:
+                        ids = [
+                            r[0]
+                            for r in con.execute(
+                                "SELECT id FROM main.audit_log WHERE created_at >= ? AND created_at < ? LIMIT ?",
+                                (month, _next_month(month), AUDIT_ROLLOVER_BATCH),
+                            )
+                        ]
+                        if ids:
+                            batch = json.dumps(ids)
+                            con.execute(
+                                f"""
+                                INSERT OR IGNORE INTO arc.audit_log ({_AUDIT_COLUMNS})
+                                SELECT {_AUDIT_COLUMNS} FROM main.audit_log
+                                WHERE id IN (SELECT value FROM json_each(?))
+                                """,
+                                (batch,),
+                            )
+                            con.execute("DELETE FROM main.audit_log WHERE id IN (SELECT value FROM json_each(?))", (batch,))
+                        con.commit()
+                    except Exception:
+                        con.rollback()
+                        raise
+                    if not ids:
+                        break
+                    count += len(ids)
+            finally:
+                con.execute("DETACH DATABASE arc")
+            moved[month] = count
+            arc = _open_connection(file)
+            try:
+                arc.execute("VACUUM")
+            finally:
+                arc.close()
+        if moved:
+            # Freed pages in the main file are reused by new rows; this just
+            # keeps the WAL from holding the moved months.
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        con.close()
+
+    pruned: List[str] = []
+    if retention_months > 0:
+        oldest = _month_key(max(retention_months, hot_months) - 1)
+        for month, file in _audit_archives(target):
+            if month < oldest:
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.remove(file + suffix)
+                    except FileNotFoundError:
+                        pass
+                pruned.append(month)
+    return {"db_path": target, "cutoff": cutoff, "moved": moved, "pruned": sorted(pruned)}
+
+def rollover_audit_all() -> List[Dict[str, Any]]:
+    """rollover_audit() for the global file and every tenant shard."""
+    return [rollover_audit(p) for p in [DB_PATH] + list_shards()]
+
+# Hours between background rollovers started by the app; 0 leaves it to
+# `python db.py audit-rollover` or POST /admin/audit/rollover.
+AUDIT_ROLLOVER_HOURS = max(0.0, _env_float("AUDIT_ROLLOVER_HOURS", 24.0))
+
+def _rollover_job() -> None:
+    for r in rollover_audit_all():
+        if r["moved"] or r["pruned"]:
+            print(f"[audit] rollover {r['db_path']}: moved {r['moved']} pruned {r['pruned']}")
+
+def start_audit_rollover(interval_hours: Optional[float] = None) -> None:
+    """Run rollover_audit_all() now and every interval_hours (default AUDIT_ROLLOVER_HOURS)."""
+    hours = AUDIT_ROLLOVER_HOURS if interval_hours is None else interval_hours
+    start_periodic("audit-rollover", _rollover_job, hours)
 
 # ---------------------------
 # Loads helpers
@@ -294,6 +2294,22 @@ LOAD_COLUMNS = ",".join(
         "rate_total",
         "rate_per_mile",
         "notes",
+        "driver_username",
+        "created_by",
+        "pickup_address",
+        "pickup_appt",
+        "delivery_address",
+        "delivery_appt",
+        "driver_pay",
+        "fuel_surcharge",
+        "ratecon_terms",
+        "reviewed_by",
+        "pulled_reason",
+        "delivered_at",
+        "invoiced_at",
+        "invoice_number",
+        "paid_at",
+        "external_ref",
         "created_at",
         "updated_at",
     ]
@@ -318,68 +2334,1275 @@ def upsert_load(load: Dict[str, Any]) -> None:
     placeholders = ",".join(["?"] * len(cols))
     updates = ",".join([f"{c}=excluded.{c}" for c in cols if c != "id"])
 
-    with _conn() as con:
-        con.execute(
+    _exec_write(
+        f"""
+        INSERT INTO loads ({",".join(cols)}) VALUES ({placeholders})
+        ON CONFLICT(id) DO UPDATE SET {updates}
+        """,
+        tuple(values[c] for c in cols),
+        _tenant_path(bmc),
+    )
+
+# Next load id/rowid: past every row in both tiers, so an archived load's id
+# is never handed out again. Both MAX(rowid) lookups are O(1).
+_NEXT_LOAD_ROWID = (
+    "(SELECT MAX(COALESCE((SELECT MAX(rowid) FROM loads), 0), "
+    "COALESCE((SELECT MAX(rowid) FROM loads_archive), 0)) + 1)"
+)
+
+def get_load(load_id: Any):
+    """The load by id, from the hot table or, for old paid loads, the archive."""
+    lid = str(load_id if load_id is not None else "").strip()
+    if not lid:
+        return None
+    with _conn(_tenant_path()) as con:
+        row = con.execute(f"SELECT {LOAD_COLUMNS} FROM loads WHERE id=?", (lid,)).fetchone()
+        if row is None:
+            row = con.execute(f"SELECT {LOAD_COLUMNS} FROM loads_archive WHERE id=?", (lid,)).fetchone()
+        return row
+
+def json_dumps_safe(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    try:
+        return json.dumps(v, separators=(",", ":"), default=str)
+    except Exception:
+        return None
+
+def json_loads_safe(s: Optional[str]) -> Any:
+    if not s:
+        return None
+    try:
+        return json.loads(s)
+    except Exception:
+        return None
+
+_LOAD_COLUMN_SET = set(LOAD_COLUMNS.split(","))
+
+def create_load(
+    broker_mc: str,
+    pickup_address: str,
+    delivery_address: str,
+    created_by: str,
+    visibility: str = "pending",
+    **fields: Any,
+) -> int:
+    """
+    Insert a new load and return its numeric id.
+    The id (and rowid) is _NEXT_LOAD_ROWID, computed inside the INSERT itself,
+    so concurrent creators can't hand out the same number.
+    """
+    mc = (broker_mc or "").strip()
+    if not mc:
+        raise ValueError("broker_mc required")
+    ts = now_iso()
+    values: Dict[str, Any] = {k: v for k, v in fields.items() if k in _LOAD_COLUMN_SET}
+    values.update(
+        {
+            "broker_mc": mc,
+            "pickup_address": pickup_address,
+            "delivery_address": delivery_address,
+            "created_by": created_by,
+            "visibility": visibility,
+            "created_at": ts,
+            "updated_at": ts,
+        }
+    )
+    values.pop("id", None)
+    cols = list(values.keys())
+
+    def _tx(con: sqlite3.Connection) -> int:
+        cur = con.execute(
             f"""
-            INSERT INTO loads ({",".join(cols)}) VALUES ({placeholders})
-            ON CONFLICT(id) DO UPDATE SET {updates}
+            INSERT INTO loads (rowid, id, {",".join(cols)})
+            VALUES ({_NEXT_LOAD_ROWID}, CAST({_NEXT_LOAD_ROWID} AS TEXT), {",".join(["?"] * len(cols))})
             """,
             tuple(values[c] for c in cols),
         )
+        row = con.execute("SELECT id FROM loads WHERE rowid=?", (cur.lastrowid,)).fetchone()
+        return int(row["id"])
 
-def get_load(load_id: str):
-    lid = (load_id or "").strip()
-    if not lid:
+    return _write(_tx, _tenant_path(mc))
+
+def update_load_fields(load_id: Any, updated_by: str, fields: Dict[str, Any]) -> None:
+    # updated_by is accepted for call-site symmetry; the audit row records the actor.
+    cols = [k for k in (fields or {}) if k in _LOAD_COLUMN_SET and k not in ("id", "created_at", "updated_at")]
+    if not cols:
+        return
+    sets = ",".join(f"{c}=?" for c in cols)
+    _exec_write(
+        f"UPDATE loads SET {sets}, updated_at=? WHERE id=?",
+        tuple(fields[c] for c in cols) + (now_iso(), str(load_id)),
+        _tenant_path(),
+    )
+
+# ---------------------------
+# Load negotiations
+# ---------------------------
+
+# Parts of a quote kept in the compressed payload, in response order.
+NEGOTIATION_FIELDS = ("inputs", "selected", "fuel", "breakdown", "warnings", "market_assumptions")
+NEGOTIATION_COLUMNS = (
+    "id,load_id,broker_username,applied,override_reason,"
+    "customer_rate_total,driver_cpm,broker_margin,fuel_period,created_at"
+)
+# ?sort= for list_load_negotiations(); each has a matching index (migration 10).
+NEGOTIATION_SORTS = {
+    "newest": "id DESC",
+    "rate": "customer_rate_total DESC, id DESC",
+    "driver_cpm": "driver_cpm DESC, id DESC",
+    "margin": "broker_margin DESC, id DESC",
+}
+
+def _negotiation_sql(sort: str, with_payload: bool, fuel_period: bool) -> str:
+    cols = NEGOTIATION_COLUMNS + (",payload" if with_payload else "")
+    period_sql = "AND fuel_period=?" if fuel_period else ""
+    return f"""
+    SELECT {cols}
+    FROM load_negotiations
+    WHERE load_id=? {period_sql}
+    ORDER BY {NEGOTIATION_SORTS[sort]}
+    LIMIT ?
+    """
+
+def pack_negotiation(parts: Dict[str, Any]) -> bytes:
+    raw = json.dumps(parts, separators=(",", ":"), default=str).encode("utf-8")
+    return zlib.compress(raw, 6)
+
+def unpack_negotiation(payload: Optional[bytes], fields: Iterable[str] = NEGOTIATION_FIELDS) -> Dict[str, Any]:
+    """Requested parts of a stored quote; a missing or unreadable payload yields empty parts."""
+    try:
+        parts = json.loads(zlib.decompress(payload)) if payload else {}
+    except Exception:
+        parts = {}
+    return {f: parts.get(f) or ([] if f == "warnings" else {}) for f in fields}
+
+def _as_float(v: Any) -> Optional[float]:
+    try:
+        return float(v) if v is not None and v != "" else None
+    except (TypeError, ValueError):
         return None
-    with _conn() as con:
-        return con.execute(f"SELECT {LOAD_COLUMNS} FROM loads WHERE id=?", (lid,)).fetchone()
+
+def create_load_negotiation(
+    load_id: int,
+    broker_username: Optional[str],
+    applied: bool,
+    override_reason: Optional[str],
+    inputs: Dict[str, Any],
+    selected: Dict[str, Any],
+    fuel: Dict[str, Any],
+    breakdown: Dict[str, Any],
+    warnings: List[str],
+    market_assumptions: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Store one quote and return its id. Audit rows reference it by id
+    ({"negotiation_id": ...}) instead of repeating the quote.
+    """
+    parts = {
+        "inputs": inputs,
+        "selected": selected,
+        "fuel": fuel,
+        "breakdown": breakdown,
+        "warnings": warnings,
+        "market_assumptions": market_assumptions,
+    }
+    row = (
+        int(load_id),
+        broker_username,
+        1 if applied else 0,
+        override_reason,
+        _as_float((breakdown or {}).get("customer_rate_total")),
+        _as_float((selected or {}).get("driver_loaded_mile_pay")),
+        _as_float((breakdown or {}).get("broker_margin_pct_real")),
+        (fuel or {}).get("period"),
+        pack_negotiation(parts),
+        now_iso(),
+    )
+
+    def _tx(con: sqlite3.Connection) -> int:
+        cur = con.execute(
+            """
+            INSERT INTO load_negotiations (
+                load_id, broker_username, applied, override_reason, customer_rate_total,
+                driver_cpm, broker_margin, fuel_period, payload, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            row,
+        )
+        return int(cur.lastrowid)
+
+    return _write(_tx, _tenant_path())
+
+def list_load_negotiations(
+    load_id: int,
+    limit: Optional[int] = 20,
+    fields: Optional[Iterable[str]] = None,
+    sort: str = "newest",
+    fuel_period: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    A load's quotes in `sort` order. Only the payload parts named in `fields`
+    (default: all of NEGOTIATION_FIELDS) are decoded; with no parts requested
+    the payload column is not even read.
+    """
+    want = [f for f in (NEGOTIATION_FIELDS if fields is None else fields) if f in NEGOTIATION_FIELDS]
+    if sort not in NEGOTIATION_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(NEGOTIATION_SORTS)}")
+    period = (fuel_period or "").strip()
+    sql = _negotiation_sql(sort, bool(want), bool(period))
+    args = (int(load_id),) + ((period,) if period else ()) + (clamp_page_size(limit),)
+    with _conn(_tenant_path()) as con:
+        rows = con.execute(sql, args).fetchall()
+    out = []
+    for r in rows:
+        d = {k: r[k] for k in NEGOTIATION_COLUMNS.split(",")}
+        d["applied"] = bool(d["applied"])
+        if want:
+            d.update(unpack_negotiation(r["payload"], want))
+        out.append(d)
+    return out
+
+# ---------------------------
+# Guarded load transitions
+# ---------------------------
+#
+# Each transition is one conditional statement: the guards are ANDed into the
+# WHERE clause and the new row comes back via RETURNING, so the check and the
+# write can't race and the happy path is a single round-trip. Only when no row
+# matched do we read the guard flags back (one PK lookup) to say why.
+
+class TransitionRejected(Exception):
+    """
+    A guarded transition matched no row.
+    kind is "not_found", "forbidden" or "state"; guard is the first guard
+    that failed; state holds the load's lifecycle columns (empty if not found).
+    """
+
+    def __init__(self, kind: str, guard: str, message: str, state: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.guard = guard
+        self.message = message
+        self.state = state or {}
+
+# name -> (SQL predicate, failure kind, default message). Predicates use the
+# transition's named parameters (:mc, :actor, ...). Blank strings count as
+# unset, matching what the routes always treated as "not paid"/"not invoiced".
+LOAD_GUARDS: Dict[str, Tuple[str, str, str]] = {
+    "mc": ("COALESCE(broker_mc, '') = :mc", "forbidden", "Forbidden"),
+    "driver": ("COALESCE(driver_username, '') = :actor", "forbidden", "Forbidden"),
+    "pending": ("LOWER(COALESCE(visibility, '')) = 'pending'", "state", "Only pending loads can be modified by broker"),
+    "published": ("LOWER(COALESCE(visibility, '')) = 'published'", "state", "Only published loads allowed"),
+    "invoiced": ("COALESCE(invoiced_at, '') <> ''", "state", "Load must be invoiced first"),
+    "not_invoiced": ("COALESCE(invoiced_at, '') = ''", "state", "Load is invoiced and locked"),
+    "not_paid": ("COALESCE(paid_at, '') = ''", "state", "Load is paid and locked"),
+}
+
+# name -> spec. "guards" run in order (the first failing one is reported),
+# "set" maps columns to SQL expressions over named parameters, "delete" turns
+# the statement into a DELETE, "messages" overrides guard messages.
+LOAD_TRANSITIONS: Dict[str, Dict[str, Any]] = {
+    "publish": {
+        "guards": ("mc", "pending", "not_paid", "not_invoiced"),
+        "set": {"visibility": "'published'", "reviewed_by": ":actor", "pulled_reason": "NULL"},
+        "messages": {"pending": "Only pending loads can be published"},
+    },
+    "cancel": {
+        "guards": ("mc", "pending", "not_paid", "not_invoiced"),
+        "set": {"visibility": "'pulled'", "reviewed_by": ":actor", "pulled_reason": ":reason"},
+        "messages": {"pending": "Only pending loads can be canceled"},
+    },
+    "delete": {
+        "guards": ("mc", "pending", "not_paid", "not_invoiced"),
+        "delete": True,
+        "messages": {"pending": "Only pending loads can be deleted"},
+    },
+    "update": {
+        # Columns come from the caller's `fields` (whitelisted against LOAD_COLUMNS).
+        "guards": ("mc", "pending", "not_paid", "not_invoiced"),
+        "set": {},
+        "messages": {"pending": "Only pending loads can be edited"},
+    },
+    "invoice": {
+        "guards": ("mc", "published", "not_paid", "not_invoiced"),
+        "set": {"invoiced_at": ":now", "invoice_number": ":invoice_number"},
+        "messages": {"published": "Only published loads can be invoiced"},
+    },
+    "paid": {
+        "guards": ("mc", "invoiced", "not_paid"),
+        "set": {"paid_at": ":now"},
+    },
+    "assign_driver": {
+        # Assigning also claims the load for the dispatcher.
+        "guards": ("mc", "published", "not_paid", "not_invoiced"),
+        "set": {"driver_username": ":driver", "dispatcher_username": ":actor", "status": "'assigned'"},
+    },
+    "unassign_driver": {
+        "guards": ("mc", "published", "not_paid", "not_invoiced"),
+        "set": {"driver_username": "NULL", "status": "CASE WHEN status='assigned' THEN 'new' ELSE status END"},
+    },
+    "release": {
+        "guards": ("mc", "published", "not_paid", "not_invoiced"),
+        "set": {
+            "dispatcher_username": "NULL",
+            "driver_username": "NULL",
+            "status": "CASE WHEN status='assigned' THEN 'new' ELSE status END",
+        },
+    },
+    "apply_rate": {
+        # A negotiated quote written onto the load (negotiate.py); columns come
+        # from `fields`. Billed loads keep the rate they were invoiced at.
+        "guards": ("mc", "not_paid", "not_invoiced"),
+        "set": {},
+    },
+    "driver_accept": {
+        "guards": ("driver", "not_paid"),
+        "set": {"status": "'accepted'"},
+    },
+    "driver_status": {
+        "guards": ("driver", "not_paid"),
+        "set": {
+            "status": ":status",
+            "delivered_at": "CASE WHEN :status='delivered' AND COALESCE(delivered_at, '') = '' THEN :now ELSE delivered_at END",
+        },
+    },
+}
+
+_LOAD_STATE_COLUMNS = "visibility, status, driver_username, invoiced_at, invoice_number, paid_at, delivered_at"
+
+def _transition_sql(spec: Dict[str, Any], fields: Iterable[str]) -> str:
+    where = " AND ".join(f"({LOAD_GUARDS[g][0]})" for g in spec["guards"])
+    if spec.get("delete"):
+        return f"DELETE FROM loads WHERE id = :id AND {where} RETURNING {LOAD_COLUMNS}"
+    sets = [f"{col} = {expr}" for col, expr in spec["set"].items()]
+    sets += [f"{col} = :f_{col}" for col in fields]
+    sets.append("updated_at = :now")
+    return f"UPDATE loads SET {', '.join(sets)} WHERE id = :id AND {where} RETURNING {LOAD_COLUMNS}"
+
+def _transition_rejection(con: sqlite3.Connection, spec: Dict[str, Any], params: Dict[str, Any]) -> TransitionRejected:
+    flags = ", ".join(f"({LOAD_GUARDS[g][0]}) AS g_{g}" for g in spec["guards"])
+    row = con.execute(f"SELECT {flags}, {_LOAD_STATE_COLUMNS} FROM loads WHERE id = :id", params).fetchone()
+    archived = False
+    if row is None:
+        # Archived loads are paid, so the same guards explain the refusal.
+        row = con.execute(f"SELECT {flags}, {_LOAD_STATE_COLUMNS} FROM loads_archive WHERE id = :id", params).fetchone()
+        archived = row is not None
+    if row is None:
+        return TransitionRejected("not_found", "exists", "Load not found")
+    state = {k: row[k] for k in row.keys() if not k.startswith("g_")}
+    for g in spec["guards"]:
+        if not row[f"g_{g}"]:
+            _, kind, message = LOAD_GUARDS[g]
+            return TransitionRejected(kind, g, spec.get("messages", {}).get(g, message), state)
+    if archived:
+        return TransitionRejected("state", "archived", "Load is paid and archived; it can no longer change", state)
+    # Guards pass now: the row changed between the statement and this read.
+    return TransitionRejected("state", "concurrent", "Load changed concurrently; retry", state)
+
+# Never taken from `fields`: identity, timestamps, and the owning broker (the
+# "mc" guard and shard routing key on it).
+_TRANSITION_OWNED = frozenset(("id", "broker_mc", "created_at", "updated_at"))
+
+def transition_load(
+    name: str,
+    load_id: Any,
+    actor: str,
+    mc: Optional[str] = None,
+    fields: Optional[Dict[str, Any]] = None,
+    **params: Any,
+) -> sqlite3.Row:
+    """
+    Apply LOAD_TRANSITIONS[name] to one load and return the new row (the
+    deleted row for "delete"). Raises TransitionRejected if a guard fails.
+    mc is the caller's broker_mc for the "mc" guard; extra keyword arguments
+    fill the transition's named parameters (reason, driver, status, ...).
+    """
+    spec = LOAD_TRANSITIONS[name]
+    cols = [k for k in (fields or {}) if k in _LOAD_COLUMN_SET and k not in _TRANSITION_OWNED]
+    values: Dict[str, Any] = {
+        **params,
+        "id": str(load_id),
+        "actor": actor,
+        "mc": (mc or "").strip(),
+        "now": now_iso(),
+    }
+    values.update({f"f_{c}": fields[c] for c in cols})  # type: ignore[index]
+    sql = _transition_sql(spec, cols)
+
+    def _tx(con: sqlite3.Connection) -> sqlite3.Row:
+        # fetchall() steps the statement to completion before anything commits.
+        rows = con.execute(sql, values).fetchall()
+        if not rows:
+            raise _transition_rejection(con, spec, values)
+        return rows[0]
+
+    return _write(_tx, _tenant_path())
+
+# ---------------------------
+# Bulk load import
+# ---------------------------
+
+# Columns a bulk row may set; everything else is owned by the workflow.
+BULK_LOAD_COLUMNS = (
+    "external_ref",
+    "shipper_name",
+    "customer_ref",
+    "pickup_address",
+    "pickup_appt",
+    "pickup_date",
+    "delivery_address",
+    "delivery_appt",
+    "delivery_date",
+    "dispatcher_username",
+    "equipment",
+    "weight_lbs",
+    "miles",
+    "rate_total",
+    "driver_pay",
+    "fuel_surcharge",
+    "ratecon_terms",
+    "notes",
+)
+
+# An imported row may only overwrite a load the broker could still edit by hand.
+_BULK_UPDATE_GUARD = " AND ".join(
+    f"({LOAD_GUARDS[g][0]})" for g in LOAD_TRANSITIONS["update"]["guards"] if g != "mc"
+)
+
+_BULK_INSERT_COLS = BULK_LOAD_COLUMNS + ("broker_mc", "visibility", "created_by", "created_at", "updated_at")
+
+SQL_BULK_UPSERT_LOAD = f"""
+    INSERT INTO loads (rowid, id, {",".join(_BULK_INSERT_COLS)})
+    VALUES ({_NEXT_LOAD_ROWID}, CAST({_NEXT_LOAD_ROWID} AS TEXT), {",".join(["?"] * len(_BULK_INSERT_COLS))})
+    ON CONFLICT (broker_mc, external_ref) WHERE external_ref IS NOT NULL DO UPDATE SET
+        {", ".join(f"{c}=excluded.{c}" for c in BULK_LOAD_COLUMNS + ("updated_at",))}
+    WHERE {_BULK_UPDATE_GUARD}
+"""
+
+def bulk_upsert_loads(broker_mc: str, rows: List[Dict[str, Any]], created_by: str) -> Dict[str, Any]:
+    """
+    Write one chunk of already-validated rows in a single transaction with
+    executemany. Rows carrying an external_ref update the broker's load with
+    that ref, but only while it is still pending and unbilled; such rows are
+    reported back in "locked" (by position in `rows`) and left untouched.
+    Rows without a ref are always inserted as new pending loads.
+
+    Call it outside a unit of work so each chunk commits on its own.
+    """
+    mc = (broker_mc or "").strip()
+    if not mc:
+        raise ValueError("broker_mc required")
+    ts = now_iso()
+    refs = [r.get("external_ref") for r in rows if r.get("external_ref")]
+
+    def _tx(con: sqlite3.Connection) -> Dict[str, Any]:
+        existing: Dict[str, bool] = {}
+        if refs:
+            for ref, editable in con.execute(
+                f"""
+                SELECT external_ref, ({_BULK_UPDATE_GUARD}) FROM loads
+                WHERE broker_mc=? AND external_ref IN (SELECT value FROM json_each(?))
+                """,
+                (mc, json.dumps(refs)),
+            ):
+                existing[ref] = bool(editable)
+            for (ref,) in con.execute(
+                """
+                SELECT external_ref FROM loads_archive
+                WHERE broker_mc=? AND external_ref IN (SELECT value FROM json_each(?))
+                """,
+                (mc, json.dumps(refs)),
+            ):
+                existing[ref] = False  # paid and archived
+        params: List[Tuple[Any, ...]] = []
+        locked: List[int] = []
+        inserted = updated = 0
+        for i, r in enumerate(rows):
+            ref = r.get("external_ref")
+            if ref and existing.get(ref) is False:
+                locked.append(i)
+                continue
+            if ref and ref in existing:
+                updated += 1
+            else:
+                inserted += 1
+                if ref:
+                    # A repeat of this ref later in the chunk updates the row we insert now.
+                    existing[ref] = True
+            params.append(
+                tuple(r.get(c) for c in BULK_LOAD_COLUMNS) + (mc, "pending", created_by, ts, ts)
+            )
+        if params:
+            con.executemany(SQL_BULK_UPSERT_LOAD, params)
+        return {"inserted": inserted, "updated": updated, "locked": locked}
+
+    return _write(_tx, _tenant_path(mc))
+
+# Load board queries. Each has a matching index (migrations 004/005) and is
+# covered by check_query_plans(), so keep the SQL here rather than inline.
+SQL_LOADS_BY_BROKER = f"""
+    SELECT {LOAD_COLUMNS}
+    FROM loads
+    WHERE broker_mc=?
+    ORDER BY created_at DESC
+"""
+
+SQL_PUBLISHED_LOADS_BY_BROKER = f"""
+    SELECT {LOAD_COLUMNS}
+    FROM loads
+    WHERE broker_mc=? AND visibility='published'
+    ORDER BY created_at DESC
+    LIMIT ?
+"""
+
+SQL_LOADS_BY_DISPATCHER = f"""
+    SELECT {LOAD_COLUMNS}
+    FROM loads
+    WHERE broker_mc=? AND (dispatcher_username=? OR dispatcher_username IS NULL)
+    ORDER BY created_at DESC
+"""
+
+SQL_PUBLISHED_LOADS_BY_DISPATCHER = f"""
+    SELECT {LOAD_COLUMNS}
+    FROM loads
+    WHERE broker_mc=? AND dispatcher_username=? AND visibility='published'
+    ORDER BY created_at DESC
+"""
 
 def list_loads_by_broker(broker_mc: str):
     mc = (broker_mc or "").strip()
-    with _conn() as con:
-        return con.execute(
-            f"SELECT {LOAD_COLUMNS} FROM loads WHERE broker_mc=? ORDER BY created_at DESC",
-            (mc,),
-        ).fetchall()
+    with _conn(_tenant_path(mc)) as con:
+        return con.execute(SQL_LOADS_BY_BROKER, (mc,)).fetchall()
 
 def list_published_loads_by_broker_mc(broker_mc: str, limit: int = 500):
     mc = (broker_mc or "").strip()
-    with _conn() as con:
+    with _conn(_tenant_path(mc)) as con:
         return con.execute(
-            f"""
-            SELECT {LOAD_COLUMNS}
-            FROM loads
-            WHERE broker_mc=? AND visibility='published'
-            ORDER BY created_at DESC
-            LIMIT ?
-            """,
+            SQL_PUBLISHED_LOADS_BY_BROKER,
             (mc, int(max(1, min(limit, 2000)))),
         ).fetchall()
 
 def list_loads_by_dispatcher(dispatcher_username: str, broker_mc: str):
     du = (dispatcher_username or "").strip()
     mc = (broker_mc or "").strip()
-    with _conn() as con:
-        return con.execute(
-            f"""
-            SELECT {LOAD_COLUMNS}
-            FROM loads
-            WHERE broker_mc=? AND (dispatcher_username=? OR dispatcher_username IS NULL)
-            ORDER BY created_at DESC
-            """,
-            (mc, du),
-        ).fetchall()
+    with _conn(_tenant_path(mc)) as con:
+        return con.execute(SQL_LOADS_BY_DISPATCHER, (mc, du)).fetchall()
 
 def list_loads_published_by_dispatcher(dispatcher_username: str, broker_mc: str):
     du = (dispatcher_username or "").strip()
     mc = (broker_mc or "").strip()
-    with _conn() as con:
-        return con.execute(
+    with _conn(_tenant_path(mc)) as con:
+        return con.execute(SQL_PUBLISHED_LOADS_BY_DISPATCHER, (mc, du)).fetchall()
+
+# ---------------------------
+# Keyset pagination
+# ---------------------------
+
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 500
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    try:
+        n = int(limit or PAGE_SIZE_DEFAULT)
+    except Exception:
+        n = PAGE_SIZE_DEFAULT
+    return max(1, min(n, PAGE_SIZE_MAX))
+
+def encode_cursor(created_at: Any, load_id: Any) -> str:
+    raw = json.dumps([created_at or "", str(load_id or "")], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Returns (created_at, id) or None for the first page.
+    Raises ValueError on anything that isn't a cursor we issued.
+    """
+    c = (cursor or "").strip()
+    if not c:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(c + "=" * (-len(c) % 4)).decode("utf-8")
+        created_at, lid = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(lid, str):
+        raise ValueError("invalid cursor")
+    return created_at, lid
+
+# Rows as JSON text built by SQLite itself (json_object), for list endpoints
+# that write the response body straight from it: no sqlite3.Row -> dict ->
+# jsonable_encoder -> json.dumps round trip per row.
+def _json_object_sql(columns: Iterable[str]) -> str:
+    return "json_object(" + ", ".join(f"'{c}', {c}" for c in columns) + ")"
+
+LOAD_JSON = _json_object_sql(LOAD_COLUMNS.split(","))
+
+# The driver board's read-only sub-objects; keep in step with
+# loads._limited_ratecon_view() and loads._fuel_breakdown_readonly().
+DRIVER_LOAD_JSON = f"""json_insert({LOAD_JSON},
+    '$.ratecon_limited', json_object(
+        'driver_pay', CAST(COALESCE(driver_pay, 0) AS REAL),
+        'fuel_surcharge', CAST(COALESCE(fuel_surcharge, 0) AS REAL),
+        'ratecon_terms', ratecon_terms),
+    '$.fuel_breakdown', json_object(
+        'fuel_surcharge', CAST(COALESCE(fuel_surcharge, 0) AS REAL),
+        'note', 'Read-only fuel surcharge stored on this load.'))"""
+
+def _keyset_sql(where: str, after: bool, select: str = LOAD_COLUMNS) -> str:
+    cursor_sql = "AND (created_at, id) < (?, ?)" if after else ""
+    return f"""
+    SELECT {select}
+    FROM loads
+    WHERE {where} {cursor_sql}
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+"""
+
+_PAGE_WHERE_BROKER = "broker_mc=?"
+_PAGE_WHERE_DISPATCHER_PUBLISHED = "broker_mc=? AND dispatcher_username=? AND visibility='published'"
+_PAGE_WHERE_DRIVER = "driver_username=?"
+
+def _load_page(
+    where: str,
+    params: Tuple[Any, ...],
+    cursor: Optional[str],
+    limit: Optional[int],
+    path: str,
+    json_sql: Optional[str] = None,
+):
+    """
+    One page of loads newest-first plus the cursor for the next page (None at the end).
+    Fetches limit+1 rows so "is there more" costs no extra query.
+    With json_sql the page is a list of JSON object strings built by that expression.
+    """
+    n = clamp_page_size(limit)
+    after = decode_cursor(cursor)
+    args = params + (tuple(after) if after else ()) + (n + 1,)
+    select = f"{json_sql} AS doc, created_at, id" if json_sql else LOAD_COLUMNS
+    with _conn(path) as con:
+        rows = con.execute(_keyset_sql(where, after is not None, select), args).fetchall()
+    next_cursor = None
+    if len(rows) > n:
+        rows = rows[:n]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    if json_sql:
+        return [r[0] for r in rows], next_cursor
+    return rows, next_cursor
+
+def list_loads_by_broker_page(
+    broker_mc: str, cursor: Optional[str] = None, limit: Optional[int] = None, as_json: bool = False
+):
+    mc = (broker_mc or "").strip()
+    return _load_page(_PAGE_WHERE_BROKER, (mc,), cursor, limit, _tenant_path(mc), LOAD_JSON if as_json else None)
+
+def list_loads_published_by_dispatcher_page(
+    dispatcher_username: str,
+    broker_mc: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    as_json: bool = False,
+):
+    du = (dispatcher_username or "").strip()
+    mc = (broker_mc or "").strip()
+    return _load_page(
+        _PAGE_WHERE_DISPATCHER_PUBLISHED, (mc, du), cursor, limit, _tenant_path(mc), LOAD_JSON if as_json else None
+    )
+
+def list_loads_by_driver_page(
+    driver_username: str, cursor: Optional[str] = None, limit: Optional[int] = None, as_json: bool = False
+):
+    du = (driver_username or "").strip()
+    return _load_page(_PAGE_WHERE_DRIVER, (du,), cursor, limit, _tenant_path(), DRIVER_LOAD_JSON if as_json else None)
+
+# ---------------------------
+# Full-text search
+# ---------------------------
+
+# bm25 weights, in LOAD_FTS_COLUMNS order: a hit on the customer's reference or
+# the shipper outranks one buried in notes or ratecon terms.
+_FTS_WEIGHTS = (10.0, 5.0, 2.0, 2.0, 1.0, 1.0, 1.0, 1.0)
+SEARCH_MAX_TERMS = 12
+
+def fts_query(q: Optional[str]) -> str:
+    """
+    Turn free text from the search box into an FTS5 MATCH expression: every
+    word must match, each as a prefix ("acme dal" finds "ACME Foods, Dallas").
+    Words are quoted, so FTS5 operators typed by users are just text.
+    Returns "" when q has nothing searchable.
+    """
+    terms = re.findall(r"\w+", (q or "").lower())[:SEARCH_MAX_TERMS]
+    return " ".join(f'"{t}"*' for t in terms)
+
+def encode_search_cursor(rank: float, rowid: int) -> str:
+    raw = json.dumps([rank, rowid], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_search_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """Returns (rank, rowid) or None for the first page; ValueError if it isn't ours."""
+    c = (cursor or "").strip()
+    if not c:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(c + "=" * (-len(c) % 4)).decode("utf-8")
+        rank, rowid = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(rank, (int, float)) or isinstance(rank, bool) or not isinstance(rowid, int):
+        raise ValueError("invalid cursor")
+    return float(rank), rowid
+
+def _search_sql(where: str, after: bool) -> str:
+    # Best match first (bm25 is lower-is-better); rowid breaks ties so the
+    # (rank, rowid) cursor is a strict keyset.
+    cols = ", ".join(f"l.{c}" for c in LOAD_COLUMNS.split(","))
+    cursor_sql = "WHERE (rank, rid) > (?, ?)" if after else ""
+    return f"""
+    SELECT * FROM (
+        SELECT {cols}, bm25(loads_fts, {", ".join(map(str, _FTS_WEIGHTS))}) AS rank, l.rowid AS rid
+        FROM loads_fts
+        JOIN loads l ON l.rowid = loads_fts.rowid
+        WHERE loads_fts MATCH ? AND {where}
+    ) {cursor_sql}
+    ORDER BY rank, rid
+    LIMIT ?
+"""
+
+_SEARCH_WHERE_BROKER = "l.broker_mc=?"
+_SEARCH_WHERE_DISPATCHER_PUBLISHED = "l.broker_mc=? AND l.dispatcher_username=? AND l.visibility='published'"
+
+def _search_page(where: str, params: Tuple[Any, ...], q: Optional[str], cursor: Optional[str], limit: Optional[int], path: str):
+    """
+    One page of loads matching q, best match first, plus the next cursor.
+    Rows carry the bm25 score as "rank"; an empty query matches nothing.
+    """
+    n = clamp_page_size(limit)
+    after = decode_search_cursor(cursor)
+    match = fts_query(q)
+    if not match:
+        return [], None
+    args = (match,) + params + (tuple(after) if after else ()) + (n + 1,)
+    with _conn(path) as con:
+        rows = con.execute(_search_sql(where, after is not None), args).fetchall()
+    next_cursor = None
+    if len(rows) > n:
+        rows = rows[:n]
+        last = rows[-1]
+        next_cursor = encode_search_cursor(last["rank"], last["rid"])
+    out = []
+    for r in rows:
+        d = dict(r)
+        d.pop("rid", None)
+        out.append(d)
+    return out, next_cursor
+
+def search_loads_by_broker(broker_mc: str, q: Optional[str], cursor: Optional[str] = None, limit: Optional[int] = None):
+    mc = (broker_mc or "").strip()
+    return _search_page(_SEARCH_WHERE_BROKER, (mc,), q, cursor, limit, _tenant_path(mc))
+
+def search_loads_published_by_dispatcher(
+    dispatcher_username: str,
+    broker_mc: str,
+    q: Optional[str],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    du = (dispatcher_username or "").strip()
+    mc = (broker_mc or "").strip()
+    return _search_page(_SEARCH_WHERE_DISPATCHER_PUBLISHED, (mc, du), q, cursor, limit, _tenant_path(mc))
+
+# ---------------------------
+# Streaming export
+# ---------------------------
+
+# Oldest first by (created_at, id), so an interrupted pull resumes strictly
+# after the last row it got (?3, ?4 = that row's keyset cursor; "" for none).
+# ?2 is the optional since=<created_at> lower bound.
+# Both tiers: SQLite merges the two index-ordered scans, no sort.
+def _export_sql(select: str) -> str:
+    return f"""
+    SELECT {select}
+    FROM loads
+    WHERE broker_mc=?1 AND created_at >= ?2 AND (created_at, id) > (?3, ?4)
+    UNION ALL
+    SELECT {select}
+    FROM loads_archive
+    WHERE broker_mc=?1 AND created_at >= ?2 AND (created_at, id) > (?3, ?4)
+    ORDER BY created_at, id
+"""
+
+SQL_EXPORT_LOADS_BY_BROKER = _export_sql(LOAD_COLUMNS)
+# NDJSON export: one JSON text per row (plus the sort keys).
+SQL_EXPORT_LOADS_BY_BROKER_JSON = _export_sql(f"{LOAD_JSON} AS doc, created_at, id")
+
+EXPORT_FETCH_ROWS = max(1, _env_int("EXPORT_FETCH_ROWS", 500))
+
+def iter_loads_for_export(
+    broker_mc: str,
+    since: Optional[str] = None,
+    cursor: Optional[str] = None,
+    batch: int = EXPORT_FETCH_ROWS,
+    as_json: bool = False,
+) -> Iterator[Any]:
+    """
+    Yield a broker's loads straight off the SQLite cursor, `batch` rows per
+    fetch, so memory stays flat whatever the history size and the first rows
+    arrive while the scan is still running.
+
+    Uses its own read-only connection rather than the pool: a slow client can
+    keep an export open for minutes and must not starve request traffic. The
+    read snapshot it holds only delays WAL checkpoints; writers are not blocked.
+
+    cursor (encode_cursor of the last row received) resumes after that row.
+    as_json=True yields (doc, created_at, id) rows, doc being the load as JSON
+    text built by SQLite.
+    """
+    after = decode_cursor(cursor) or ("", "")
+    mc = (broker_mc or "").strip()
+    path = _tenant_path(mc)
+    if path not in _SCHEMA_READY:
+        migrate(path)
+    con = _open_connection(path, readonly=True)
+    try:
+        sql = SQL_EXPORT_LOADS_BY_BROKER_JSON if as_json else SQL_EXPORT_LOADS_BY_BROKER
+        cur = con.execute(sql, (mc, (since or "").strip(), *after))
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        con.close()
+
+# ---------------------------
+# Paid-load archive tier
+# ---------------------------
+#
+# A paid load never changes again, yet every board query and index over
+# loads still carries it. archive_paid_loads() moves loads paid more than
+# LOAD_ARCHIVE_DAYS ago into loads_archive (same file, so each batch is one
+# ordinary transaction). get_load(), export and transition refusals read
+# through to the archive; the boards and search see only the hot table.
+
+LOAD_ARCHIVE_DAYS = max(0.0, _env_float("LOAD_ARCHIVE_DAYS", 30.0))
+LOAD_ARCHIVE_BATCH = max(1, _env_int("LOAD_ARCHIVE_BATCH", 1000))
+# Hours between background runs started by the app; 0 = only on demand.
+LOAD_ARCHIVE_HOURS = max(0.0, _env_float("LOAD_ARCHIVE_HOURS", 24.0))
+
+SQL_ARCHIVE_CANDIDATES = """
+    SELECT rowid FROM loads
+    WHERE paid_at IS NOT NULL AND paid_at <> '' AND paid_at < ?
+    LIMIT ?
+"""
+
+def archive_paid_loads(path: Optional[str] = None, older_than_days: Optional[float] = None) -> Dict[str, Any]:
+    """Move loads paid more than older_than_days ago (default LOAD_ARCHIVE_DAYS) into loads_archive."""
+    target = path or DB_PATH
+    if target not in _SCHEMA_READY:
+        migrate(target)
+    days = LOAD_ARCHIVE_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.fromtimestamp(time.time() - days * 86400.0, tz=timezone.utc).isoformat()
+
+    def _batch(con: sqlite3.Connection) -> int:
+        ids = [r[0] for r in con.execute(SQL_ARCHIVE_CANDIDATES, (cutoff, LOAD_ARCHIVE_BATCH))]
+        if not ids:
+            return 0
+        batch = json.dumps(ids)
+        con.execute(
             f"""
-            SELECT {LOAD_COLUMNS}
-            FROM loads
-            WHERE broker_mc=? AND dispatcher_username=? AND visibility='published'
-            ORDER BY created_at DESC
+            INSERT INTO loads_archive (rowid, {LOAD_COLUMNS}, archived_at)
+            SELECT rowid, {LOAD_COLUMNS}, ? FROM loads WHERE rowid IN (SELECT value FROM json_each(?))
             """,
-            (mc, du),
-        ).fetchall()
+            (now_iso(), batch),
+        )
+        con.execute("DELETE FROM loads WHERE rowid IN (SELECT value FROM json_each(?))", (batch,))
+        return len(ids)
+
+    moved = 0
+    t0 = time.perf_counter()
+    while True:
+        n = _write(_batch, target)
+        moved += n
+        if n < LOAD_ARCHIVE_BATCH:
+            break
+    return {"db_path": target, "cutoff": cutoff, "moved": moved, "seconds": round(time.perf_counter() - t0, 3)}
+
+def archive_paid_loads_all() -> List[Dict[str, Any]]:
+    """archive_paid_loads() for the global file and every tenant shard."""
+    return [archive_paid_loads(p) for p in [DB_PATH] + list_shards()]
+
+def load_tier_stats(path: Optional[str] = None) -> Dict[str, Any]:
+    with _conn(path or _tenant_path()) as con:
+        hot = con.execute("SELECT COUNT(*) FROM loads").fetchone()[0]
+        archived = con.execute("SELECT COUNT(*) FROM loads_archive").fetchone()[0]
+    return {"hot": hot, "archived": archived, "archive_days": LOAD_ARCHIVE_DAYS}
+
+def _load_archive_job() -> None:
+    for r in archive_paid_loads_all():
+        if r["moved"]:
+            print(f"[loads] archived {r['moved']} paid loads in {r['db_path']} ({r['seconds']}s)")
+
+def start_load_archiver(interval_hours: Optional[float] = None) -> None:
+    """Run archive_paid_loads_all() now and every interval_hours (default LOAD_ARCHIVE_HOURS)."""
+    hours = LOAD_ARCHIVE_HOURS if interval_hours is None else interval_hours
+    start_periodic("load-archive", _load_archive_job, hours)
+
+# ---------------------------
+# App startup / shutdown
+# ---------------------------
+
+def start_background() -> Dict[str, Any]:
+    """
+    Everything an app process does once at startup: migrate, then start the
+    periodic jobs, the bcrypt pool and the token revocation sync. Called from
+    the startup hook of both entrypoints (main.py, freight_main.py).
+    """
+    # Schema changes run once here, never on the request path.
+    result = migrate()
+    print(f"[boot] db schema v{result['to_version']} at {result['db_path']} (applied: {result['applied'] or 'none'})")
+    start_audit_rollover()
+    start_backups()
+    start_load_archiver()
+    start_roster_sync()
+    # passwords/auth sit above db; imported here so db.py stays importable alone.
+    importlib.import_module("passwords").start()
+    try:
+        importlib.import_module("auth").start_revocation_sync()
+    except Exception as e:
+        print(f"[boot] ERROR starting token revocation sync: {e!r}")
+    return result
+
+def stop_background() -> None:
+    """Shutdown counterpart of start_background(): stop jobs, drain writes, stop the bcrypt pool."""
+    stop_periodic_jobs()
+    shutdown_audit()
+    shutdown_writer()
+    importlib.import_module("passwords").shutdown()
+
+# ---------------------------
+# Query plan checks
+# ---------------------------
+
+# name -> (sql, sample params). Params only need the right shape for EXPLAIN.
+HOT_QUERIES: Dict[str, Tuple[str, Tuple[Any, ...]]] = {
+    "list_loads_by_broker": (SQL_LOADS_BY_BROKER, ("MC0",)),
+    "list_published_loads_by_broker_mc": (SQL_PUBLISHED_LOADS_BY_BROKER, ("MC0", 500)),
+    "list_loads_by_dispatcher": (SQL_LOADS_BY_DISPATCHER, ("MC0", "dispatcher")),
+    "list_loads_published_by_dispatcher": (SQL_PUBLISHED_LOADS_BY_DISPATCHER, ("MC0", "dispatcher")),
+    "list_loads_by_broker_page": (_keyset_sql(_PAGE_WHERE_BROKER, True), ("MC0", "", "", 101)),
+    "list_loads_published_by_dispatcher_page": (
+        _keyset_sql(_PAGE_WHERE_DISPATCHER_PUBLISHED, True),
+        ("MC0", "dispatcher", "", "", 101),
+    ),
+    "list_loads_by_driver_page": (_keyset_sql(_PAGE_WHERE_DRIVER, True), ("driver", "", "", 101)),
+    "iter_loads_for_export": (SQL_EXPORT_LOADS_BY_BROKER, ("MC0", "", "2026-01-01", "1")),
+    "archive_paid_loads": (SQL_ARCHIVE_CANDIDATES, ("", 1000)),
+    "query_audit_by_target": (_audit_sql(["target=?", "(created_at, id) < (?, ?)"]), ("load:1", "", 0, 101)),
+    "query_audit_by_actor": (_audit_sql(["actor=?", "(created_at, id) < (?, ?)"]), ("admin", "", 0, 101)),
+    "query_audit_recent": (_audit_sql(["created_at >= ?"]), ("", 101)),
+    **{
+        f"list_load_negotiations_{sort}": (_negotiation_sql(sort, True, False), (1, 20))
+        for sort in NEGOTIATION_SORTS
+    },
+    "list_load_negotiations_fuel_period": (_negotiation_sql("newest", True, True), (1, "2026-01-01", 20)),
+    "token_revocations_since": (SQL_TOKEN_REVOCATIONS_SINCE, (0, 0)),
+}
+
+def explain(sql: str, params: Iterable[Any] = ()) -> List[str]:
+    with _conn() as con:
+        rows = con.execute("EXPLAIN QUERY PLAN " + sql, tuple(params)).fetchall()
+    return [str(r["detail"]) for r in rows]
+
+def plan_problems(plan: List[str]) -> List[str]:
+    problems = []
+    for step in plan:
+        s = step.upper()
+        if s.startswith("SCAN ") and " USING " not in s:
+            problems.append(f"full table scan: {step}")
+        if "USE TEMP B-TREE" in s:
+            problems.append(f"temp b-tree sort: {step}")
+    return problems
+
+def check_query_plans(queries: Optional[Dict[str, Tuple[str, Tuple[Any, ...]]]] = None) -> List[Dict[str, Any]]:
+    """
+    EXPLAIN QUERY PLAN every hot query and flag full scans or temp B-tree sorts.
+    `python db.py explain` runs this and exits non-zero on any regression.
+    """
+    out = []
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = explain(sql, params)
+        problems = plan_problems(plan)
+        out.append({"query": name, "ok": not problems, "plan": plan, "problems": problems})
+    return out
+
+# ---------------------------
+# Shard maintenance
+# ---------------------------
+
+def list_shards() -> List[str]:
+    d = _shard_dir()
+    return sorted(str(p) for p in d.glob("mc_*.db")) if d.is_dir() else []
+
+def split_into_shards(path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Copy every brokerage's loads (both tiers) and their negotiations from the
+    global file into its shard before turning DB_SHARD_BY_MC on. Rows keep their rowid, so shard id
+    allocation carries on past them. INSERT OR IGNORE makes it safe to re-run;
+    the global rows are left in place (sharded reads never look at them).
+    Returns {broker_mc: rows copied}.
+    """
+    src = _open_connection(path or DB_PATH)
+    copied: Dict[str, int] = {}
+    try:
+        mcs = [
+            r[0]
+            for r in src.execute(
+                "SELECT broker_mc FROM loads WHERE broker_mc <> '' "
+                "UNION SELECT broker_mc FROM loads_archive WHERE broker_mc <> ''"
+            )
+        ]
+        cols = LOAD_COLUMNS.split(",")
+        for mc in mcs:
+            target = shard_path(mc)
+            migrate(target)
+            dst = _open_connection(target)
+            try:
+                with dst:
+                    before = dst.total_changes
+                    for table, extra in (("loads", ""), ("loads_archive", ", archived_at")):
+                        rows = src.execute(
+                            f"SELECT rowid, {LOAD_COLUMNS}{extra} FROM {table} WHERE broker_mc=?", (mc,)
+                        ).fetchall()
+                        n = len(cols) + 1 + (1 if extra else 0)
+                        dst.executemany(
+                            f"INSERT OR IGNORE INTO {table} (rowid, {LOAD_COLUMNS}{extra}) VALUES ({','.join(['?'] * n)})",
+                            [tuple(r) for r in rows],
+                        )
+                    neg_cols = NEGOTIATION_COLUMNS + ",payload"
+                    rows = src.execute(
+                        f"SELECT {neg_cols} FROM load_negotiations WHERE load_id IN "
+                        "(SELECT rowid FROM loads WHERE broker_mc=?1 UNION SELECT rowid FROM loads_archive WHERE broker_mc=?1)",
+                        (mc,),
+                    ).fetchall()
+                    dst.executemany(
+                        f"INSERT OR IGNORE INTO load_negotiations ({neg_cols}) VALUES ({','.join(['?'] * 11)})",
+                        [tuple(r) for r in rows],
+                    )
+                    copied[mc] = dst.total_changes - before
+            finally:
+                dst.close()
+    finally:
+        src.close()
+    return copied
+
+# ---------------------------
+# Online backups
+# ---------------------------
+#
+# Snapshots go through sqlite3's backup API BACKUP_PAGES_PER_STEP pages at a
+# time instead of copying the file. In WAL mode the source connection holds
+# one read transaction for the whole copy: the snapshot is consistent, it
+# never restarts because of concurrent commits, and writers carry on (WAL
+# readers don't block them). Without WAL each step takes a short shared lock
+# and BACKUP_STEP_SLEEP_MS between steps lets writers commit.
+#
+# While a backup runs a probe thread times BEGIN IMMEDIATE every 50ms, so the
+# result reports the worst write-lock wait anything saw during the copy.
+
+BACKUP_DIR = get_env("BACKUP_DIR", "").strip()
+BACKUP_PAGES_PER_STEP = max(1, _env_int("BACKUP_PAGES_PER_STEP", 256))
+BACKUP_STEP_SLEEP_MS = max(0.0, _env_float("BACKUP_STEP_SLEEP_MS", 2.0))
+# Snapshots kept per database file; older ones are deleted after each backup.
+BACKUP_KEEP = max(1, _env_int("BACKUP_KEEP", 7))
+# 0 = only on demand (python db.py backup, POST /admin/backup).
+BACKUP_INTERVAL_HOURS = max(0.0, _env_float("BACKUP_INTERVAL_HOURS", 0.0))
+
+_BACKUP_LOCK = threading.Lock()
+_BACKUP_LAST: Dict[str, Dict[str, Any]] = {}
+
+def backup_dir() -> Path:
+    if BACKUP_DIR:
+        return Path(BACKUP_DIR)
+    p = Path(DB_PATH)
+    return p.parent / f"{p.stem}_backups"
+
+def list_backups(path: Optional[str] = None) -> List[str]:
+    """Snapshots of the database at path, newest first."""
+    d = backup_dir()
+    stem = Path(path or DB_PATH).stem
+    return sorted((str(f) for f in d.glob(f"{stem}-*.db")), reverse=True) if d.is_dir() else []
+
+def _probe_writer_stall(path: str, stop: threading.Event, out: Dict[str, float]) -> None:
+    con = _open_connection(path)
+    try:
+        while not stop.wait(0.05):
+            t0 = time.perf_counter()
+            try:
+                con.execute("BEGIN IMMEDIATE")
+                con.rollback()
+            except sqlite3.OperationalError:
+                pass  # busy past DB_BUSY_TIMEOUT still counts as a stall below
+            ms = (time.perf_counter() - t0) * 1000.0
+            out["probes"] += 1
+            out["max_ms"] = max(out["max_ms"], ms)
+    finally:
+        con.close()
+
+def backup_database(path: Optional[str] = None, pages: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Snapshot the database at path (default DB_PATH) into backup_dir() as
+    <stem>-<UTC timestamp>.db, then rotate down to BACKUP_KEEP snapshots.
+    """
+    source = path or DB_PATH
+    step_pages = int(pages or BACKUP_PAGES_PER_STEP)
+    d = backup_dir()
+    d.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    final = d / f"{Path(source).stem}-{stamp}.db"
+    partial = final.with_name(final.name + ".partial")
+
+    steps = 0
+    total_pages = 0
+
+    def _progress(status: int, remaining: int, total: int) -> None:
+        nonlocal steps, total_pages
+        steps += 1
+        total_pages = total
+        if not wal and BACKUP_STEP_SLEEP_MS:
+            time.sleep(BACKUP_STEP_SLEEP_MS / 1000.0)
+
+    stall = {"probes": 0, "max_ms": 0.0}
+    stop = threading.Event()
+    probe = threading.Thread(target=_probe_writer_stall, args=(source, stop, stall), name="backup-probe", daemon=True)
+    src = _open_connection(source, readonly=True)
+    dst = sqlite3.connect(str(partial))
+    t0 = time.perf_counter()
+    try:
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        if wal:
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        probe.start()
+        src.backup(dst, pages=step_pages, progress=_progress)
+        seconds = time.perf_counter() - t0
+        check = dst.execute("PRAGMA quick_check").fetchone()[0]
+    except Exception:
+        dst.close()
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        stop.set()
+        if probe.is_alive():
+            probe.join()
+        if src.in_transaction:
+            src.rollback()
+        src.close()
+    dst.close()
+    os.replace(partial, final)
+
+    removed = []
+    for old in list_backups(source)[BACKUP_KEEP:]:
+        os.remove(old)
+        removed.append(old)
+
+    result = {
+        "db_path": source,
+        "file": str(final),
+        "bytes": final.stat().st_size,
+        "pages": total_pages,
+        "steps": steps,
+        "pages_per_step": step_pages,
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(total_pages / seconds, 1) if seconds > 0 else None,
+        "snapshot": "wal_read_txn" if wal else "stepped",
+        "writer_stall_max_ms": round(stall["max_ms"], 3),
+        "writer_probes": int(stall["probes"]),
+        "quick_check": check,
+        "rotated_out": removed,
+        "finished_at": now_iso(),
+    }
+    _BACKUP_LAST[source] = result
+    return result
+
+def backup_all() -> List[Dict[str, Any]]:
+    """backup_database() for the global file and every tenant shard; one run at a time."""
+    if not _BACKUP_LOCK.acquire(blocking=False):
+        raise RuntimeError("a backup is already running")
+    try:
+        return [backup_database(p) for p in [DB_PATH] + list_shards()]
+    finally:
+        _BACKUP_LOCK.release()
+
+def backup_stats() -> Dict[str, Any]:
+    return {
+        "dir": str(backup_dir()),
+        "running": _BACKUP_LOCK.locked(),
+        "interval_hours": BACKUP_INTERVAL_HOURS,
+        "keep": BACKUP_KEEP,
+        "pages_per_step": BACKUP_PAGES_PER_STEP,
+        "last": dict(_BACKUP_LAST),
+        "snapshots": list_backups(),
+    }
+
+def _backup_job() -> None:
+    for r in backup_all():
+        print(
+            f"[backup] {r['file']}: {r['pages']} pages in {r['seconds']}s "
+            f"({r['pages_per_sec']} pages/s, writer stall max {r['writer_stall_max_ms']}ms)"
+        )
+
+def start_backups(interval_hours: Optional[float] = None) -> None:
+    """Back up every interval_hours (default BACKUP_INTERVAL_HOURS), first run one interval after start."""
+    hours = BACKUP_INTERVAL_HOURS if interval_hours is None else interval_hours
+    start_periodic("backup", _backup_job, hours, run_now=False)
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python db.py", description="Chequmate database maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("migrate", help="apply pending schema migrations")
+    sub.add_parser("status", help="show current and pending schema versions")
+    sub.add_parser("explain", help="check hot queries use an index and avoid temp sorts")
+    sub.add_parser("profile", help="show the DB_PROFILE pragmas and their effective values")
+    sub.add_parser("shards", help="list per-broker_mc shard files (DB_SHARD_BY_MC)")
+    sub.add_parser("shard-split", help="copy loads from the global file into per-broker_mc shards")
+    sub.add_parser("audit-rollover", help="move old audit rows into monthly archives and prune past retention")
+    sub.add_parser("backup", help="online snapshot of the database (and shards) into BACKUP_DIR, with rotation")
+    sub.add_parser("archive-loads", help="move loads paid more than LOAD_ARCHIVE_DAYS ago into loads_archive")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "migrate":
+        print(json.dumps(migrate(), indent=2))
+    elif args.cmd == "status":
+        print(json.dumps(schema_status(), indent=2))
+    elif args.cmd == "explain":
+        results = check_query_plans()
+        for r in results:
+            print(f"[{'ok' if r['ok'] else 'FAIL'}] {r['query']}")
+            for step in r["plan"]:
+                print(f"    {step}")
+            for p in r["problems"]:
+                print(f"    !! {p}")
+        return 0 if all(r["ok"] for r in results) else 1
+    elif args.cmd == "profile":
+        print(json.dumps(profile_status(), indent=2))
+    elif args.cmd == "shards":
+        print(json.dumps({"enabled": DB_SHARD_BY_MC, "dir": str(_shard_dir()), "shards": list_shards()}, indent=2))
+    elif args.cmd == "shard-split":
+        print(json.dumps(split_into_shards(), indent=2))
+    elif args.cmd == "audit-rollover":
+        print(json.dumps(rollover_audit_all(), indent=2))
+    elif args.cmd == "backup":
+        print(json.dumps(backup_all(), indent=2))
+    elif args.cmd == "archive-loads":
+        print(json.dumps(archive_paid_loads_all(), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+import db
+
+# ---------------------------
+# Awaitable facade over db.py
+# ---------------------------
+#
+# async endpoints must not call db.* directly: a busy SQLite lock (up to
+# DB_BUSY_TIMEOUT seconds) would block the event loop and every other request
+# with it. These wrappers run the same helpers on a dedicated, bounded thread
+# pool instead. The caller's contextvars are carried over, so a request's unit
+# of work (db._UOW) is still picked up inside the worker thread.
+
+T = TypeVar("T")
+
+DB_ASYNC_WORKERS = max(1, db._env_int("DB_ASYNC_WORKERS", max(db.DB_POOL_SIZE, 4)))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=DB_ASYNC_WORKERS, thread_name_prefix="db-async")
+
+
+async def run(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_EXECUTOR, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+def _awaitable(name: str) -> Callable[..., Any]:
+    async def _call(*args: Any, **kwargs: Any) -> Any:
+        # Resolve at call time so db.<name> can still be swapped (scripts, benchmarks).
+        return await run(getattr(db, name), *args, **kwargs)
+
+    _call.__name__ = name
+    _call.__qualname__ = name
+    _call.__doc__ = f"Awaitable db.{name}."
+    return _call
+
+
+get_user = _awaitable("get_user")
+get_load = _awaitable("get_load")
+audit = _awaitable("audit")
+create_load = _awaitable("create_load")
+transition_load = _awaitable("transition_load")
+create_load_negotiation = _awaitable("create_load_negotiation")
+
+
+# ---------------------------
+# Request unit of work
+# ---------------------------
+_GATE: asyncio.Semaphore | None = None
+_GATE_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def _gate() -> asyncio.Semaphore:
+    # At most one request per pooled connection holds a unit of work. Without
+    # this, executor threads could all block in pool checkout while the
+    # requests that would release a connection wait for a free thread.
+    global _GATE, _GATE_LOOP
+    loop = asyncio.get_running_loop()
+    if _GATE is None or _GATE_LOOP is not loop:
+        _GATE = asyncio.Semaphore(db.DB_POOL_SIZE if db.DB_POOL_SIZE > 0 else DB_ASYNC_WORKERS)
+        _GATE_LOOP = loop
+    return _GATE
+
+
+@contextlib.asynccontextmanager
+async def unit_of_work():
+    """
+    Async form of db.unit_of_work: helpers awaited inside the block share one
+    connection per database file and commit once at the end. For endpoints
+    that also do slow non-db work (external HTTP), so that work runs before
+    or after the block instead of holding a slot and a connection.
+
+    Waiting for a slot happens on an asyncio semaphore, and connections are
+    checked out lazily by the first helper that needs one (on the db executor
+    or the threadpool), so neither blocks the event loop. The unit of work is
+    published through db._UOW in the caller's own context, which makes it
+    visible to the wrappers above (and to sync endpoints, which run in the
+    threadpool with a copy of that context).
+    """
+    if not db.REQUEST_UNIT_OF_WORK or db.DB_SINGLE_WRITER or db._UOW.get() is not None:
+        yield db._UOW.get()
+        return
+    async with _gate():
+        uow = db._begin_unit_of_work()
+        ok = False
+        try:
+            yield uow
+            ok = True
+        finally:
+            db._UOW.set(None)
+            await run(db._end_unit_of_work, uow, ok)
+
+
+async def request_unit_of_work():
+    """
+    FastAPI dependency: one connection per database file and one commit per request.
+    Use as APIRouter(dependencies=[Depends(db_async.request_unit_of_work)]).
+    """
+    async with unit_of_work() as uow:
+        yield uow
@@ -104,20 +104,58 @@ COMMON_JS = r"""
   }
   function token(){ return localStorage.getItem("token") || ""; }
   function username(){ return localStorage.getItem("username") || ""; }
-  function setAuth(t,u){ if(t) localStorage.setItem("token", t); if(u) localStorage.setItem("username", u); }
-  function clearAuth(){ localStorage.removeItem("token"); localStorage.removeItem("username"); }
-  function authHeaders(){ const t=token(); return t ? {"Authorization":"Bearer "+t} : {}; }
-
+  function setAuth(t,u,r){
+    if(t) localStorage.setItem("token", t);
+    if(u) localStorage.setItem("username", u);
+    if(r) localStorage.setItem("refresh_token", r);
+  }
+  function clearAuth(){
+    localStorage.removeItem("token");
+    localStorage.removeItem("username");
+    localStorage.removeItem("refresh_token");
+  }
+  function authHeaders(){
+    const t=token();
+    return t ? {"Authorization":"Bearer "+t} : {};
+  }
+  let REFRESHING = null;
+  function refreshAuth(){
+    // Access tokens are short-lived: trade the refresh token for a new pair.
+    // Concurrent 401s share one /refresh call.
+    if(!REFRESHING){
+      REFRESHING = (async ()=>{
+        const rt = localStorage.getItem("refresh_token") || "";
+        if(!rt) return false;
+        const res = await fetch("/refresh", {
+          method:"POST",
+          headers:{ "Content-Type":"application/json" },
+          body: JSON.stringify({ refresh_token: rt })
+        });
+        const j = await res.json().catch(()=>null);
+        if(!res.ok || !j?.token){ clearAuth(); return false; }
+        setAuth(j.token, null, j.refresh_token);
+        return true;
+      })().finally(()=>{ REFRESHING = null; });
+    }
+    return REFRESHING;
+  }
+  async function authedFetch(path, opts){
+    const o = opts || {};
+    const send = () => fetch(path, { ...o, headers: { ...(o.headers || {}), ...authHeaders() } });
+    let res = await send();
+    if(res.status === 401 && await refreshAuth()) res = await send();
+    return res;
+  }
   async function apiGET(path){
-    const res = await fetch(path, { headers: { ...authHeaders() }});
+    const res = await authedFetch(path);
     const j = await res.json().catch(()=>null);
     if(!res.ok) throw new Error(j?.detail || ("HTTP "+res.status));
     return j;
   }
   async function apiPOST(path, body){
-    const res = await fetch(path, {
+    const res = await authedFetch(path, {
       method:"POST",
-      headers:{ "Content-Type":"application/json", ...authHeaders() },
+      headers:{ "Content-Type":"application/json" },
       body: JSON.stringify(body || {})
     });
     const j = await res.json().catch(()=>null);
@@ -139,7 +177,7 @@ COMMON_JS = r"""
       const j = await res.json().catch(()=>null);
       if(!res.ok) throw new Error(j?.detail || "Login failed");
       if(!j || !j.token) throw new Error("Login did not return token");
-      setAuth(j.token, u);
+      setAuth(j.token, u, j.refresh_token);
 
       document.getElementById("authChip").innerHTML =
         `Logged in as <b>${esc(u)}</b>`;
@@ -187,7 +225,7 @@ DISPATCHER_HTML = r"""
       <div class="subtitle">Published loads only · first dispatcher to assign “claims” the load</div>
     </div>
     <div class="controls">
-      <input id="q" placeholder="Search: ref, pickup, delivery, shipper, driver..." />
+      <input id="q" placeholder="Search: ref, pickup, delivery, shipper, notes, terms, driver..." />
       <button id="refreshBtn" class="btn-ghost">Refresh</button>
     </div>
   </div>
@@ -212,6 +250,9 @@ DISPATCHER_HTML = r"""
   </div>
 
   <div class="grid" id="grid"></div>
+  <div style="display:flex;justify-content:center;margin-top:14px;">
+    <button class="btn-ghost" id="moreBtn" style="display:none">Load more</button>
+  </div>
 </div>
 
 <div class="modal-backdrop" id="backdropAssign">
@@ -245,10 +286,15 @@ DISPATCHER_HTML = r"""
 """ + COMMON_JS + r"""
 <script>
   let ALL = [];
+  let NEXT_CURSOR = null;
+  const PAGE_SIZE = 100;
+  let SEARCH = null;   // {q, rows, next_cursor} while the search box has text
+  let SEARCH_TIMER = null;
+  let SEARCH_SEQ = 0;
   let ASSIGN_LOAD_ID = null;
 
   function countsChip(){
-    document.getElementById("counts").innerHTML = `Published loads: <b>${ALL.length}</b>`;
+    document.getElementById("counts").innerHTML = `Published loads: <b>${ALL.length}${NEXT_CURSOR ? "+" : ""}</b>`;
   }
 
   function render(rows){
@@ -315,32 +361,97 @@ DISPATCHER_HTML = r"""
   }
 
   function applyFilters(){
-    const q=normalize((document.getElementById("q").value||"").trim());
-    let rows=ALL.slice();
-    if(q){
-      rows=rows.filter(l=>{
-        const hay=[l.shipper_name,l.customer_ref,l.pickup_address,l.delivery_address,l.driver_username,l.status,l.dispatcher_username]
-          .map(x=>normalize(esc(x))).join(" | ");
-        return hay.includes(q);
-      });
+    // Text search runs server-side (runSearch).
+    render(SEARCH ? SEARCH.rows : ALL);
+  }
+
+  function pagePath(base, cursor){
+    return base + "?limit=" + PAGE_SIZE + (cursor ? "&cursor=" + encodeURIComponent(cursor) : "");
+  }
+
+  function searchPath(q, cursor){
+    return pagePath("/dispatcher/loads/search", cursor) + "&q=" + encodeURIComponent(q);
+  }
+
+  async function runSearch(){
+    const q=(document.getElementById("q").value||"").trim();
+    const seq=++SEARCH_SEQ;
+    if(!q || !token()){
+      SEARCH=null;
+      syncMoreBtn();
+      applyFilters();
+      return;
+    }
+    try{
+      const j = await apiGET(searchPath(q, null));
+      if(seq!==SEARCH_SEQ) return;  // a newer keystroke already went out
+      SEARCH = {q, rows: j.loads || [], next_cursor: j.next_cursor || null};
+      syncMoreBtn();
+      applyFilters();
+    }catch(e){
+      if(seq===SEARCH_SEQ) toast("Search failed: "+e.message);
+    }
+  }
+
+  function onSearchInput(){
+    clearTimeout(SEARCH_TIMER);
+    SEARCH_TIMER=setTimeout(runSearch, 250);
+  }
+
+  function syncMoreBtn(){
+    const next = SEARCH ? SEARCH.next_cursor : NEXT_CURSOR;
+    document.getElementById("moreBtn").style.display = next ? "" : "none";
+  }
+
+  async function loadMore(){
+    if(SEARCH){
+      const s=SEARCH;
+      if(!s.next_cursor) return;
+      try{
+        const j = await apiGET(searchPath(s.q, s.next_cursor));
+        if(s!==SEARCH) return;
+        s.rows = s.rows.concat(j.loads || []);
+        s.next_cursor = j.next_cursor || null;
+        syncMoreBtn();
+        applyFilters();
+      }catch(e){
+        toast("Failed to load more search results: "+e.message);
+      }
+      return;
+    }
+    if(!NEXT_CURSOR) return;
+    try{
+      const j = await apiGET(pagePath("/dispatcher/loads", NEXT_CURSOR));
+      ALL = ALL.concat(j.loads || []);
+      NEXT_CURSOR = j.next_cursor || null;
+      syncMoreBtn();
+      countsChip();
+      applyFilters();
+    }catch(e){
+      toast("Failed to load more dispatcher loads: "+e.message);
     }
-    render(rows);
   }
 
   async function refreshLoads(){
     showLoginIfNeeded();
     if(!token()){
       ALL=[];
+      NEXT_CURSOR=null;
+      SEARCH=null;
+      syncMoreBtn();
       countsChip();
       render([]);
       return;
     }
 
     try{
-      const j = await apiGET("/dispatcher/loads");
+      const j = await apiGET(pagePath("/dispatcher/loads", null));
       ALL = j.loads || [];
+      NEXT_CURSOR = j.next_cursor || null;
+      syncMoreBtn();
       countsChip();
-      applyFilters();
+      if(SEARCH) await runSearch();
+      else applyFilters();
     }catch(e){
       toast("Failed to load dispatcher loads: "+e.message);
     }
@@ -399,7 +510,8 @@ DISPATCHER_HTML = r"""
   window.__BOOT = function(){ refreshLoads(); };
 
   document.getElementById("refreshBtn").addEventListener("click", refreshLoads);
-  document.getElementById("q").addEventListener("input", applyFilters);
+  document.getElementById("moreBtn").addEventListener("click", loadMore);
+  document.getElementById("q").addEventListener("input", onSearchInput);
 
   showLoginIfNeeded();
   refreshLoads();
@@ -120,35 +120,65 @@ COMMON_JS = r"""
   }
   function token(){ return localStorage.getItem("token") || ""; }
   function username(){ return localStorage.getItem("username") || ""; }
-  function setAuth(t,u){
+  function setAuth(t,u,r){
     if(t) localStorage.setItem("token", t);
     if(u) localStorage.setItem("username", u);
+    if(r) localStorage.setItem("refresh_token", r);
   }
   function clearAuth(){
     localStorage.removeItem("token");
     localStorage.removeItem("username");
+    localStorage.removeItem("refresh_token");
   }
   function authHeaders(){
     const t=token();
     return t ? {"Authorization":"Bearer "+t} : {};
   }
+  let REFRESHING = null;
+  function refreshAuth(){
+    // Access tokens are short-lived: trade the refresh token for a new pair.
+    // Concurrent 401s share one /refresh call.
+    if(!REFRESHING){
+      REFRESHING = (async ()=>{
+        const rt = localStorage.getItem("refresh_token") || "";
+        if(!rt) return false;
+        const res = await fetch("/refresh", {
+          method:"POST",
+          headers:{ "Content-Type":"application/json" },
+          body: JSON.stringify({ refresh_token: rt })
+        });
+        const j = await res.json().catch(()=>null);
+        if(!res.ok || !j?.token){ clearAuth(); return false; }
+        setAuth(j.token, null, j.refresh_token);
+        return true;
+      })().finally(()=>{ REFRESHING = null; });
+    }
+    return REFRESHING;
+  }
+  async function authedFetch(path, opts){
+    const o = opts || {};
+    const send = () => fetch(path, { ...o, headers: { ...(o.headers || {}), ...authHeaders() } });
+    let res = await send();
+    if(res.status === 401 && await refreshAuth()) res = await send();
+    return res;
+  }
   async function apiGET(path){
-    const res = await fetch(path, { headers: { ...authHeaders() }});
+    const res = await authedFetch(path);
     const j = await res.json().catch(()=>null);
-    if(!res.ok) throw new Error
-    throw new Error(j?.detail || ("HTTP "+res.status));
+    if(!res.ok) throw new Error(j?.detail || ("HTTP "+res.status));
     return j;
   }
   async function apiPOST(path, body){
-    const res = await fetch(path, {
+    const res = await authedFetch(path, {
       method:"POST",
-      headers:{ "Content-Type":"application/json", ...authHeaders() },
+      headers:{ "Content-Type":"application/json" },
       body: JSON.stringify(body || {})
     });
     const j = await res.json().catch(()=>null);
     if(!res.ok) throw new Error(j?.detail || ("HTTP "+res.status));
     return j;
   }
+
   async function doLogin(){
     const u = (document.getElementById("login_user").value || "").trim();
     const p = (document.getElementById("login_pass").value || "").trim();
@@ -163,7 +193,7 @@ COMMON_JS = r"""
       const j = await res.json().catch(()=>null);
       if(!res.ok) throw new Error(j?.detail || "Login failed");
       if(!j || !j.token) throw new Error("Login did not return token");
-      setAuth(j.token, u);
+      setAuth(j.token, u, j.refresh_token);
 
       document.getElementById("authChip").innerHTML =
         `Logged in as <b>${esc(u)}</b>`;
@@ -273,6 +303,9 @@ HTML = r"""
   </div>
 
   <div class="grid" id="grid"></div>
+  <div style="display:flex;justify-content:center;margin-top:14px;">
+    <button class="btn-ghost" id="moreBtn" style="display:none">Load more</button>
+  </div>
 </div>
 
 <div class="toast" id="toast"></div>
@@ -280,6 +313,8 @@ HTML = r"""
 """ + COMMON_JS + r"""
 <script>
   let ALL = [];
+  let NEXT_CURSOR = null;
+  const PAGE_SIZE = 100;
 
   const STATUS_OPTIONS = [
     { value:"accepted", label:"Accepted" },
@@ -291,7 +326,7 @@ HTML = r"""
   ];
 
   function countsChip(){
-    document.getElementById("counts").innerHTML = `Assigned loads: <b>${ALL.length}</b>`;
+    document.getElementById("counts").innerHTML = `Assigned loads: <b>${ALL.length}${NEXT_CURSOR ? "+" : ""}</b>`;
   }
 
   function statusSelectHTML(load){
@@ -374,17 +409,43 @@ HTML = r"""
     render(rows);
   }
 
+  function pagePath(base, cursor){
+    return base + "?limit=" + PAGE_SIZE + (cursor ? "&cursor=" + encodeURIComponent(cursor) : "");
+  }
+
+  function syncMoreBtn(){
+    document.getElementById("moreBtn").style.display = NEXT_CURSOR ? "" : "none";
+  }
+
+  async function loadMore(){
+    if(!NEXT_CURSOR) return;
+    try{
+      const j = await apiGET(pagePath("/driver/loads", NEXT_CURSOR));
+      ALL = ALL.concat(j.loads || []);
+      NEXT_CURSOR = j.next_cursor || null;
+      syncMoreBtn();
+      countsChip();
+      applyFilters();
+    }catch(e){
+      toast("Failed to load more driver loads: "+e.message);
+    }
+  }
+
   async function refreshLoads(){
     showLoginIfNeeded();
     if(!token()){
       ALL=[];
+      NEXT_CURSOR=null;
+      syncMoreBtn();
       countsChip();
       render([]);
       return;
     }
     try{
-      const j = await apiGET("/driver/loads");
+      const j = await apiGET(pagePath("/driver/loads", null));
       ALL = j.loads || [];
+      NEXT_CURSOR = j.next_cursor || null;
+      syncMoreBtn();
       countsChip();
       applyFilters();
     }catch(e){
@@ -476,6 +537,7 @@ HTML = r"""
   window.__DRIVER_BOOT = function(){ refreshLoads(); };
 
   document.getElementById("refreshBtn").addEventListener("click", refreshLoads);
+  document.getElementById("moreBtn").addEventListener("click", loadMore);
   document.getElementById("q").addEventListener("input", applyFilters);
   document.getElementById("runCalcBtn").addEventListener("click", runCalc);
   document.getElementById("clearCalcBtn").addEventListener("click", ()=>{ document.getElementById("calcOut").innerHTML=""; });
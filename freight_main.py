@@ -9,6 +9,8 @@ from fastapi import FastAPI
 from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
+import db
+
 app = FastAPI(title="Chequmate Freight System", version="0.1.0")
 
 
@@ -26,6 +28,16 @@ def _try_include(module_name: str, router_attr: str = "router") -> None:
         print(f"[boot] ERROR including {module_name}.{router_attr}: {e!r}")
 
 
+@app.on_event("startup")
+def _start_background() -> None:
+    db.start_background()
+
+
+@app.on_event("shutdown")
+def _stop_background() -> None:
+    db.stop_background()
+
+
 # --- Static files (Render needs this, since it runs freight_main:app) ---
 STATIC_DIR = Path(__file__).resolve().parent / "static"
 if STATIC_DIR.exists() and STATIC_DIR.is_dir():
@@ -77,6 +89,7 @@ def importcheck():
     """
     modules = [
         "auth",
+        "load_io",
         "loads",
         "negotiate",
         "fuel",
@@ -106,6 +119,7 @@ def importcheck():
 
 # Core API routers
 _try_include("auth")
+_try_include("load_io")
 _try_include("loads")
 _try_include("negotiate")
 _try_include("fuel")
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+import db
+import db_async
+from auth import bind_tenant, require_broker_approved
+
+# Streaming load import/export. These routes deliberately skip the request
+# unit of work used by loads.py: a 50k-row import commits chunk by chunk
+# instead of holding one write transaction open for the whole upload, and an
+# export outlives the request scope while its response streams.
+# Mounted before loads.router so /broker/loads/<name> paths resolve here first.
+router = APIRouter(dependencies=[Depends(bind_tenant)])
+
+BULK_CHUNK_ROWS = max(1, db._env_int("BULK_CHUNK_ROWS", 1000))
+# Per-row errors listed in the response; the count is always exact.
+BULK_MAX_ERRORS = max(0, db._env_int("BULK_MAX_ERRORS", 500))
+# Longest accepted line of an upload; longer ones are rejected as a row error.
+BULK_MAX_LINE_BYTES = max(1024, db._env_int("BULK_MAX_LINE_BYTES", 64 * 1024))
+# Rows serialized per chunk written to the socket.
+EXPORT_CHUNK_ROWS = max(1, db._env_int("EXPORT_CHUNK_ROWS", 200))
+
+_FLOAT_COLS = ("weight_lbs", "miles", "rate_total", "driver_pay", "fuel_surcharge")
+
+# -----------------------------
+# Incremental body parsing
+# -----------------------------
+def _line_too_long() -> ValueError:
+    return ValueError(f"line longer than {BULK_MAX_LINE_BYTES} bytes")
+
+async def _lines(request: Request) -> AsyncIterator[str | ValueError]:
+    # An over-long line is yielded as a ValueError (a rejected row) and its
+    # bytes are dropped up to the next newline, so one huge line can't make
+    # the buffer grow with the upload.
+    buf = b""
+    first = True
+    skipping = False
+    async for chunk in request.stream():
+        if skipping:
+            nl = chunk.find(b"\n")
+            if nl < 0:
+                continue
+            chunk, skipping = chunk[nl + 1:], False
+        buf += chunk
+        if b"\n" in chunk:
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if len(line) > BULK_MAX_LINE_BYTES:
+                    first = False
+                    yield _line_too_long()
+                    continue
+                text = line.decode("utf-8", errors="replace").rstrip("\r")
+                if first:
+                    text, first = text.lstrip("\ufeff"), False
+                yield text
+        if len(buf) > BULK_MAX_LINE_BYTES:
+            buf, skipping, first = b"", True, False
+            yield _line_too_long()
+    if buf:
+        text = buf.decode("utf-8", errors="replace").rstrip("\r")
+        yield text.lstrip("\ufeff") if first else text
+
+async def _ndjson_rows(request: Request) -> AsyncIterator[Any]:
+    async for line in _lines(request):
+        if isinstance(line, ValueError):
+            yield line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"invalid JSON: {e.msg}")
+
+async def _csv_rows(request: Request) -> AsyncIterator[Any]:
+    header: List[str] | None = None
+    pending: List[str] = []
+    quotes = 0
+    async for line in _lines(request):
+        if isinstance(line, ValueError):
+            pending, quotes = [], 0
+            yield line
+            continue
+        # A record is complete once its quotes balance (RFC 4180 escapes
+        # quotes by doubling them, so the parity still works).
+        pending.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        record, pending, quotes = "\n".join(pending), [], 0
+        if not record.strip():
+            continue
+        try:
+            fields = next(csv.reader([record]))
+        except csv.Error as e:
+            yield ValueError(f"invalid CSV: {e}")
+            continue
+        if header is None:
+            header = [h.strip().lower() for h in fields]
+            continue
+        if len(fields) != len(header):
+            yield ValueError(f"expected {len(header)} columns, got {len(fields)}")
+            continue
+        yield dict(zip(header, fields))
+    if pending:
+        yield ValueError("unterminated quoted field")
+
+# -----------------------------
+# Validation
+# -----------------------------
+def _clean_row(raw: Any) -> Dict[str, Any]:
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ValueError("row must be an object")
+    row: Dict[str, Any] = {}
+    for col in db.BULK_LOAD_COLUMNS:
+        v = raw.get(col)
+        if isinstance(v, str):
+            v = v.strip() or None
+        row[col] = v
+    for col in _FLOAT_COLS:
+        v = row.get(col)
+        if v is None:
+            continue
+        try:
+            row[col] = float(v)
+        except (TypeError, ValueError):
+            raise ValueError(f"{col} must be a number")
+    if row["external_ref"] is not None:
+        row["external_ref"] = str(row["external_ref"])
+    if not row.get("pickup_address") or not row.get("delivery_address"):
+        raise ValueError("pickup_address and delivery_address required")
+    return row
+
+def _dispatcher_ok(username: str, broker_mc: str) -> str | None:
+    """None if username is a dispatcher linked to broker_mc, else the error. A roster lookup, no query."""
+    member = db.roster_member(username)
+    if not member or member[0] != "dispatcher":
+        return "dispatcher_username must be a dispatcher"
+    if member[1] != broker_mc:
+        return "Dispatcher not linked to your broker_mc"
+    return None
+
+# -----------------------------
+# BROKER bulk import
+# -----------------------------
+@router.post("/broker/loads/bulk")
+async def broker_bulk_import(request: Request, format: str | None = None, u=Depends(require_broker_approved)):
+    """
+    Stream CSV (header row first) or NDJSON loads; each row is validated as it
+    arrives and valid rows are upserted BULK_CHUNK_ROWS at a time. Rows with an
+    external_ref update that load if it is still pending; otherwise rows become
+    new pending loads. Pick the format with ?format=csv|ndjson or Content-Type.
+    """
+    fmt = (format or "").strip().lower()
+    if not fmt:
+        ctype = (request.headers.get("content-type") or "").lower()
+        fmt = "csv" if "csv" in ctype else "ndjson" if ("ndjson" in ctype or "jsonl" in ctype) else ""
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson (query param or Content-Type)")
+
+    mc = u["broker_mc"]
+    t0 = time.perf_counter()
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "rejected": 0, "chunks": 0}
+    errors: List[Dict[str, Any]] = []
+    chunk: List[Dict[str, Any]] = []
+    chunk_rows: List[int] = []
+
+    def _reject(n: int, message: str) -> None:
+        stats["rejected"] += 1
+        if len(errors) < BULK_MAX_ERRORS:
+            errors.append({"row": n, "error": message})
+
+    async def _flush() -> None:
+        result = await db_async.run(db.bulk_upsert_loads, mc, chunk, u["username"])
+        stats["inserted"] += result["inserted"]
+        stats["updated"] += result["updated"]
+        stats["chunks"] += 1
+        for i in result["locked"]:
+            _reject(chunk_rows[i], "existing load with this external_ref is no longer pending (published, invoiced or paid)")
+        chunk.clear()
+        chunk_rows.clear()
+
+    rows = _csv_rows(request) if fmt == "csv" else _ndjson_rows(request)
+    async for raw in rows:
+        stats["rows"] += 1
+        n = stats["rows"]
+        try:
+            row = _clean_row(raw)
+        except ValueError as e:
+            _reject(n, str(e))
+            continue
+        if row.get("dispatcher_username"):
+            problem = _dispatcher_ok(row["dispatcher_username"], mc)
+            if problem:
+                _reject(n, problem)
+                continue
+        chunk.append(row)
+        chunk_rows.append(n)
+        if len(chunk) >= BULK_CHUNK_ROWS:
+            await _flush()
+    if chunk:
+        await _flush()
+
+    seconds = time.perf_counter() - t0
+    errors.sort(key=lambda e: e["row"])
+    try:
+        await db_async.audit(u["username"], "bulk_import_loads", f"broker:{mc}", db.json_dumps_safe(stats))
+    except Exception:
+        pass
+    return {
+        "ok": True,
+        **stats,
+        "errors": errors,
+        "errors_truncated": stats["rejected"] > len(errors),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(stats["rows"] / seconds, 1) if seconds > 0 else None,
+    }
+
+# -----------------------------
+# BROKER export
+# -----------------------------
+# Every exported row carries the keyset cursor to resume after it
+# (?cursor=...), so a pull cut off anywhere restarts without repeats or gaps.
+_EXPORT_COLUMNS = db.LOAD_COLUMNS.split(",")
+_CREATED_AT = _EXPORT_COLUMNS.index("created_at")
+_ID = _EXPORT_COLUMNS.index("id")
+
+def _export_ndjson(rows: Iterator[Any]) -> Iterator[bytes]:
+    # Docs arrive as JSON text from SQLite; the cursor is spliced in as the
+    # last key, no per-row dict or json.dumps.
+    out: List[str] = []
+    for doc, created_at, load_id in rows:
+        out.append(f'{doc[:-1]},"cursor":"{db.encode_cursor(created_at, load_id)}"}}')
+        if len(out) >= EXPORT_CHUNK_ROWS:
+            yield ("\n".join(out) + "\n").encode("utf-8")
+            out.clear()
+    if out:
+        yield ("\n".join(out) + "\n").encode("utf-8")
+
+def _export_csv(rows: Iterator[Any]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(_EXPORT_COLUMNS + ["cursor"])
+    # Header goes out before the query has produced anything.
+    yield buf.getvalue().encode("utf-8")
+    buf.seek(0)
+    buf.truncate()
+    n = 0
+    for row in rows:
+        writer.writerow((*row, db.encode_cursor(row[_CREATED_AT], row[_ID])))
+        n += 1
+        if n >= EXPORT_CHUNK_ROWS:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            n = 0
+    if n:
+        yield buf.getvalue().encode("utf-8")
+
+@router.get("/broker/loads/export")
+def broker_export_loads(
+    format: str = "ndjson", since: str | None = None, cursor: str | None = None, u=Depends(require_broker_approved)
+):
+    """
+    Stream every load of the caller's brokerage, oldest first, as NDJSON or CSV.
+    Each row ends with a "cursor"; pass the last one seen as cursor=... to
+    restart an interrupted pull right after it. since=<created_at> limits the
+    export to loads created at or after that time.
+    """
+    fmt = (format or "").strip().lower()
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    try:
+        db.decode_cursor(cursor)  # the stream starts after headers are sent; reject bad cursors now
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    mc = u["broker_mc"]
+    if fmt == "csv":
+        body, media = _export_csv(db.iter_loads_for_export(mc, since=since, cursor=cursor)), "text/csv; charset=utf-8"
+    else:
+        body, media = _export_ndjson(db.iter_loads_for_export(mc, since=since, cursor=cursor, as_json=True)), "application/x-ndjson"
+    try:
+        db.audit(u["username"], "export_loads", f"broker:{mc}", fmt)
+    except Exception:
+        pass
+    filename = f"loads-{mc}.{'csv' if fmt == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        body,
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
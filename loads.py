@@ -1,19 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
 from typing import Any
+import json
 import uuid
 import os
 import re
 
 import db
+import db_async
 import routing_ors
 from auth import (
+    bind_tenant,
     require_driver,
     require_dispatcher_linked,
     require_broker_approved,
     read_json,
 )
 
-router = APIRouter()
+# One connection + one commit per request; every db.* call below joins it.
+# bind_tenant points load/audit helpers at the caller's shard (DB_SHARD_BY_MC).
+router = APIRouter(dependencies=[Depends(db_async.request_unit_of_work), Depends(bind_tenant)])
+# Routes that wait on the routing API (routing_ors) stay out of the unit of
+# work: holding a request slot across an external HTTP call would let a few
+# slow lookups stall every load route. Merged into `router` at the bottom.
+routing_router = APIRouter(dependencies=[Depends(bind_tenant)])
 
 # -----------------------------
 # Helpers
@@ -26,12 +36,49 @@ def _safe_float(v: Any, default: float = 0.0) -> float:
     except Exception:
         return float(default)
 
+def _load_page(fetch, *args, cursor: str | None, limit: int | None):
+    try:
+        rows, next_cursor = fetch(*args, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [dict(r) for r in rows], next_cursor
+
+def _json_load_page(fetch, *args, cursor: str | None, limit: int | None) -> Response:
+    """
+    Same body as {"ok": True, "loads": [...], "next_cursor": ...}, but each load
+    arrives as JSON text built by SQLite and is spliced into the response bytes:
+    no dict per row and no jsonable_encoder pass over the page.
+    """
+    try:
+        docs, next_cursor = fetch(*args, cursor=cursor, limit=limit, as_json=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    body = '{"ok":true,"loads":[' + ",".join(docs) + '],"next_cursor":' + json.dumps(next_cursor) + "}"
+    return Response(content=body.encode("utf-8"), media_type="application/json")
+
 def _require_load(load_id: int) -> dict:
     row = db.get_load(int(load_id))
     if not row:
         raise HTTPException(status_code=404, detail="Load not found")
     return dict(row)
 
+async def _require_load_async(load_id: int) -> dict:
+    row = await db_async.get_load(int(load_id))
+    if not row:
+        raise HTTPException(status_code=404, detail="Load not found")
+    return dict(row)
+
+# TransitionRejected.kind -> HTTP status
+_REJECTED_STATUS = {"not_found": 404, "forbidden": 403, "state": 400}
+
+async def _transition(name: str, load_id: int, u: dict, **params: Any) -> dict:
+    """Run a guarded db.LOAD_TRANSITIONS entry; a failed guard becomes the usual HTTP error."""
+    try:
+        row = await db_async.transition_load(name, int(load_id), u["username"], mc=u.get("broker_mc"), **params)
+    except db.TransitionRejected as e:
+        raise HTTPException(status_code=_REJECTED_STATUS.get(e.kind, 400), detail=e.message)
+    return dict(row)
+
 def _driver_can_access(load: dict, username: str) -> None:
     if (load.get("driver_username") or "") != username:
         raise HTTPException(status_code=403, detail="Forbidden")
@@ -44,21 +91,15 @@ def _broker_can_access(load: dict, broker_user: dict) -> None:
     if (load.get("broker_mc") or "") != (broker_user.get("broker_mc") or ""):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-def _require_pending(load: dict) -> None:
-    if (load.get("visibility") or "") != "pending":
-        raise HTTPException(status_code=400, detail="Only pending loads can be modified by broker")
-
-def _require_published(load: dict) -> None:
-    if (load.get("visibility") or "") != "published":
-        raise HTTPException(status_code=400, detail="Only published loads allowed")
+_NOT_ROLE = {"driver": "Target user must be a driver", "dispatcher": "dispatcher_username must be a dispatcher"}
 
-def _require_not_paid(load: dict) -> None:
-    if load.get("paid_at"):
-        raise HTTPException(status_code=400, detail="Load is paid and locked")
-
-def _require_not_invoiced(load: dict) -> None:
-    if load.get("invoiced_at"):
-        raise HTTPException(status_code=400, detail="Load is invoiced and locked")
+def _require_linked(username: str, role: str, broker_user: dict) -> None:
+    # Roster lookup (db.RosterIndex), no query.
+    member = db.roster_member(username)
+    if not member or member[0] != role:
+        raise HTTPException(status_code=400, detail=_NOT_ROLE[role])
+    if member[1] != (broker_user.get("broker_mc") or ""):
+        raise HTTPException(status_code=403, detail=f"{role.capitalize()} not linked to your broker_mc")
 
 def _limited_ratecon_view(load: dict) -> dict:
     return {
@@ -110,13 +151,9 @@ def _extract_us_zip(addr: str) -> str | None:
 # DRIVER (Assigned loads + calculator + status)
 # -----------------------------
 @router.get("/driver/loads")
-def driver_list_loads(u=Depends(require_driver)):
-    rows = db.list_loads_by_driver(u["username"])
-    loads = [dict(r) for r in rows]
-    for l in loads:
-        l["ratecon_limited"] = _limited_ratecon_view(l)
-        l["fuel_breakdown"] = _fuel_breakdown_readonly(l)
-    return {"ok": True, "loads": loads}
+def driver_list_loads(cursor: str | None = None, limit: int | None = None, u=Depends(require_driver)):
+    # ratecon_limited / fuel_breakdown are built in SQL (db.DRIVER_LOAD_JSON).
+    return _json_load_page(db.list_loads_by_driver_page, u["username"], cursor=cursor, limit=limit)
 
 @router.get("/driver/loads/{load_id}")
 def driver_get_load(load_id: int, u=Depends(require_driver)):
@@ -145,7 +182,7 @@ def driver_get_load(load_id: int, u=Depends(require_driver)):
     }
     return {"ok": True, "load": view}
 
-@router.post("/driver/miles")
+@routing_router.post("/driver/miles")
 async def driver_zip_miles(request: Request, u=Depends(require_driver)):
     body = await read_json(request)
     origin_zip = (body.get("origin_zip") or "").strip()
@@ -155,10 +192,10 @@ async def driver_zip_miles(request: Request, u=Depends(require_driver)):
     if not origin_zip or not dest_zip:
         raise HTTPException(status_code=400, detail="origin_zip and dest_zip required")
 
-    miles, seconds, meta = routing_ors.route_miles_zip_to_zip(origin_zip, dest_zip, country=country)
+    miles, seconds, meta = await run_in_threadpool(routing_ors.route_miles_zip_to_zip, origin_zip, dest_zip, country=country)
     return {"ok": True, "origin_zip": origin_zip, "dest_zip": dest_zip, "country": country, "miles": miles, "seconds": seconds, "meta": meta}
 
-@router.post("/driver/pay-calc")
+@routing_router.post("/driver/pay-calc")
 async def driver_pay_calc(request: Request, u=Depends(require_driver)):
     body = await read_json(request)
 
@@ -179,7 +216,9 @@ async def driver_pay_calc(request: Request, u=Depends(require_driver)):
     else:
         if not origin_zip or not dest_zip:
             raise HTTPException(status_code=400, detail="Provide origin_zip + dest_zip, or provide actual_miles")
-        routed_miles, routed_seconds, miles_meta = routing_ors.route_miles_zip_to_zip(origin_zip, dest_zip, country=country)
+        routed_miles, routed_seconds, miles_meta = await run_in_threadpool(
+            routing_ors.route_miles_zip_to_zip, origin_zip, dest_zip, country=country
+        )
         if routed_miles is None:
             raise HTTPException(status_code=400, detail=f"Routing failed: {miles_meta}")
         miles = float(routed_miles)
@@ -236,23 +275,15 @@ async def driver_pay_calc(request: Request, u=Depends(require_driver)):
 
 @router.post("/driver/loads/{load_id}/accept")
 async def driver_accept(load_id: int, u=Depends(require_driver)):
-    load = _require_load(load_id)
-    _driver_can_access(load, u["username"])
-    _require_not_paid(load)
-
-    db.update_load_fields(int(load_id), u["username"], {"status": "accepted"})
+    await _transition("driver_accept", load_id, u)
     try:
-        db.audit(u["username"], "driver_accept", f"load:{int(load_id)}", None)
+        await db_async.audit(u["username"], "driver_accept", f"load:{int(load_id)}", None)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "status": "accepted"}
 
 @router.post("/driver/loads/{load_id}/status")
 async def driver_set_status(load_id: int, request: Request, u=Depends(require_driver)):
-    load = _require_load(load_id)
-    _driver_can_access(load, u["username"])
-    _require_not_paid(load)
-
     body = await read_json(request)
     status = (body.get("status") or "").strip().lower()
 
@@ -268,13 +299,9 @@ async def driver_set_status(load_id: int, request: Request, u=Depends(require_dr
     if status not in allowed:
         raise HTTPException(status_code=400, detail=f"Bad status. Allowed: {sorted(list(allowed))}")
 
-    fields: dict[str, Any] = {"status": status}
-    if status == "delivered" and not load.get("delivered_at"):
-        fields["delivered_at"] = db.now_iso()
-
-    db.update_load_fields(int(load_id), u["username"], fields)
+    await _transition("driver_status", load_id, u, status=status)
     try:
-        db.audit(u["username"], "driver_status", f"load:{int(load_id)}", status)
+        await db_async.audit(u["username"], "driver_status", f"load:{int(load_id)}", status)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "status": status}
@@ -283,9 +310,20 @@ async def driver_set_status(load_id: int, request: Request, u=Depends(require_dr
 # DISPATCHER (Published board + assign/unassign/release + driver roster)
 # -----------------------------
 @router.get("/dispatcher/loads")
-def dispatcher_list_loads(u=Depends(require_dispatcher_linked)):
-    rows = db.list_loads_published_by_dispatcher(u["username"], u["broker_mc"])
-    return {"ok": True, "loads": [dict(r) for r in rows]}
+def dispatcher_list_loads(cursor: str | None = None, limit: int | None = None, u=Depends(require_dispatcher_linked)):
+    return _json_load_page(
+        db.list_loads_published_by_dispatcher_page, u["username"], u["broker_mc"], cursor=cursor, limit=limit
+    )
+
+@router.get("/dispatcher/loads/search")
+def dispatcher_search_loads(
+    q: str = "", cursor: str | None = None, limit: int | None = None, u=Depends(require_dispatcher_linked)
+):
+    """Full-text search over the dispatcher's published loads, best match first."""
+    loads, next_cursor = _load_page(
+        db.search_loads_published_by_dispatcher, u["username"], u["broker_mc"], q, cursor=cursor, limit=limit
+    )
+    return {"ok": True, "loads": loads, "next_cursor": next_cursor}
 
 @router.get("/dispatcher/loads/{load_id}")
 def dispatcher_get_load(load_id: int, u=Depends(require_dispatcher_linked)):
@@ -296,71 +334,41 @@ def dispatcher_get_load(load_id: int, u=Depends(require_dispatcher_linked)):
 
 @router.get("/dispatcher/drivers")
 def dispatcher_list_drivers(u=Depends(require_dispatcher_linked)):
-    rows = db.list_users_by_role_and_broker_mc("driver", u["broker_mc"], limit=500)
-    drivers = [dict(r).get("username") for r in rows]
-    drivers = [d for d in drivers if d]
-    drivers.sort()
-    return {"ok": True, "drivers": drivers}
+    return {"ok": True, "drivers": db.roster_usernames(u["broker_mc"], "driver")}
 
 @router.post("/dispatcher/loads/{load_id}/assign-driver")
 async def dispatcher_assign_driver(load_id: int, request: Request, u=Depends(require_dispatcher_linked)):
-    load = _require_load(load_id)
-    _dispatcher_can_access(load, u)
-    _require_published(load)
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
     body = await read_json(request)
     driver_username = (body.get("driver_username") or "").strip()
     if not driver_username:
         raise HTTPException(status_code=400, detail="Missing driver_username")
 
-    target = db.get_user(driver_username)
-    target = dict(target) if target else None
-    if not target or (target.get("role") != "driver"):
-        raise HTTPException(status_code=400, detail="Target user must be a driver")
-    if (target.get("broker_mc") or "") != (u.get("broker_mc") or ""):
-        raise HTTPException(status_code=403, detail="Driver not linked to your broker_mc")
+    _require_linked(driver_username, "driver", u)
 
-    db.assign_driver(int(load_id), driver_username, u["username"])
+    await _transition("assign_driver", load_id, u, driver=driver_username)
 
     try:
-        db.audit(u["username"], "dispatcher_assign_driver", f"load:{int(load_id)}", f"driver:{driver_username}")
+        await db_async.audit(u["username"], "dispatcher_assign_driver", f"load:{int(load_id)}", f"driver:{driver_username}")
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "driver_username": driver_username}
 
 @router.post("/dispatcher/loads/{load_id}/unassign-driver")
 async def dispatcher_unassign_driver(load_id: int, u=Depends(require_dispatcher_linked)):
-    load = _require_load(load_id)
-    _dispatcher_can_access(load, u)
-    _require_published(load)
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
-    db.unassign_driver(int(load_id))
+    await _transition("unassign_driver", load_id, u)
 
     try:
-        db.audit(u["username"], "dispatcher_unassign_driver", f"load:{int(load_id)}", None)
+        await db_async.audit(u["username"], "dispatcher_unassign_driver", f"load:{int(load_id)}", None)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "unassigned": True}
 
 @router.post("/dispatcher/loads/{load_id}/release")
 async def dispatcher_release(load_id: int, u=Depends(require_dispatcher_linked)):
-    load = _require_load(load_id)
-    _dispatcher_can_access(load, u)
-    _require_published(load)
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
-    if hasattr(db, "release_load"):
-        db.release_load(int(load_id))
-    else:
-        db.update_load_fields(int(load_id), u["username"], {"dispatcher_username": None, "driver_username": None})
+    await _transition("release", load_id, u)
 
     try:
-        db.audit(u["username"], "dispatcher_release", f"load:{int(load_id)}", None)
+        await db_async.audit(u["username"], "dispatcher_release", f"load:{int(load_id)}", None)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "released": True}
@@ -369,9 +377,18 @@ async def dispatcher_release(load_id: int, u=Depends(require_dispatcher_linked))
 # BROKER (approved)
 # -----------------------------
 @router.get("/broker/loads")
-def broker_list_loads(u=Depends(require_broker_approved)):
-    rows = db.list_loads_by_broker(u["broker_mc"])
-    return {"ok": True, "loads": [dict(r) for r in rows]}
+def broker_list_loads(cursor: str | None = None, limit: int | None = None, u=Depends(require_broker_approved)):
+    return _json_load_page(db.list_loads_by_broker_page, u["broker_mc"], cursor=cursor, limit=limit)
+
+@router.get("/broker/loads/search")
+def broker_search_loads(q: str = "", cursor: str | None = None, limit: int | None = None, u=Depends(require_broker_approved)):
+    """
+    Full-text search (shipper, customer ref, addresses, notes, ratecon terms,
+    dispatcher/driver) over the brokerage's loads, best match first. Every word
+    must match as a prefix. Page with next_cursor like /broker/loads.
+    """
+    loads, next_cursor = _load_page(db.search_loads_by_broker, u["broker_mc"], q, cursor=cursor, limit=limit)
+    return {"ok": True, "loads": loads, "next_cursor": next_cursor}
 
 @router.get("/broker/loads/{load_id}")
 def broker_get_load(load_id: int, u=Depends(require_broker_approved)):
@@ -379,7 +396,7 @@ def broker_get_load(load_id: int, u=Depends(require_broker_approved)):
     _broker_can_access(load, u)
     return {"ok": True, "load": load}
 
-@router.post("/broker/loads/{load_id}/route-miles")
+@routing_router.post("/broker/loads/{load_id}/route-miles")
 async def broker_route_miles(load_id: int, request: Request, u=Depends(require_broker_approved)):
     """
     Auto-calc miles for Negotiation Calculator:
@@ -387,7 +404,7 @@ async def broker_route_miles(load_id: int, request: Request, u=Depends(require_b
       total_miles  = routed miles * (1 + deadhead buffer)
     Deadhead buffer is env-configurable: DEADHEAD_BUFFER_PCT (default 0.07).
     """
-    load = _require_load(load_id)
+    load = await _require_load_async(load_id)
     _broker_can_access(load, u)
 
     body = await read_json(request)
@@ -412,7 +429,7 @@ async def broker_route_miles(load_id: int, request: Request, u=Depends(require_b
             },
         )
 
-    miles, seconds, meta = routing_ors.route_miles_zip_to_zip(oz, dz, country=country)
+    miles, seconds, meta = await run_in_threadpool(routing_ors.route_miles_zip_to_zip, oz, dz, country=country)
     if miles is None:
         raise HTTPException(status_code=400, detail={"error": "Routing failed", "meta": meta})
 
@@ -434,28 +451,31 @@ async def broker_route_miles(load_id: int, request: Request, u=Depends(require_b
     }
 
 @router.get("/broker/loads/{load_id}/negotiations")
-def broker_list_negotiations(load_id: int, limit: int = 20, u=Depends(require_broker_approved)):
+def broker_list_negotiations(
+    load_id: int,
+    limit: int = 20,
+    fields: str | None = None,
+    sort: str = "newest",
+    fuel_period: str | None = None,
+    u=Depends(require_broker_approved),
+):
+    """
+    Quotes for a load. fields=inputs,selected,... picks which parts of each
+    quote to decode (default all; fields= with nothing returns only the
+    summary columns). sort=newest|rate|driver_cpm|margin.
+    """
     load = _require_load(load_id)
     _broker_can_access(load, u)
 
-    rows = db.list_load_negotiations(int(load_id), int(limit))
-    out = []
-    for r in rows:
-        d = dict(r)
-        out.append({
-            "id": d.get("id"),
-            "load_id": d.get("load_id"),
-            "broker_username": d.get("broker_username"),
-            "applied": bool(d.get("applied")),
-            "override_reason": d.get("override_reason"),
-            "inputs": db.json_loads_safe(d.get("inputs_json")) or {},
-            "selected": db.json_loads_safe(d.get("selected_json")) or {},
-            "fuel": db.json_loads_safe(d.get("fuel_json")) or {},
-            "breakdown": db.json_loads_safe(d.get("breakdown_json")) or {},
-            "warnings": db.json_loads_safe(d.get("warnings_json")) or [],
-            "created_at": d.get("created_at"),
-        })
-    return {"ok": True, "load_id": int(load_id), "negotiations": out}
+    want = None if fields is None else [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in (want or []) if f not in db.NEGOTIATION_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    try:
+        rows = db.list_load_negotiations(int(load_id), limit, fields=want, sort=sort, fuel_period=fuel_period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, "load_id": int(load_id), "negotiations": rows}
 
 @router.post("/broker/loads/create")
 async def broker_create_load(request: Request, u=Depends(require_broker_approved)):
@@ -477,14 +497,9 @@ async def broker_create_load(request: Request, u=Depends(require_broker_approved
     fuel_surcharge_amt = _safe_float(body.get("fuel_surcharge"), 0.0)
 
     if dispatcher_username:
-        du = db.get_user(dispatcher_username)
-        du = dict(du) if du else None
-        if not du or du.get("role") != "dispatcher":
-            raise HTTPException(status_code=400, detail="dispatcher_username must be a dispatcher")
-        if (du.get("broker_mc") or "") != u["broker_mc"]:
-            raise HTTPException(status_code=403, detail="Dispatcher not linked to your broker_mc")
-
-    load_id = db.create_load(
+        _require_linked(dispatcher_username, "dispatcher", u)
+
+    load_id = await db_async.create_load(
         broker_mc=u["broker_mc"],
         pickup_address=pickup_address,
         delivery_address=delivery_address,
@@ -500,7 +515,7 @@ async def broker_create_load(request: Request, u=Depends(require_broker_approved
         created_by=u["username"],
     )
     try:
-        db.audit(u["username"], "create_load", f"load:{int(load_id)}", None)
+        await db_async.audit(u["username"], "create_load", f"load:{int(load_id)}", None)
     except Exception:
         pass
     return {"ok": True, "load_id": load_id}
@@ -512,72 +527,36 @@ async def broker_create_load(request: Request, u=Depends(require_broker_approved
 
 @router.post("/broker/loads/{load_id}/publish")
 async def broker_publish_load(load_id: int, u=Depends(require_broker_approved)):
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
-    if (load.get("visibility") or "").lower() != "pending":
-        raise HTTPException(status_code=400, detail="Only pending loads can be published")
-
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
-    db.set_load_visibility(int(load_id), "published", reviewed_by=u["username"], pulled_reason=None)
+    await _transition("publish", load_id, u)
     try:
-        db.audit(u["username"], "broker_publish", f"load:{int(load_id)}", None)
+        await db_async.audit(u["username"], "broker_publish", f"load:{int(load_id)}", None)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "visibility": "published"}
 
 @router.post("/broker/loads/{load_id}/cancel")
 async def broker_cancel_load(load_id: int, request: Request, u=Depends(require_broker_approved)):
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
-    if (load.get("visibility") or "").lower() != "pending":
-        raise HTTPException(status_code=400, detail="Only pending loads can be canceled")
-
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
     body = await read_json(request)
     reason = (body.get("reason") or "").strip() or "Canceled by broker"
 
-    db.set_load_visibility(int(load_id), "pulled", reviewed_by=u["username"], pulled_reason=reason)
+    await _transition("cancel", load_id, u, reason=reason)
     try:
-        db.audit(u["username"], "broker_cancel", f"load:{int(load_id)}", reason)
+        await db_async.audit(u["username"], "broker_cancel", f"load:{int(load_id)}", reason)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "visibility": "pulled", "pulled_reason": reason}
 
 @router.post("/broker/loads/{load_id}/delete")
 async def broker_delete_load(load_id: int, u=Depends(require_broker_approved)):
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
-    if (load.get("visibility") or "").lower() != "pending":
-        raise HTTPException(status_code=400, detail="Only pending loads can be deleted")
-
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
-    db.hard_delete_load(int(load_id))
+    await _transition("delete", load_id, u)
     try:
-        db.audit(u["username"], "broker_delete", f"load:{int(load_id)}", None)
+        await db_async.audit(u["username"], "broker_delete", f"load:{int(load_id)}", None)
     except Exception:
         pass
     return {"ok": True, "load_id": int(load_id), "deleted": True}
 
 @router.post("/broker/loads/{load_id}/update")
 async def broker_update_load(load_id: int, request: Request, u=Depends(require_broker_approved)):
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
-    if (load.get("visibility") or "").lower() != "pending":
-        raise HTTPException(status_code=400, detail="Only pending loads can be edited")
-
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
     body = await read_json(request)
 
     allowed = {
@@ -604,12 +583,7 @@ async def broker_update_load(load_id: int, request: Request, u=Depends(require_b
             fields[k] = (v if v != "" else None)
 
     if "dispatcher_username" in fields and fields["dispatcher_username"]:
-        du = db.get_user(fields["dispatcher_username"])
-        du = dict(du) if du else None
-        if not du or du.get("role") != "dispatcher":
-            raise HTTPException(status_code=400, detail="dispatcher_username must be a dispatcher")
-        if (du.get("broker_mc") or "") != (u.get("broker_mc") or ""):
-            raise HTTPException(status_code=403, detail="Dispatcher not linked to your broker_mc")
+        _require_linked(fields["dispatcher_username"], "dispatcher", u)
 
     if "pickup_address" in fields:
         if not (fields["pickup_address"] or "").strip():
@@ -618,10 +592,10 @@ async def broker_update_load(load_id: int, request: Request, u=Depends(require_b
         if not (fields["delivery_address"] or "").strip():
             raise HTTPException(status_code=400, detail="delivery_address required")
 
-    db.update_load_fields(int(load_id), u["username"], fields)
+    await _transition("update", load_id, u, fields=fields)
 
     try:
-        db.audit(u["username"], "broker_update", f"load:{int(load_id)}", db.json_dumps_safe(fields))
+        await db_async.audit(u["username"], "broker_update", f"load:{int(load_id)}", db.json_dumps_safe(fields))
     except Exception:
         pass
 
@@ -632,46 +606,33 @@ async def broker_update_load(load_id: int, request: Request, u=Depends(require_b
 # -----------------------------
 @router.post("/broker/loads/{load_id}/invoice")
 async def broker_invoice_load(load_id: int, u=Depends(require_broker_approved)):
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
-    if (load.get("visibility") or "").lower() != "published":
-        raise HTTPException(status_code=400, detail="Only published loads can be invoiced")
-
-    _require_not_paid(load)
-    _require_not_invoiced(load)
-
     invoice_number = f"INV-{uuid.uuid4().hex[:8].upper()}"
-    fields = {
-        "invoiced_at": db.now_iso(),
-        "invoice_number": invoice_number,
-    }
-
-    db.update_load_fields(int(load_id), u["username"], fields)
+    load = await _transition("invoice", load_id, u, invoice_number=invoice_number)
     try:
-        db.audit(u["username"], "broker_invoice", f"load:{int(load_id)}", invoice_number)
+        await db_async.audit(u["username"], "broker_invoice", f"load:{int(load_id)}", invoice_number)
     except Exception:
         pass
-    return {"ok": True, "load_id": int(load_id), "invoice_number": invoice_number, "invoiced_at": fields["invoiced_at"]}
+    return {"ok": True, "load_id": int(load_id), "invoice_number": invoice_number, "invoiced_at": load["invoiced_at"]}
 
 # -----------------------------
 # ✅ NEW: BROKER MARK PAID (FINAL LOCK)
 # -----------------------------
 @router.post("/broker/loads/{load_id}/paid")
 async def broker_mark_paid(load_id: int, u=Depends(require_broker_approved)):
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
-    if not load.get("invoiced_at"):
-        raise HTTPException(status_code=400, detail="Load must be invoiced first")
-
-    if load.get("paid_at"):
-        return {"ok": True, "load_id": int(load_id), "paid_at": load.get("paid_at")}
-
-    fields = {"paid_at": db.now_iso()}
-    db.update_load_fields(int(load_id), u["username"], fields)
     try:
-        db.audit(u["username"], "broker_paid", f"load:{int(load_id)}", fields["paid_at"])
+        load = dict(await db_async.transition_load("paid", int(load_id), u["username"], mc=u.get("broker_mc")))
+    except db.TransitionRejected as e:
+        if e.guard == "not_paid":
+            # Already paid: marking paid again is a no-op.
+            return {"ok": True, "load_id": int(load_id), "paid_at": e.state.get("paid_at")}
+        raise HTTPException(status_code=_REJECTED_STATUS.get(e.kind, 400), detail=e.message)
+    try:
+        await db_async.audit(u["username"], "broker_paid", f"load:{int(load_id)}", load["paid_at"])
     except Exception:
         pass
-    return {"ok": True, "load_id": int(load_id), "paid_at": fields["paid_at"]}
+    return {"ok": True, "load_id": int(load_id), "paid_at": load["paid_at"]}
+
+# What main.py mounts: the unit-of-work routes plus the routing ones.
+_uow_router, router = router, APIRouter()
+router.include_router(_uow_router)
+router.include_router(routing_router)
@@ -8,6 +8,8 @@ from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html
 
+import db
+
 HERE = Path(__file__).resolve().parent
 
 # Lock FastAPI's default docs/openapi off — we will serve them ourselves behind ADMIN_KEY.
@@ -19,6 +21,17 @@ app = FastAPI(
     openapi_url=None,
 )
 
+
+@app.on_event("startup")
+def _start_background() -> None:
+    db.start_background()
+
+
+@app.on_event("shutdown")
+def _stop_background() -> None:
+    db.stop_background()
+
+
 STATIC_DIR = HERE / "static"
 if STATIC_DIR.is_dir():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -73,6 +86,7 @@ def admin_openapi(request: Request):
 # Routers
 for _m in [
     "auth",
+    "load_io",
     "loads",
     "negotiate",
     "fuel",
@@ -5,13 +5,18 @@ import os
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 
 import db
+import db_async
 import fuel
-from auth import require_broker_approved, read_json
+from auth import bind_tenant, require_broker_approved, read_json
 from fair_rate_policy import FairRatePolicy
 
-router = APIRouter()
+# No per-request unit of work here: the quote waits on EIA, so only the db
+# section of the endpoint runs inside db_async.unit_of_work().
+# bind_tenant points load/audit helpers at the caller's shard (DB_SHARD_BY_MC).
+router = APIRouter(dependencies=[Depends(bind_tenant)])
 
 # -----------------------------
 # Helpers
@@ -33,8 +38,8 @@ def _safe_float(v: Any, default: float = 0.0) -> float:
     except Exception:
         return float(default)
 
-def _require_load(load_id: int) -> dict:
-    row = db.get_load(int(load_id))
+async def _require_load(load_id: int) -> dict:
+    row = await db_async.get_load(int(load_id))
     if not row:
         raise fail("LOAD_NOT_FOUND", "Load not found", 404)
     return dict(row)
@@ -43,11 +48,17 @@ def _broker_can_access(load: dict, broker_user: dict) -> None:
     if (load.get("broker_mc") or "") != (broker_user.get("broker_mc") or ""):
         raise fail("FORBIDDEN", "Forbidden", 403)
 
-def _update_load_fields(load_id: int, updated_by: str, fields: dict) -> None:
-    fn = getattr(db, "update_load_fields", None)
-    if not callable(fn):
-        raise RuntimeError("db.update_load_fields is not available")
-    fn(int(load_id), str(updated_by), fields)
+_REJECTED = {"not_found": ("LOAD_NOT_FOUND", 404), "forbidden": ("FORBIDDEN", 403), "state": ("LOAD_LOCKED", 400)}
+
+async def _apply_rate(load_id: int, u: dict, fields: dict) -> None:
+    # Same guarded path as every other load write (db.LOAD_TRANSITIONS).
+    try:
+        await db_async.transition_load(
+            "apply_rate", int(load_id), u.get("username") or "system", mc=u.get("broker_mc"), fields=fields
+        )
+    except db.TransitionRejected as e:
+        code, status = _REJECTED.get(e.kind, ("LOAD_LOCKED", 400))
+        raise fail(code, e.message, status)
 
 def _r2(x: float) -> float:
     return float(round(float(x), 2))
@@ -110,9 +121,6 @@ def _fuel_costs_loaded_miles(loaded_miles: float, origin_state: str | None, fuel
 async def broker_negotiate(load_id: int, request: Request, u=Depends(require_broker_approved)):
     policy = FairRatePolicy()
 
-    load = _require_load(load_id)
-    _broker_can_access(load, u)
-
     body = await read_json(request)
 
     loaded_miles = _safe_float(body.get("loaded_miles"), 0.0)
@@ -125,6 +133,12 @@ async def broker_negotiate(load_id: int, request: Request, u=Depends(require_bro
     fuel_mode = (body.get("fuel_mode") or "national").strip().lower()
     origin_state = (body.get("origin_state") or "").strip().upper() or None
 
+    # The EIA lookup is a blocking HTTP call (up to 10 s): run it in the
+    # threadpool, and before the first db access so no connection waits on it.
+    fuel_per_mile, fuel_total, fuel_obj = await run_in_threadpool(
+        _fuel_costs_loaded_miles, loaded_miles, origin_state=origin_state, fuel_mode=fuel_mode
+    )
+
     lumper_fee = _safe_float(body.get("lumper_fee"), 0.0)
     detention_hours = _safe_float(body.get("detention_hours"), 0.0)
     breakdown_fee = _safe_float(body.get("breakdown_fee"), 0.0)
@@ -149,10 +163,6 @@ async def broker_negotiate(load_id: int, request: Request, u=Depends(require_bro
     carrier_operating_cost = policy.default_carrier_cost_per_total_mile * total_miles
     carrier_accessorials = lumper_fee
 
-    fuel_per_mile, fuel_total, fuel_obj = _fuel_costs_loaded_miles(
-        loaded_miles, origin_state=origin_state, fuel_mode=fuel_mode
-    )
-
     carrier_cost_subtotal = driver_total + carrier_operating_cost + carrier_accessorials + fuel_total
     carrier_revenue = carrier_cost_subtotal * (1.0 + policy.default_carrier_margin_pct)
     dispatch_fee = carrier_revenue * policy.default_dispatch_pct
@@ -235,41 +245,51 @@ async def broker_negotiate(load_id: int, request: Request, u=Depends(require_bro
         "market_assumptions": market_assumptions,
     }
 
-    try:
-        db.create_load_negotiation(
-            load_id=int(load_id),
-            broker_username=u.get("username"),
-            applied=apply_to_load,
-            override_reason=override_reason if override_reason else None,
-            inputs=audit_meta["inputs"],
-            selected=selected,
-            fuel=fuel_obj,
-            breakdown=breakdown,
-            warnings=warnings,
-        )
-    except Exception:
-        pass
+    # Everything that touches the db shares one connection and one commit.
+    async with db_async.unit_of_work():
+        load = await _require_load(load_id)
+        _broker_can_access(load, u)
 
-    try:
-        db.audit(u["username"], "negotiate_rate", f"load:{int(load_id)}", json.dumps(audit_meta))
-    except Exception:
-        pass
-
-    if apply_to_load:
-        updated_by = u.get("username") or "system"
-        _update_load_fields(
-            int(load_id),
-            updated_by,
-            {
-                "driver_pay": float(breakdown.get("driver_total_pay", 0.0)),
-                "fuel_surcharge": float(breakdown.get("fuel_total", 0.0)),
-            },
-        )
+        negotiation_id = None
         try:
-            db.audit(updated_by, "apply_negotiated_rate", f"load:{int(load_id)}", None)
+            negotiation_id = await db_async.create_load_negotiation(
+                load_id=int(load_id),
+                broker_username=u.get("username"),
+                applied=apply_to_load,
+                override_reason=override_reason if override_reason else None,
+                inputs=audit_meta["inputs"],
+                selected=selected,
+                fuel=fuel_obj,
+                breakdown=breakdown,
+                warnings=warnings,
+                market_assumptions=market_assumptions,
+            )
         except Exception:
             pass
 
+        # The stored quote already has everything in audit_meta; point at it
+        # rather than writing it twice. Keep the copy only if the insert failed.
+        meta = {"negotiation_id": negotiation_id} if negotiation_id is not None else audit_meta
+        try:
+            await db_async.audit(u["username"], "negotiate_rate", f"load:{int(load_id)}", json.dumps(meta))
+        except Exception:
+            pass
+
+        if apply_to_load:
+            updated_by = u.get("username") or "system"
+            await _apply_rate(
+                int(load_id),
+                u,
+                {
+                    "driver_pay": float(breakdown.get("driver_total_pay", 0.0)),
+                    "fuel_surcharge": float(breakdown.get("fuel_total", 0.0)),
+                },
+            )
+            try:
+                await db_async.audit(updated_by, "apply_negotiated_rate", f"load:{int(load_id)}", None)
+            except Exception:
+                pass
+
     return {
         "ok": True,
         "load_id": int(load_id),
@@ -283,4 +303,5 @@ async def broker_negotiate(load_id: int, request: Request, u=Depends(require_bro
         "fuel": fuel_obj,
         "breakdown": breakdown,
         "apply_to_load": apply_to_load,
+        "negotiation_id": negotiation_id,
     }
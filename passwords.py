@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+# ---------------------------
+# bcrypt off the request threads
+# ---------------------------
+#
+# A bcrypt hash or verify is ~250ms of CPU. Run inline, a burst of logins
+# holds every AnyIO worker thread and each sync endpoint queues behind it.
+# Hashing runs on its own small process pool instead; callers await the
+# result without holding a thread. At most BCRYPT_MAX_PENDING jobs may be
+# queued or running; past that submit() raises PasswordBusy (auth.py answers
+# 503 + Retry-After) rather than letting the queue grow without bound.
+#
+# Deliberately light: spawned workers import this module, not the app.
+# Scripts that hash passwords need the usual `if __name__ == "__main__":`
+# guard, as with any spawn-based pool.
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _env_int(key: str, default: int) -> int:
+    # Same rule as db._env_int (a bad value falls back to the default);
+    # not imported from db to keep the workers light.
+    try:
+        return int(os.environ.get(key, str(default)).strip() or default)
+    except ValueError:
+        return default
+
+
+# 0 runs jobs on a plain thread in this process (dev, tests, one-core hosts).
+BCRYPT_WORKERS = max(0, _env_int("BCRYPT_WORKERS", 2))
+BCRYPT_MAX_PENDING = max(1, _env_int("BCRYPT_MAX_PENDING", 64))
+
+_SAMPLES = 1024
+
+
+class PasswordBusy(Exception):
+    """Too many hash/verify jobs already queued."""
+
+
+def _timed(fn: Callable[..., Any], *args: Any) -> Tuple[Any, float, float]:
+    started = time.time()
+    out = fn(*args)
+    return out, started, time.time()
+
+
+def _do_hash(pw: str) -> Tuple[str, float, float]:
+    return _timed(pwd_context.hash, pw)
+
+
+def _do_verify(pw: str, hashed: str) -> Tuple[bool, float, float]:
+    return _timed(pwd_context.verify, pw, hashed)
+
+
+def _noop() -> None:
+    return None
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.pending = 0
+        self.queue_ms: Deque[float] = deque(maxlen=_SAMPLES)
+        self.run_ms: Deque[float] = deque(maxlen=_SAMPLES)
+
+
+_LOCK = threading.Lock()
+_STATS = _Stats()
+_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _LOCK:
+        if _POOL is None:
+            # spawn, not fork: the app process has live threads (db writer,
+            # audit writer, executors) that a forked child would inherit mid-lock.
+            _POOL = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    global _POOL
+    with _LOCK:
+        if _POOL is broken:
+            _POOL = None
+
+
+def _inline(fn: Callable[..., Any], *args: Any) -> Future:
+    fut: Future = Future()
+
+    def _run() -> None:
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=_run, name="bcrypt-inline", daemon=True).start()
+    return fut
+
+
+def submit(fn: Callable[..., Tuple[Any, float, float]], *args: Any) -> Future:
+    """Queue a _do_* job; the returned future resolves to its plain result."""
+    with _LOCK:
+        if _STATS.pending >= BCRYPT_MAX_PENDING:
+            _STATS.rejected += 1
+            raise PasswordBusy(f"{_STATS.pending} password jobs pending")
+        _STATS.pending += 1
+        _STATS.submitted += 1
+    submitted = time.time()
+    out: Future = Future()
+
+    def _done(f: Future) -> None:
+        try:
+            result, started, finished = f.result()
+        except BaseException as e:
+            with _LOCK:
+                _STATS.pending -= 1
+                _STATS.errors += 1
+            if isinstance(e, BrokenProcessPool) and pool is not None:
+                _reset_pool(pool)
+            out.set_exception(e)
+            return
+        with _LOCK:
+            _STATS.pending -= 1
+            _STATS.completed += 1
+            _STATS.queue_ms.append(max(0.0, started - submitted) * 1e3)
+            _STATS.run_ms.append((finished - started) * 1e3)
+        out.set_result(result)
+
+    pool = _pool() if BCRYPT_WORKERS else None
+    try:
+        fut = pool.submit(fn, *args) if pool is not None else _inline(fn, *args)
+    except BaseException:
+        with _LOCK:
+            _STATS.pending -= 1
+            _STATS.errors += 1
+        if pool is not None:
+            _reset_pool(pool)
+        raise
+    fut.add_done_callback(_done)
+    return out
+
+
+def hash(pw: str) -> str:  # noqa: A001 - mirrors passlib's CryptContext.hash
+    return submit(_do_hash, pw).result()
+
+
+def verify(pw: str, hashed: str) -> bool:
+    return submit(_do_verify, pw, hashed).result()
+
+
+async def hash_async(pw: str) -> str:
+    return await asyncio.wrap_future(submit(_do_hash, pw))
+
+
+async def verify_async(pw: str, hashed: str) -> bool:
+    return await asyncio.wrap_future(submit(_do_verify, pw, hashed))
+
+
+def _summary(samples: Deque[float]) -> Dict[str, Any]:
+    xs = sorted(samples)
+    if not xs:
+        return {"n": 0, "p50": None, "p99": None, "max": None}
+    pick = lambda p: round(xs[min(len(xs) - 1, int(len(xs) * p))], 2)  # noqa: E731
+    return {"n": len(xs), "p50": pick(0.5), "p99": pick(0.99), "max": round(xs[-1], 2)}
+
+
+def stats() -> Dict[str, Any]:
+    """Counters plus queue-time and run-time percentiles over the last jobs."""
+    with _LOCK:
+        return {
+            "workers": BCRYPT_WORKERS,
+            "max_pending": BCRYPT_MAX_PENDING,
+            "pending": _STATS.pending,
+            "submitted": _STATS.submitted,
+            "completed": _STATS.completed,
+            "rejected": _STATS.rejected,
+            "errors": _STATS.errors,
+            "queue_ms": _summary(_STATS.queue_ms),
+            "run_ms": _summary(_STATS.run_ms),
+        }
+
+
+def start() -> None:
+    """Spawn the workers now, so the first logins after a deploy don't pay for it."""
+    if BCRYPT_WORKERS:
+        pool = _pool()
+        for f in [pool.submit(_noop) for _ in range(BCRYPT_WORKERS)]:
+            f.result()
+
+
+def shutdown() -> None:
+    """Stop the worker processes. Registered with the app shutdown hook."""
+    global _POOL
+    with _LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("BCRYPT_WORKERS", "0")
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """A migrated, empty database in tmp_path; audit rows are written inline."""
+    db.close_pool()
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(db, "AUDIT_ASYNC", False)
+    db.migrate()
+    yield db.DB_PATH
+    db.shutdown_writer()
+    db.close_pool()
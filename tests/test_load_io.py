@@ -0,0 +1,185 @@
+import asyncio
+import csv
+import io
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import auth
+import db
+import load_io
+import main
+
+
+def _headers(**extra) -> dict:
+    return {"Authorization": "Bearer " + auth._access_token("b1", "broker", "approved", "MC1"), **extra}
+
+
+def _post(path: str, chunks, **kw) -> httpx.Response:
+    # TestClient joins a streamed body into one message; httpx's ASGI
+    # transport hands the app each chunk as its own http.request event.
+    async def body():
+        for c in chunks:
+            yield c
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://t") as client:
+            return await client.post(path, content=body(), **kw)
+
+    return asyncio.run(go())
+
+
+def _import(chunks, fmt: str) -> dict:
+    r = _post(f"/broker/loads/bulk?format={fmt}", chunks, headers=_headers())
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _split(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _refs() -> dict:
+    with db._conn() as con:
+        return {r["external_ref"]: dict(r) for r in con.execute("SELECT * FROM loads")}
+
+
+def test_csv_quoted_newlines_and_bom_across_chunks(fresh_db):
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    data = (
+        "\ufeffExternal_Ref,pickup_address,delivery_address,notes\r\n"
+        'A1,1 Main St,2 Broad St,"first line\r\nsecond, with ""quotes"""\r\n'
+        "A2,3 Elm St,4 Oak St,plain\r\n"
+    ).encode()
+    out = _import(_split(data, 7), "csv")
+    assert (out["rows"], out["inserted"], out["rejected"]) == (2, 2, 0), out
+    refs = _refs()
+    # The BOM is gone from the header, and the quoted record kept its newline.
+    assert refs["A1"]["notes"] == 'first line\nsecond, with "quotes"'
+    assert refs["A2"]["pickup_address"] == "3 Elm St"
+
+
+def test_ndjson_bom_and_bad_rows(fresh_db):
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    data = (
+        '\ufeff{"external_ref": "N1", "pickup_address": "a", "delivery_address": "b"}\n'
+        "{not json}\n"
+        "\n"
+        '{"external_ref": "N2", "pickup_address": "a"}\n'
+        '{"external_ref": "N3", "pickup_address": "a", "delivery_address": "b", "miles": "x"}\n'
+        '{"external_ref": "N4", "pickup_address": "a", "delivery_address": "b"}'
+    ).encode()
+    out = _import(_split(data, 5), "ndjson")
+    assert (out["rows"], out["inserted"], out["rejected"]) == (5, 2, 3), out
+    assert [e["row"] for e in out["errors"]] == [2, 3, 4]
+    assert out["errors"][0]["error"].startswith("invalid JSON")
+    assert set(_refs()) == {"N1", "N4"}
+
+
+def test_over_long_line_spanning_chunks_is_one_rejected_row(fresh_db, monkeypatch):
+    monkeypatch.setattr(load_io, "BULK_MAX_LINE_BYTES", 1024)
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    long_row = '{"external_ref": "L", "pickup_address": "a", "delivery_address": "b", "notes": "%s"}\n' % ("x" * 5000)
+    data = (
+        '{"external_ref": "S1", "pickup_address": "a", "delivery_address": "b"}\n'
+        + long_row
+        + '{"external_ref": "S2", "pickup_address": "a", "delivery_address": "b"}\n'
+    ).encode()
+    out = _import(_split(data, 300), "ndjson")
+    assert (out["rows"], out["inserted"], out["rejected"]) == (3, 2, 1), out
+    assert out["errors"] == [{"row": 2, "error": "line longer than 1024 bytes"}]
+    assert set(_refs()) == {"S1", "S2"}
+
+
+def test_over_long_line_inside_one_chunk(fresh_db, monkeypatch):
+    monkeypatch.setattr(load_io, "BULK_MAX_LINE_BYTES", 1024)
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    data = (
+        "external_ref,pickup_address,delivery_address,notes\n"
+        + "C1,a,b,%s\n" % ("y" * 2000)
+        + "C2,a,b,ok\n"
+    ).encode()
+    out = _import([data], "csv")
+    assert (out["rows"], out["inserted"], out["rejected"]) == (2, 1, 1), out
+    assert set(_refs()) == {"C2"}
+
+
+def test_csv_unterminated_quote_at_eof(fresh_db):
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    data = b'external_ref,pickup_address,delivery_address,notes\nU1,a,b,ok\nU2,a,b,"never closed\nmore\n'
+    out = _import(_split(data, 4), "csv")
+    assert (out["rows"], out["inserted"], out["rejected"]) == (2, 1, 1), out
+    assert out["errors"] == [{"row": 2, "error": "unterminated quoted field"}]
+
+
+def test_upsert_updates_pending_and_refuses_locked_external_ref(fresh_db):
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    first = b"external_ref,pickup_address,delivery_address,rate_total\nP1,a,b,100\nP2,a,b,200\n"
+    assert _import([first], "csv")["inserted"] == 2
+    db.transition_load("publish", _refs()["P2"]["id"], "b1", mc="MC1")
+
+    again = b"external_ref,pickup_address,delivery_address,rate_total\nP1,a,b,150\nP2,a,b,250\n"
+    out = _import(_split(again, 9), "csv")
+    assert (out["inserted"], out["updated"], out["rejected"]) == (0, 1, 1), out
+    assert out["errors"][0]["row"] == 2
+    assert "no longer pending" in out["errors"][0]["error"]
+    refs = _refs()
+    assert (refs["P1"]["rate_total"], refs["P2"]["rate_total"]) == (150.0, 200.0)
+
+
+def _seed_export(n: int) -> None:
+    # Pairs share a created_at, so (created_at, id) ties are exercised; every
+    # third load is paid long ago and can be moved to loads_archive.
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    ids = [db.create_load("MC1", "a", "b", "b1", external_ref=f"E{i}") for i in range(n)]
+    with db._conn() as con:
+        for i, load_id in enumerate(ids):
+            paid = "2020-01-01T00:00:00+00:00" if i % 3 == 0 else None
+            con.execute(
+                "UPDATE loads SET created_at=?, paid_at=? WHERE id=?",
+                (f"2026-01-01T00:00:{i // 2:02d}+00:00", paid, str(load_id)),
+            )
+    db.create_load("MC2", "a", "b", "other")
+
+
+def _export_rows(**params) -> list:
+    r = TestClient(main.app).get("/broker/loads/export", params={"format": "ndjson", **params}, headers=_headers())
+    assert r.status_code == 200, r.text
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+def test_export_resumes_from_any_cursor_across_archive(fresh_db):
+    _seed_export(15)
+    full = _export_rows()
+    assert len(full) == 15 and {d["broker_mc"] for d in full} == {"MC1"}
+
+    # Restarting after any row yields exactly the rest.
+    for k, doc in enumerate(full):
+        assert [d["id"] for d in _export_rows(cursor=doc["cursor"])] == [d["id"] for d in full[k + 1:]]
+
+    # Interrupt mid-pull, move paid loads on both sides of the cut into the
+    # archive, add a new load, then resume: no repeats and no gaps.
+    got = full[:7]
+    assert db.archive_paid_loads(older_than_days=0)["moved"] == 5
+    new_id = db.create_load("MC1", "a", "b", "b1", external_ref="NEW")
+    got += _export_rows(cursor=got[-1]["cursor"])
+    ids = [d["id"] for d in got]
+    assert ids == [d["id"] for d in full] + [str(new_id)]
+
+
+def test_export_csv_cursor_column_and_bad_cursor(fresh_db):
+    _seed_export(6)
+    db.archive_paid_loads(older_than_days=0)
+    client = TestClient(main.app)
+    r = client.get("/broker/loads/export", params={"format": "csv"}, headers=_headers())
+    assert r.status_code == 200, r.text
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 6
+    rest = client.get(
+        "/broker/loads/export", params={"format": "csv", "cursor": rows[2]["cursor"]}, headers=_headers()
+    )
+    assert [x["id"] for x in csv.DictReader(io.StringIO(rest.text))] == [x["id"] for x in rows[3:]]
+
+    bad = client.get("/broker/loads/export", params={"cursor": "not-a-cursor"}, headers=_headers())
+    assert bad.status_code == 400
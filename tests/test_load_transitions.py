@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import db
+
+
+def _load(**fields):
+    return db.create_load("MC1", "1 Main St 75001", "2 Broad St 10001", "b1", **fields)
+
+
+def _rejected(name, load_id, mc="MC1", **kw) -> db.TransitionRejected:
+    with pytest.raises(db.TransitionRejected) as ei:
+        db.transition_load(name, load_id, "b1", mc=mc, **kw)
+    return ei.value
+
+
+def test_update_returns_the_updated_row(fresh_db):
+    load_id = _load(rate_total=1000.0)
+    row = db.transition_load("update", load_id, "b1", mc="MC1", fields={"rate_total": 1250.0, "notes": "x"})
+    assert (row["id"], row["rate_total"], row["notes"]) == (str(load_id), 1250.0, "x")
+    assert row["updated_at"] >= row["created_at"]
+    assert db.get_load(load_id)["rate_total"] == 1250.0
+
+
+def test_unknown_fields_are_not_written(fresh_db):
+    load_id = _load()
+    row = db.transition_load("update", load_id, "b1", mc="MC1", fields={"broker_mc": "MC2", "id": "9", "bogus": 1})
+    assert (row["id"], row["broker_mc"]) == (str(load_id), "MC1")
+
+
+def test_not_found(fresh_db):
+    e = _rejected("publish", 424242)
+    assert (e.kind, e.guard, e.message, e.state) == ("not_found", "exists", "Load not found", {})
+
+
+def test_other_brokers_load_is_forbidden(fresh_db):
+    e = _rejected("publish", _load(), mc="MC2")
+    assert (e.kind, e.guard) == ("forbidden", "mc")
+
+
+def test_not_pending(fresh_db):
+    load_id = _load()
+    db.transition_load("publish", load_id, "b1", mc="MC1")
+    e = _rejected("update", load_id, fields={"notes": "late"})
+    assert (e.kind, e.guard, e.message) == ("state", "pending", "Only pending loads can be edited")
+    assert e.state["visibility"] == "published"
+
+
+def test_invoiced_and_paid_loads_are_locked(fresh_db):
+    load_id = _load()
+    db.transition_load("publish", load_id, "b1", mc="MC1")
+    db.transition_load("invoice", load_id, "b1", mc="MC1", invoice_number="INV-1")
+    e = _rejected("assign_driver", load_id, driver="d1")
+    assert (e.kind, e.guard, e.message) == ("state", "not_invoiced", "Load is invoiced and locked")
+    assert e.state["invoice_number"] == "INV-1"
+
+    db.transition_load("paid", load_id, "b1", mc="MC1")
+    e = _rejected("paid", load_id)
+    assert (e.kind, e.guard, e.message) == ("state", "not_paid", "Load is paid and locked")
+
+
+def test_apply_rate_refused_once_invoiced(fresh_db):
+    load_id = _load(driver_pay=100.0)
+    db.transition_load("publish", load_id, "b1", mc="MC1")
+    row = db.transition_load("apply_rate", load_id, "b1", mc="MC1", fields={"driver_pay": 900.0})
+    assert row["driver_pay"] == 900.0
+
+    db.transition_load("invoice", load_id, "b1", mc="MC1", invoice_number="INV-2")
+    e = _rejected("apply_rate", load_id, fields={"driver_pay": 1.0})
+    assert (e.kind, e.guard) == ("state", "not_invoiced")
+    assert db.get_load(load_id)["driver_pay"] == 900.0
+
+
+def test_archived_load_is_explained(fresh_db):
+    load_id = _load()
+    db.transition_load("publish", load_id, "b1", mc="MC1")
+    db.transition_load("invoice", load_id, "b1", mc="MC1", invoice_number="INV-3")
+    db.transition_load("paid", load_id, "b1", mc="MC1")
+    assert db.archive_paid_loads(older_than_days=0)["moved"] == 1
+    e = _rejected("paid", load_id)
+    assert (e.kind, e.guard) == ("state", "not_paid")
+
+
+def test_guards_are_checked_by_the_write_itself(fresh_db):
+    # Racing publishes: the guard lives in the UPDATE's WHERE clause, so
+    # exactly one wins and the other sees the row it lost to.
+    load_id = _load()
+    barrier = threading.Barrier(8)
+    results = []
+
+    def publish():
+        barrier.wait()
+        try:
+            db.transition_load("publish", load_id, "b1", mc="MC1")
+            results.append("ok")
+        except db.TransitionRejected as e:
+            results.append(e.guard)
+
+    threads = [threading.Thread(target=publish) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == ["ok"] + ["pending"] * 7
+
+
+def test_rejection_with_passing_guards_reports_concurrent_change(fresh_db):
+    # The statement matched nothing but the follow-up read sees guards pass:
+    # the row changed in between, so the caller is told to retry.
+    load_id = _load()
+    spec = db.LOAD_TRANSITIONS["publish"]
+    with db._conn() as con:
+        e = db._transition_rejection(con, spec, {"id": str(load_id), "mc": "MC1", "actor": "b1"})
+    assert (e.kind, e.guard) == ("state", "concurrent")
@@ -0,0 +1,110 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import auth
+import db
+import main
+import passwords
+
+
+def _request(xff=None, peer="10.0.0.9") -> Request:
+    headers = [(b"x-forwarded-for", xff.encode())] if xff is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+@pytest.fixture
+def throttle(monkeypatch):
+    t = auth.LoginThrottle(1000)
+    monkeypatch.setattr(auth, "_LOGIN_THROTTLE", t)
+    monkeypatch.setattr(auth, "LOGIN_WINDOW_SECONDS", 100)
+    monkeypatch.setattr(auth, "LOGIN_BACKOFF_BASE_SECONDS", 30)
+    monkeypatch.setattr(auth, "LOGIN_BACKOFF_MAX_SECONDS", 900)
+    return t
+
+
+def test_forwarded_for_ignored_unless_trusted(monkeypatch):
+    monkeypatch.setattr(auth, "TRUST_FORWARDED_FOR", False)
+    assert auth._client_ip(_request("1.2.3.4, 5.6.7.8")) == "10.0.0.9"
+
+
+def test_only_proxy_appended_hops_are_trusted(monkeypatch):
+    monkeypatch.setattr(auth, "TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 1)
+    # Whatever the client puts on the left, the proxy's own append wins.
+    assert auth._client_ip(_request("6.6.6.6, 7.7.7.7, 203.0.113.5")) == "203.0.113.5"
+    assert auth._client_ip(_request("203.0.113.5")) == "203.0.113.5"
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 2)
+    assert auth._client_ip(_request("6.6.6.6, 203.0.113.5, 10.1.1.1")) == "203.0.113.5"
+    # Fewer hops than proxies, or no header: fall back to the peer.
+    assert auth._client_ip(_request("203.0.113.5")) == "10.0.0.9"
+    assert auth._client_ip(_request()) == "10.0.0.9"
+
+
+def test_spoofed_hops_share_one_ip_bucket(fresh_db, throttle, monkeypatch):
+    monkeypatch.setattr(auth, "TRUST_FORWARDED_FOR", True)
+    monkeypatch.setattr(auth, "TRUSTED_PROXY_HOPS", 1)
+    monkeypatch.setattr(auth, "LOGIN_MAX_FAILURES_IP", 3)
+    client = TestClient(main.app)
+    for i in range(3):
+        r = client.post(
+            "/login",
+            json={"username": f"nobody{i}", "password": "x"},
+            headers={"X-Forwarded-For": f"198.51.100.{i}, 203.0.113.5"},
+        )
+        assert r.status_code == 401
+    r = client.post(
+        "/login", json={"username": "fresh", "password": "x"}, headers={"X-Forwarded-For": "9.9.9.9, 203.0.113.5"}
+    )
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) > 0
+    # A different real client is unaffected.
+    r = client.post("/login", json={"username": "fresh", "password": "x"}, headers={"X-Forwarded-For": "203.0.113.6"})
+    assert r.status_code == 401
+
+
+def test_sliding_window_and_backoff(throttle):
+    keys = (("user:a", 4),)
+    t0 = 1000.0  # start of a window
+    for _ in range(3):
+        throttle.failure(keys, now=t0 + 10)
+    assert throttle.retry_after(keys, now=t0 + 10) == 0
+
+    # Next window, 25% in: 75% of the previous three still count (2.25 + 1 < 4) ...
+    throttle.failure(keys, now=t0 + 125)
+    assert throttle.retry_after(keys, now=t0 + 125) == 0
+    # ... and one more failure reaches the limit: blocked for the base backoff.
+    assert throttle.failure(keys, now=t0 + 125) == 1
+    assert throttle.retry_after(keys, now=t0 + 125) == 31
+    assert throttle.retry_after(keys, now=t0 + 156) == 0
+
+    # The next strike doubles the backoff.
+    for _ in range(4):
+        throttle.failure(keys, now=t0 + 160)
+    assert throttle.retry_after(keys, now=t0 + 160) == 61
+
+    # Long quiet: strikes reset, so the next block is back to the base.
+    later = t0 + 160 + 60 + 900 + 1
+    for _ in range(4):
+        throttle.failure(keys, now=later)
+    assert throttle.retry_after(keys, now=later) == 31
+
+
+def test_lockout_and_admin_unlock(fresh_db, throttle, monkeypatch):
+    monkeypatch.setattr(auth, "LOGIN_MAX_FAILURES_USER", 2)
+    monkeypatch.setattr(auth, "LOGIN_LOCK_AFTER_STRIKES", 1)
+    db.create_user("d1", passwords.hash("password123"), "driver")
+    db.create_user("root", "x", "admin")
+    client = TestClient(main.app)
+
+    for _ in range(2):
+        assert client.post("/login", json={"username": "d1", "password": "wrong"}).status_code == 401
+    assert int(db.get_user("d1")["account_locked"]) == 1
+    assert client.post("/login", json={"username": "d1", "password": "password123"}).status_code == 429
+
+    admin = {"Authorization": "Bearer " + auth._access_token("root", "admin", "none", None)}
+    r = client.post("/admin/unlock-user", json={"username": "d1"}, headers=admin)
+    assert r.status_code == 200, r.text
+    assert int(db.get_user("d1")["account_locked"]) == 0
+    assert client.post("/login", json={"username": "d1", "password": "password123"}).status_code == 200
+
+    assert client.post("/admin/unlock-user", json={"username": "ghost"}, headers=admin).status_code == 404
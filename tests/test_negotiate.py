@@ -0,0 +1,35 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import auth
+import db
+import fuel
+import main
+
+
+def test_fuel_lookup_runs_off_the_loop_before_db_access(fresh_db, monkeypatch):
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    load_id = db.create_load("MC1", "1 Main St 75001", "2 Broad St 10001", "b1")
+    seen = {}
+
+    def fake_price(origin_state=None, mode=None):
+        try:
+            asyncio.get_running_loop()
+            seen["on_loop"] = True
+        except RuntimeError:
+            seen["on_loop"] = False
+        seen["in_uow"] = db._UOW.get() is not None
+        return 4.0, {"ok": True, "source": "EIA", "period": "2026-10-12", "series_id": "X"}
+
+    monkeypatch.setattr(fuel, "get_diesel_price", fake_price)
+    headers = {"Authorization": "Bearer " + auth._access_token("b1", "broker", "approved", "MC1")}
+    r = TestClient(main.app).post(
+        f"/broker/loads/{load_id}/negotiate",
+        json={"loaded_miles": 500, "total_miles": 550},
+        headers=headers,
+    )
+    assert r.status_code == 200, r.text
+    assert r.json()["fuel"]["diesel_price"] == 4.0
+    # Neither a unit-of-work slot nor a connection is held while EIA answers.
+    assert seen == {"on_loop": False, "in_uow": False}
@@ -0,0 +1,10 @@
+import pytest
+
+import db
+
+
+@pytest.mark.parametrize("name", sorted(db.HOT_QUERIES))
+def test_hot_query_uses_index(fresh_db, name):
+    sql, params = db.HOT_QUERIES[name]
+    plan = db.explain(sql, params)
+    assert db.plan_problems(plan) == [], "\n".join(plan)
@@ -0,0 +1,35 @@
+from fastapi.testclient import TestClient
+
+import db
+import main
+import passwords
+
+
+def _login(client: TestClient) -> dict:
+    r = client.post("/login", json={"username": "d1", "password": "password123"})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def _bearer(token: str) -> dict:
+    return {"Authorization": "Bearer " + token}
+
+
+def test_reused_refresh_token_revokes_issued_access_tokens(fresh_db):
+    db.create_user("d1", passwords.hash("password123"), "driver")
+    client = TestClient(main.app)
+
+    first = _login(client)
+    assert client.get("/verify-token", headers=_bearer(first["token"])).status_code == 200
+
+    second = client.post("/refresh", json={"refresh_token": first["refresh_token"]})
+    assert second.status_code == 200, second.text
+    second = second.json()
+
+    # Presenting the already-rotated secret again means it was copied.
+    assert client.post("/refresh", json={"refresh_token": first["refresh_token"]}).status_code == 401
+
+    # Refused on this worker right away, without waiting for the revocation sync.
+    assert client.get("/verify-token", headers=_bearer(first["token"])).status_code == 401
+    assert client.get("/verify-token", headers=_bearer(second["token"])).status_code == 401
+    assert client.post("/refresh", json={"refresh_token": second["refresh_token"]}).status_code == 401
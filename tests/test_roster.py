@@ -0,0 +1,71 @@
+import pytest
+from fastapi import HTTPException
+
+import db
+import load_io
+import loads
+
+BROKER = {"username": "b1", "broker_mc": "MC1"}
+
+
+def _linked(username: str, role: str, broker: dict = BROKER):
+    try:
+        loads._require_linked(username, role, broker)
+    except HTTPException as e:
+        return e.status_code
+    return None
+
+
+def _raw(sql: str, params=()) -> None:
+    # Another worker's write: this process's roster is not told about it.
+    with db._conn() as con:
+        con.execute(sql, params)
+
+
+def test_roles_match_case_insensitively(fresh_db):
+    db.create_user("d1", "x", "driver", broker_mc="MC1")
+    db.sync_roster()
+    _raw("UPDATE users SET role=' Driver ' WHERE username='d1'")
+    _raw("INSERT INTO users (username, password_hash, role, broker_mc, created_at) VALUES ('p1', 'x', 'DISPATCHER', 'MC1', '')")
+    assert db.sync_roster() is True
+    assert db.roster_member("d1") == ("driver", "MC1")
+    assert db.roster_member("p1") == ("dispatcher", "MC1")
+    assert db.roster_usernames("MC1", "dispatcher") == ["p1"]
+    assert _linked("d1", "driver") is None
+    assert load_io._dispatcher_ok("p1", "MC1") is None
+
+
+def test_role_and_broker_changes_in_this_process_apply_at_once(fresh_db):
+    db.create_user("p1", "x", "dispatcher", broker_mc="MC1")
+    assert load_io._dispatcher_ok("p1", "MC1") is None
+
+    db.set_broker_mc("p1", "MC2")
+    assert load_io._dispatcher_ok("p1", "MC1") == "Dispatcher not linked to your broker_mc"
+    assert load_io._dispatcher_ok("p1", "MC2") is None
+    assert _linked("p1", "dispatcher") == 403
+
+    db.set_user_role("p1", "driver")
+    assert load_io._dispatcher_ok("p1", "MC2") == "dispatcher_username must be a dispatcher"
+    assert _linked("p1", "driver", {"broker_mc": "MC2"}) is None
+    assert _linked("p1", "dispatcher", {"broker_mc": "MC2"}) == 400
+
+
+@pytest.mark.parametrize(
+    "sql, driver_ok, dispatcher_ok",
+    [
+        ("UPDATE users SET broker_mc='MC2' WHERE username='u1'", 403, "Dispatcher not linked to your broker_mc"),
+        ("UPDATE users SET role='broker' WHERE username='u1'", 400, "dispatcher_username must be a dispatcher"),
+        ("DELETE FROM users WHERE username='u1'", 400, "dispatcher_username must be a dispatcher"),
+    ],
+)
+def test_other_workers_changes_land_on_sync(fresh_db, sql, driver_ok, dispatcher_ok):
+    db.create_user("u1", "x", "driver", broker_mc="MC1")
+    db.create_user("u2", "x", "dispatcher", broker_mc="MC1")
+    _raw(sql)
+    _raw(sql.replace("'u1'", "'u2'"))
+    # Stale until the roster_version trigger's bump is seen.
+    assert _linked("u1", "driver") is None
+    assert db.sync_roster() is True
+    assert _linked("u1", "driver") == driver_ok
+    assert load_io._dispatcher_ok("u2", "MC1") == dispatcher_ok
+    assert db.sync_roster() is False
@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+
+import auth
+import db
+import fuel
+import main
+
+
+def test_multi_write_route_commits_once(fresh_db, monkeypatch):
+    monkeypatch.setattr(db, "REQUEST_UNIT_OF_WORK", True)
+    monkeypatch.setattr(db, "DB_SINGLE_WRITER", False)
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    headers = {"Authorization": "Bearer " + auth._access_token("b1", "broker", "approved", "MC1")}
+    client = TestClient(main.app)
+
+    before = db._TX_STATS["commits"]
+    r = client.post(
+        "/broker/loads/create",
+        json={"pickup_address": "1 Main St 75001", "delivery_address": "2 Broad St 10001"},
+        headers=headers,
+    )
+    assert r.status_code == 200, r.text
+    # The load insert and its audit row share the request's single commit.
+    assert db._TX_STATS["commits"] - before == 1
+    with db._conn() as con:
+        assert con.execute("SELECT COUNT(*) FROM loads").fetchone()[0] == 1
+        assert con.execute("SELECT COUNT(*) FROM audit_log WHERE action='create_load'").fetchone()[0] == 1
+
+
+def test_negotiate_db_section_commits_once(fresh_db, monkeypatch):
+    monkeypatch.setattr(db, "REQUEST_UNIT_OF_WORK", True)
+    monkeypatch.setattr(db, "DB_SINGLE_WRITER", False)
+    monkeypatch.setattr(fuel, "get_diesel_price", lambda origin_state=None, mode=None: (None, {"source": "UNAVAILABLE"}))
+    db.create_user("b1", "x", "broker", broker_mc="MC1", broker_status="approved")
+    load_id = db.create_load("MC1", "1 Main St 75001", "2 Broad St 10001", "b1")
+    headers = {"Authorization": "Bearer " + auth._access_token("b1", "broker", "approved", "MC1")}
+    client = TestClient(main.app)
+
+    before = db._TX_STATS["commits"]
+    r = client.post(
+        f"/broker/loads/{load_id}/negotiate",
+        json={"loaded_miles": 500, "total_miles": 550, "apply_to_load": True},
+        headers=headers,
+    )
+    assert r.status_code == 200, r.text
+    # Quote row, two audit rows and the rate update: one commit.
+    assert db._TX_STATS["commits"] - before == 1
+    assert db.get_load(load_id)["driver_pay"] == r.json()["breakdown"]["driver_total_pay"]